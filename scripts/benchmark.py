@@ -0,0 +1,308 @@
+import pandas as pd
+import numpy as np
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import resource
+import subprocess
+import sys
+import time
+import tracemalloc
+from datetime import datetime, timezone
+
+import merge_datasets
+import calculate_returns
+import financial_metrics
+import correlation_analysis
+import portoflio_optimization_v1 as optimizer
+import return_moments
+import rolling_metrics
+import instrumentation
+import portfolio_sampler
+
+# --- Configuration ---
+OUTPUT_DIR = "data"
+BENCHMARK_DIR = os.path.join(OUTPUT_DIR, "benchmark")  # Synthetic datasets, one folder per scenario
+RESULTS_FILE = os.path.join(BENCHMARK_DIR, "results.jsonl")  # One JSON object per stage per run, appended
+BENCHMARK_SEED = 7
+REPEATS = 3  # Timed runs per stage; the fastest one is reported
+REGRESSION_THRESHOLD = 1.20  # --compare flags stages that got more than 20% slower...
+REGRESSION_MIN_SECONDS = 0.05  # ...and at least this much slower (ignores noise on very fast stages)
+DENSE_SAMPLE_LIMIT = 100000000  # generate_random_portfolios holds portfolios x assets weights in memory (800 MB of float64 here);
+                                # above this only the streaming sampler is timed (the large scenario would need ~44 GB)
+
+# Named sizes: Roblox items, stocks, trading days of history, random portfolios
+SCENARIOS = {
+    "small": {"items": 3, "stocks": 2, "days": 780, "portfolios": 10000},
+    "medium": {"items": 100, "stocks": 20, "days": 1260, "portfolios": 1000000},
+    "large": {"items": 1000, "stocks": 100, "days": 2520, "portfolios": 5000000}
+}
+START_DATE = "2023-01-02"
+
+
+# --- Synthetic data ---
+
+def synthetic_asset_names(n_items, n_stocks):
+    items = [f"Item_{i:04d}" for i in range(n_items)]
+    stocks = [f"STK{i:04d}" for i in range(n_stocks)]
+    return items, stocks
+
+
+def generate_synthetic_data(data_dir, n_items, n_stocks, n_days, seed=BENCHMARK_SEED):
+    """
+    Writes price histories in the same CSV layouts the pipeline reads:
+    - stocks: <ticker>_prices.csv with Date,Open,High,Low,Close,Volume on business days
+    - Roblox items: <item>_prices.csv with Date,RAP once a week
+    Prices follow a random walk with a shared market factor, so correlations are not all zero.
+    Returns (item names, stock tickers).
+    """
+    os.makedirs(data_dir, exist_ok=True)
+    rng = np.random.default_rng(seed)
+    items, stocks = synthetic_asset_names(n_items, n_stocks)
+
+    days = pd.bdate_range(START_DATE, periods=n_days)
+    market = rng.normal(0.0003, 0.01, n_days)
+    betas = rng.uniform(0.5, 1.5, n_stocks)
+    daily_returns = market[:, None] * betas + rng.normal(0, 0.015, (n_days, n_stocks))
+    closes = 100 * np.cumprod(1 + daily_returns, axis=0)
+
+    for j, ticker in enumerate(stocks):
+        close = closes[:, j]
+        spread = np.abs(rng.normal(0, 0.01, n_days)) * close
+        pd.DataFrame({
+            "Date": days.strftime("%Y-%m-%d"),
+            "Open": close - spread / 2,
+            "High": close + spread,
+            "Low": close - spread,
+            "Close": close,
+            "Volume": rng.integers(100000, 10000000, n_days)
+        }).to_csv(os.path.join(data_dir, f"{ticker.lower()}_prices.csv"), index=False)
+
+    # Weekly item prices over the same period (Sundays, as in the simulated histories)
+    weeks = pd.date_range(days[0] - pd.Timedelta(days=days[0].weekday() + 1), days[-1], freq="W-SUN")
+    drifts = rng.uniform(0.002, 0.008, n_items)
+    volatilities = rng.uniform(0.02, 0.05, n_items)
+    weekly_returns = drifts + volatilities * rng.standard_normal((len(weeks), n_items))
+    raps = rng.uniform(1e4, 2e6, n_items) * np.cumprod(1 + weekly_returns, axis=0)
+
+    for j, item in enumerate(items):
+        pd.DataFrame({
+            "Date": weeks.strftime("%Y-%m-%d"),
+            "RAP": raps[:, j].astype(int)
+        }).to_csv(os.path.join(data_dir, f"{item.lower()}_prices.csv"), index=False)
+
+    return items, stocks
+
+
+def use_dataset(data_dir, items, stocks):
+    # Points every stage at the synthetic dataset (the scripts read these module constants)
+    for module in (merge_datasets, calculate_returns, financial_metrics, correlation_analysis, optimizer):
+        module.OUTPUT_DIR = data_dir
+    merge_datasets.ROBLOX_ITEMS = items
+    merge_datasets.STOCK_TICKERS = {f"{ticker.lower()}_prices": ticker for ticker in stocks}
+    calculate_returns.ROBLOX_ITEMS = financial_metrics.ROBLOX_ITEMS = correlation_analysis.ROBLOX_ITEMS = rolling_metrics.ROBLOX_ITEMS = items
+    calculate_returns.STOCK_TICKERS = financial_metrics.STOCK_TICKERS = correlation_analysis.STOCK_TICKERS = rolling_metrics.STOCK_TICKERS = stocks
+    correlation_analysis.MATRIX_NPY_FILE = os.path.join(data_dir, "correlation_matrix.npy")
+    correlation_analysis.MATRIX_ASSETS_FILE = os.path.join(data_dir, "correlation_matrix_assets.json")
+    correlation_analysis.TOP_PAIRS_FILE = os.path.join(data_dir, "correlation_top_pairs.csv")
+    optimizer.ASSETS = items + stocks
+    optimizer.ROBLOX_ITEMS = items
+    optimizer.STOCKS = stocks
+    optimizer.SHOW_PLOT = False
+    # Like the other stages' save_csv=False: rendering and saving plots is not part of what is timed
+    optimizer.PLOT_RESULTS = False
+    correlation_analysis.PLOT_HEATMAP = False
+    # Benchmark runs would flood the pipeline's own timing log
+    instrumentation.METRICS_FILE = None
+
+
+# --- Measuring ---
+
+def measure(function, repeats=REPEATS):
+    """
+    Runs function() `repeats` times for timing (fastest run wins) and once more
+    under tracemalloc for the peak memory it allocates. The stage's console
+    output is discarded. Returns (result, seconds, peak MB).
+    """
+    timings = []
+    for _ in range(repeats):
+        with contextlib.redirect_stdout(io.StringIO()):
+            start = time.perf_counter()
+            result = function()
+            timings.append(time.perf_counter() - start)
+
+    tracemalloc.start()
+    with contextlib.redirect_stdout(io.StringIO()):
+        function()
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    return result, min(timings), peak / 1024 ** 2
+
+
+def git_commit():
+    try:
+        completed = subprocess.run(["git", "rev-parse", "--short", "HEAD"], capture_output=True, text=True,
+                                   cwd=os.path.dirname(os.path.abspath(__file__)))
+        return completed.stdout.strip() or None
+    except OSError:
+        return None
+
+
+def run_benchmarks(scenario="small", sizes=None, repeats=REPEATS, results_file=RESULTS_FILE):
+    """
+    Generates (or reuses) the scenario's synthetic dataset, then times and
+    memory-profiles every stage and the whole in-memory pipeline.
+    sizes: optional dict overriding the scenario's items / stocks / days / portfolios.
+    Appends one JSON line per stage to results_file and returns the records.
+    """
+    params = dict(SCENARIOS[scenario], **(sizes or {}))
+    data_dir = os.path.join(BENCHMARK_DIR, f"{scenario}_{params['items']}i_{params['stocks']}s_{params['days']}d")
+
+    print("=" * 70)
+    print(f"⏱️  BENCHMARK - {scenario}: {params['items']} items, {params['stocks']} stocks, "
+          f"{params['days']} days, {params['portfolios']:,} portfolios")
+    print("=" * 70)
+
+    items, stocks = synthetic_asset_names(params["items"], params["stocks"])
+    if not all(os.path.exists(os.path.join(data_dir, f"{name.lower()}_prices.csv")) for name in items + stocks):
+        print(f"\n🧪 Generating synthetic dataset in {data_dir}...")
+        generate_synthetic_data(data_dir, params["items"], params["stocks"], params["days"])
+    use_dataset(data_dir, items, stocks)
+
+    # Each stage gets the previous stage's output, as in run_pipeline.py --in-memory
+    with contextlib.redirect_stdout(io.StringIO()):
+        master_df = merge_datasets.merge_datasets(save_csv=False)
+        returns_df = calculate_returns.calculate_returns(master_df, save_csv=False)
+        moments = return_moments.moments_from_frame(returns_df)
+        metrics_dict, cov_matrix = return_moments.optimizer_inputs(moments, items + stocks)
+        expected_returns = optimizer.get_expected_returns(metrics_dict)
+
+    def end_to_end():
+        master = merge_datasets.merge_datasets(save_csv=False)
+        returns = calculate_returns.calculate_returns(master, save_csv=False)
+        shared = return_moments.moments_from_frame(returns)
+        financial_metrics.calculate_financial_metrics(returns, save_csv=False, round_values=False, moments=shared)
+        correlation_analysis.analyze_correlations(returns, save_csv=False, moments=shared)
+        optimizer.main(moments=shared, returns_df=returns)
+
+    # (stage name, function, rows processed, what a row is)
+    stages = [
+        ("merge_datasets", lambda: merge_datasets.merge_datasets(save_csv=False), len(master_df) * (len(items) + len(stocks)), "price values"),
+        ("calculate_returns", lambda: calculate_returns.calculate_returns(master_df, save_csv=False), len(master_df) * (len(items) + len(stocks)), "price values"),
+        ("return_moments", lambda: return_moments.moments_from_frame(returns_df), returns_df.shape[0] * (returns_df.shape[1] - 1), "returns"),
+        ("calculate_financial_metrics", lambda: financial_metrics.calculate_financial_metrics(returns_df, save_csv=False, round_values=False), returns_df.shape[0] * (returns_df.shape[1] - 1), "returns"),
+        ("analyze_correlations", lambda: correlation_analysis.analyze_correlations(returns_df, save_csv=False), returns_df.shape[0] * (returns_df.shape[1] - 1), "returns"),
+        ("generate_random_portfolios", lambda: optimizer.generate_random_portfolios(metrics_dict, cov_matrix, params["portfolios"]), params["portfolios"], "portfolios"),
+        # Never holds the samples, so it runs at every size
+        ("sample_portfolios_parallel", lambda: portfolio_sampler.sample_portfolios_parallel(expected_returns, cov_matrix, params["portfolios"]), params["portfolios"], "portfolios"),
+        ("end_to_end", end_to_end, len(master_df) * (len(items) + len(stocks)), "price values")
+    ]
+    if params["portfolios"] * (len(items) + len(stocks)) > DENSE_SAMPLE_LIMIT:
+        print(f"\n⏭️  generate_random_portfolios skipped: {params['portfolios']:,} x {len(items) + len(stocks):,} weights "
+              f"is above DENSE_SAMPLE_LIMIT ({DENSE_SAMPLE_LIMIT:,})")
+        stages = [stage for stage in stages if stage[0] != "generate_random_portfolios"]
+
+    run_id = datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%SZ")
+    environment = {
+        "commit": git_commit(),
+        "python": platform.python_version(),
+        "numpy": np.__version__,
+        "pandas": pd.__version__,
+        "machine": platform.machine(),
+        "cpus": os.cpu_count()
+    }
+
+    records = []
+    print(f"\n{'Stage':30s} {'Time (s)':>10s} {'Peak MB':>10s} {'Throughput':>24s}")
+    print("-" * 78)
+    for name, function, rows, unit in stages:
+        _, seconds, peak_mb = measure(function, repeats)
+        record = dict(
+            run_id=run_id, scenario=scenario, stage=name, seconds=seconds, peak_mb=peak_mb,
+            rows=rows, unit=unit, rows_per_second=rows / seconds if seconds > 0 else None,
+            repeats=repeats, **params, **environment
+        )
+        records.append(record)
+        print(f"{name:30s} {seconds:10.3f} {peak_mb:10.1f} {record['rows_per_second']:>14,.0f} {unit}/s")
+
+    os.makedirs(os.path.dirname(results_file), exist_ok=True)
+    with open(results_file, "a") as f:
+        for record in records:
+            f.write(json.dumps(record) + "\n")
+
+    # ru_maxrss is in KB on Linux, bytes on macOS
+    max_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / (1024 ** 2 if sys.platform == "darwin" else 1024)
+    print(f"\n📈 Process peak RSS: {max_rss:,.0f} MB")
+    print(f"✅ Results appended to: {results_file}")
+    print(f"\n{'=' * 70}\n")
+    return records
+
+
+def compare_results(results_file=RESULTS_FILE, baseline_run=None):
+    """
+    For every scenario, compares its latest run with an earlier run of the same
+    scenario (default: the one before it), stage by stage. Stages whose time
+    grew by more than REGRESSION_THRESHOLD (and REGRESSION_MIN_SECONDS) are flagged. Returns the comparison
+    DataFrame (empty if no scenario has been run twice).
+    """
+    with open(results_file) as f:
+        results = pd.DataFrame([json.loads(line) for line in f if line.strip()])
+
+    comparisons = []
+    for scenario, scenario_results in results.groupby("scenario"):
+        runs = sorted(scenario_results["run_id"].unique())
+        baseline = baseline_run if baseline_run in runs else (runs[-2] if len(runs) > 1 else None)
+        if baseline is None or baseline == runs[-1]:
+            continue
+
+        old = scenario_results[scenario_results["run_id"] == baseline].set_index("stage")
+        new = scenario_results[scenario_results["run_id"] == runs[-1]].set_index("stage")
+        comparison = pd.DataFrame({
+            "baseline_commit": old["commit"],
+            "latest_commit": new["commit"],
+            "baseline_s": old["seconds"],
+            "latest_s": new["seconds"],
+            "baseline_mb": old["peak_mb"],
+            "latest_mb": new["peak_mb"]
+        }).dropna(subset=["baseline_s", "latest_s"])
+        comparison.insert(0, "scenario", scenario)
+        comparisons.append(comparison)
+
+    if not comparisons:
+        print("⚠️  No scenario has two benchmark runs to compare yet.")
+        return pd.DataFrame()
+
+    comparison = pd.concat(comparisons)
+    comparison["time_ratio"] = comparison["latest_s"] / comparison["baseline_s"]
+    comparison["regression"] = (comparison["time_ratio"] > REGRESSION_THRESHOLD) & \
+                               (comparison["latest_s"] - comparison["baseline_s"] > REGRESSION_MIN_SECONDS)
+
+    print(comparison.round(3).to_string())
+    if comparison["regression"].any():
+        print(f"\n❌ {int(comparison['regression'].sum())} stage(s) took more than {REGRESSION_THRESHOLD:.0%} of their baseline time")
+    else:
+        print("\n✅ No regressions")
+    return comparison
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Time and memory-profile every pipeline stage on synthetic data.")
+    parser.add_argument("--scenario", choices=list(SCENARIOS), default="small")
+    parser.add_argument("--items", type=int, help="Override the number of Roblox items")
+    parser.add_argument("--stocks", type=int, help="Override the number of stocks")
+    parser.add_argument("--days", type=int, help="Override the history length in trading days")
+    parser.add_argument("--portfolios", type=int, help="Override the number of random portfolios")
+    parser.add_argument("--repeats", type=int, default=REPEATS)
+    parser.add_argument("--compare", action="store_true", help="Compare the last two runs of each scenario in RESULTS_FILE instead of benchmarking")
+    args = parser.parse_args()
+
+    if args.compare:
+        comparison = compare_results()
+        sys.exit(1 if len(comparison) and comparison["regression"].any() else 0)
+
+    sizes = {key: getattr(args, key) for key in ("items", "stocks", "days", "portfolios") if getattr(args, key) is not None}
+    run_benchmarks(args.scenario, sizes, args.repeats)
@@ -0,0 +1,116 @@
+import pandas as pd
+import numpy as np
+
+# --- Configuration ---
+TILE_SIZE = 512        # Assets per tile side; one tile is TILE_SIZE² values
+TOP_K_PAIRS = 20       # Least / most correlated item-stock pairs to keep
+
+
+def standardize_returns(returns, dtype=np.float64):
+    """
+    z-scores every column once: (x - mean) / std (sample std, ddof=1).
+    After this, corr(i, j) = z_i · z_j / (T - 1), so each tile of the
+    correlation matrix is a single matrix product.
+    Missing returns become 0 (the column mean) after standardizing.
+    Constant columns get all zeros, i.e. correlation 0 with everything.
+    """
+    returns = np.asarray(returns, dtype=np.float64)
+    means = np.nanmean(returns, axis=0)
+    stds = np.nanstd(returns, axis=0, ddof=1)
+    stds[~(stds > 0)] = np.inf
+    z = (returns - means) / stds
+    return np.nan_to_num(z, nan=0.0).astype(dtype, copy=False)
+
+
+def _update_extremes(best_values, best_pairs, values, pairs, k, largest):
+    # Keep the k smallest (or largest) values seen so far, with their (i, j) pairs
+    values = np.concatenate([best_values, values])
+    pairs = np.concatenate([best_pairs, pairs])
+    if len(values) > k:
+        keys = -values if largest else values
+        keep = np.argpartition(keys, k - 1)[:k]
+        values, pairs = values[keep], pairs[keep]
+    return values, pairs
+
+
+def blocked_correlation(returns, assets, group_a=None, group_b=None, tile_size=TILE_SIZE,
+                        dtype=np.float32, output_path=None, top_k=TOP_K_PAIRS):
+    """
+    Correlation matrix of the columns of `returns` (T x N), computed tile by
+    tile so only a few tiles are in memory at once.
+    - dtype: np.float32 halves memory and time; np.float64 for full precision
+    - output_path: if given, the matrix is written to a memory-mapped .npy file
+      there instead of being held in RAM
+    - group_a / group_b: asset names (e.g. Roblox items and stocks). While the
+      tiles are computed, the top_k least and most correlated (a, b) pairs are
+      kept, so reports never need to scan all N² entries.
+    Returns (matrix, pairs) where pairs is a dict with 'least' and 'most'
+    DataFrames (columns: Asset_A, Asset_B, Correlation), sorted.
+    """
+    n_rows, n_assets = np.shape(returns)
+    z = standardize_returns(returns, dtype)
+    scale = dtype(1.0 / (n_rows - 1))
+
+    if output_path is not None:
+        matrix = np.lib.format.open_memmap(output_path, mode="w+", dtype=dtype, shape=(n_assets, n_assets))
+    else:
+        matrix = np.empty((n_assets, n_assets), dtype=dtype)
+
+    position = {asset: i for i, asset in enumerate(assets)}
+    in_a = np.zeros(n_assets, dtype=bool)
+    in_b = np.zeros(n_assets, dtype=bool)
+    track_pairs = group_a is not None and group_b is not None
+    if track_pairs:
+        in_a[[position[a] for a in group_a if a in position]] = True
+        in_b[[position[b] for b in group_b if b in position]] = True
+
+    least_values = np.zeros(0, dtype=dtype)
+    least_pairs = np.zeros((0, 2), dtype=np.int64)
+    most_values = np.zeros(0, dtype=dtype)
+    most_pairs = np.zeros((0, 2), dtype=np.int64)
+
+    # Only tiles on or above the diagonal are computed; the rest is mirrored
+    for row_start in range(0, n_assets, tile_size):
+        row_stop = min(row_start + tile_size, n_assets)
+        for col_start in range(row_start, n_assets, tile_size):
+            col_stop = min(col_start + tile_size, n_assets)
+
+            tile = (z[:, row_start:row_stop].T @ z[:, col_start:col_stop]) * scale
+            np.clip(tile, -1, 1, out=tile)
+            matrix[row_start:row_stop, col_start:col_stop] = tile
+            if col_start != row_start:
+                matrix[col_start:col_stop, row_start:row_stop] = tile.T
+
+            if track_pairs:
+                rows = np.arange(row_start, row_stop)
+                cols = np.arange(col_start, col_stop)
+                # (a, b) pairs in either orientation; on diagonal tiles only count i < j once
+                cross = (in_a[rows][:, None] & in_b[cols][None, :]) | (in_b[rows][:, None] & in_a[cols][None, :])
+                if col_start == row_start:
+                    cross &= rows[:, None] < cols[None, :]
+                r, c = np.nonzero(cross)
+                if len(r):
+                    values = tile[r, c]
+                    # Store as (a, b) regardless of which side of the diagonal it was found on
+                    i, j = rows[r], cols[c]
+                    a_first = in_a[i]
+                    pairs = np.column_stack([np.where(a_first, i, j), np.where(a_first, j, i)])
+                    least_values, least_pairs = _update_extremes(least_values, least_pairs, values, pairs, top_k, largest=False)
+                    most_values, most_pairs = _update_extremes(most_values, most_pairs, values, pairs, top_k, largest=True)
+
+    if output_path is not None:
+        matrix.flush()
+
+    def as_frame(values, pairs, ascending):
+        frame = pd.DataFrame({
+            'Asset_A': [assets[i] for i in pairs[:, 0]],
+            'Asset_B': [assets[j] for j in pairs[:, 1]],
+            'Correlation': values.astype(float)
+        })
+        return frame.sort_values('Correlation', ascending=ascending, kind='stable').reset_index(drop=True)
+
+    pairs = {
+        'least': as_frame(least_values, least_pairs, ascending=True),
+        'most': as_frame(most_values, most_pairs, ascending=False)
+    }
+    return matrix, pairs
@@ -1,63 +1,96 @@
 import pandas as pd
 import numpy as np
 import os
+from instrumentation import instrumented_stage, step, throughput
+import price_store
 
 # --- Configuration ---
 OUTPUT_DIR = "data"
 ROBLOX_ITEMS = ["Dominus_Empyreus", "Violet_Valkyrie", "Red_Valkyrie"]
 STOCK_TICKERS = ["RBLX", "VWCE_DE"]
+PRICE_SOURCE = "store"  # "store" = memory-mapped slices of the price store (price_store.py), "csv" = merged_master.csv
 
-def calculate_returns():
+def compute_returns(df):
+    """
+    In-memory core: percentage returns for every asset column of the merged
+    dataset (Date + one price column per asset). Returns a DataFrame with
+    Date + one <asset>_Return column per asset, first (NaN) row removed.
+    Returns = (Price_t - Price_t-1) / Price_t-1, always in float64 (the merged
+    Roblox columns are float32, see merge_datasets.ROBLOX_DTYPE).
+    All columns are computed in one pct_change and joined once (adding them
+    one by one fragments the frame on wide datasets).
+    """
+    # Roblox items (weekly data) first, then stock tickers (daily data)
+    assets = [item for item in ROBLOX_ITEMS if item in df.columns] + [ticker for ticker in STOCK_TICKERS if ticker in df.columns]
+    returns = df[assets].astype(np.float64).pct_change()
+    returns.columns = [f'{asset}_Return' for asset in assets]
+    returns_df = pd.concat([df[['Date']], returns], axis=1)
+    
+    # Remove first row (NaN returns)
+    returns_df = returns_df.dropna(subset=list(returns.columns))
+
+    return returns_df
+
+@instrumented_stage("calculate_returns")
+def calculate_returns(df=None, save_csv=True):
     """
     Calculates percentage returns for all assets from merged dataset.
     Returns = (Price_t - Price_t-1) / Price_t-1
+    Pass df to use an in-memory merged dataset; otherwise prices come from the
+    price store written by merge_datasets.py (merged_master.csv without it).
+    save_csv=False skips writing returns_calculated.csv.
     """
     print("=" * 70)
     print("📈 RETURNS CALCULATOR - Computing Asset Returns")
     print("=" * 70)
     
-    # Load merged master dataset
-    filepath = os.path.join(OUTPUT_DIR, "merged_master.csv")
-    if not os.path.exists(filepath):
-        print(f"❌ ERROR: {filepath} not found!")
-        print("   Please run merge_datasets.py first.")
-        return
-    
-    print(f"\n📥 Loading merged dataset from {filepath}...")
-    df = pd.read_csv(filepath)
-    df['Date'] = pd.to_datetime(df['Date'])
+    store_dir = os.path.join(OUTPUT_DIR, "price_store")
+    if df is None and PRICE_SOURCE == "store" and os.path.exists(os.path.join(store_dir, "manifest.json")):
+        import merge_datasets
+        step("load_price_store")
+        print(f"\n📥 Reading prices from {store_dir}...")
+        stored = price_store.load_manifest(store_dir)['assets']
+        df = merge_datasets.merge_price_store([ticker for ticker in STOCK_TICKERS if ticker in stored],
+                                              [item for item in ROBLOX_ITEMS if item in stored], store_dir=store_dir)
+
+    if df is None:
+        # Load merged master dataset
+        filepath = os.path.join(OUTPUT_DIR, "merged_master.csv")
+        if not os.path.exists(filepath):
+            print(f"❌ ERROR: {filepath} not found!")
+            print("   Please run merge_datasets.py first.")
+            return
+        
+        step("load_csv")
+        print(f"\n📥 Loading merged dataset from {filepath}...")
+        df = pd.read_csv(filepath)
+        df['Date'] = pd.to_datetime(df['Date'])
     
     print(f"   ✅ Loaded {len(df)} records, {len(df.columns)-1} assets")
     
     # Calculate returns for each asset
     print("\n🧮 Calculating returns...")
-    returns_df = df[['Date']].copy()
-    
-    # Roblox items (weekly data)
-    for item in ROBLOX_ITEMS:
-        if item in df.columns:
-            returns_df[f'{item}_Return'] = df[item].pct_change()
-            print(f"   ✅ {item}: Return column created")
-    
-    # Stock tickers (daily data)
-    for ticker in STOCK_TICKERS:
-        if ticker in df.columns:
-            returns_df[f'{ticker}_Return'] = df[ticker].pct_change()
-            print(f"   ✅ {ticker}: Return column created")
-    
-    # Remove first row (NaN returns)
-    returns_df = returns_df.dropna(subset=[col for col in returns_df.columns if col != 'Date'])
+    step("compute_returns")
+    returns_df = compute_returns(df)
+    throughput(df.size, "values")
+    for col in returns_df.columns[1:]:
+        print(f"   ✅ {col.replace('_Return', '')}: Return column created")
     
     # Save to CSV
     output_path = os.path.join(OUTPUT_DIR, "returns_calculated.csv")
-    returns_df.to_csv(output_path, index=False)
+    if save_csv:
+        step("save_csv")
+        returns_df.to_csv(output_path, index=False)
     
     print(f"\n✅ SUCCESS: Returns calculated")
-    print(f"   📄 File: {output_path}")
+    if save_csv:
+        print(f"   📄 File: {output_path}")
     print(f"   📊 Total rows: {len(returns_df)}")
     print(f"   📊 Sample returns (first 5 rows):")
     print(returns_df.head())
     print("\n" + "=" * 70)
 
+    return returns_df
+
 if __name__ == "__main__":
-    calculate_returns()
\ No newline at end of file
+    calculate_returns()
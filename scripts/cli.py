@@ -0,0 +1,148 @@
+import argparse
+import os
+import sys
+
+# Only the standard library is imported here: every subcommand imports the
+# stage it runs (and pandas / matplotlib with it) when it is called, so
+# "cli.py serve" or "cli.py metrics" never pays for the plotting libraries.
+
+# --- Configuration ---
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(SCRIPTS_DIR)
+
+
+def run_fetch(args):
+    import fetch_stock_data
+    return fetch_stock_data.fetch_stock_data()
+
+
+def run_merge(args):
+    import merge_datasets
+    return merge_datasets.merge_datasets() is not None
+
+
+def run_returns(args):
+    import calculate_returns
+    return calculate_returns.calculate_returns() is not None
+
+
+def run_metrics(args):
+    import financial_metrics
+    return financial_metrics.calculate_financial_metrics() is not None
+
+
+def run_correlation(args):
+    import correlation_analysis
+    if args.no_plot:
+        correlation_analysis.PLOT_HEATMAP = False
+    return correlation_analysis.analyze_correlations() is not None
+
+
+def run_rolling(args):
+    import rolling_metrics
+    return rolling_metrics.calculate_rolling_metrics() is not None
+
+
+def run_optimize(args):
+    import portoflio_optimization_v1 as optimizer
+    optimizer.configure_from_args(args)
+    if args.headless:
+        optimizer.configure(show_plot=False)
+    return optimizer.main() is not None
+
+
+def run_stress(args):
+    import stress_testing
+    return stress_testing.run_stress_tests(n_generated=args.scenarios) is not None
+
+
+def run_pipeline(args):
+    import run_pipeline as pipeline
+    if args.in_memory:
+        return pipeline.run_in_memory(write_csv=args.write_csv, plot=not args.no_plot)
+    return pipeline.run_pipeline(only=args.only, force=args.force)
+
+
+def run_serve(args):
+    import portfolio_service
+    portfolio_service.serve(args.host or portfolio_service.HOST, args.port or portfolio_service.PORT)
+
+
+def run_benchmark(args):
+    import benchmark
+    benchmark.run_benchmarks(args.scenario, repeats=args.repeats or benchmark.REPEATS)
+
+
+def build_parser():
+    # Both only need the standard library: the stage modules are imported by the command that runs
+    import run_pipeline as pipeline
+    import optimizer_options
+
+    parser = argparse.ArgumentParser(description="Roblox investment analysis: run any stage of the pipeline.")
+    parser.add_argument("--headless", action="store_true", help="Never open plot windows (plots are still saved, with the Agg backend)")
+    parser.add_argument("--quiet", action="store_true", help="Only print one timing line per stage")
+    commands = parser.add_subparsers(dest="command", required=True)
+
+    commands.add_parser("fetch", help="Download / update the stock prices").set_defaults(run=run_fetch)
+    commands.add_parser("merge", help="Merge all price files into merged_master.csv").set_defaults(run=run_merge)
+    commands.add_parser("returns", help="Daily returns from merged_master.csv").set_defaults(run=run_returns)
+    commands.add_parser("metrics", help="Annual return, volatility and Sharpe per asset").set_defaults(run=run_metrics)
+
+    correlation = commands.add_parser("correlation", help="Correlation matrix and heatmap")
+    correlation.add_argument("--no-plot", action="store_true", help="Skip the heatmap")
+    correlation.set_defaults(run=run_correlation)
+
+    commands.add_parser("rolling", help="Rolling-window metrics").set_defaults(run=run_rolling)
+
+    optimize = commands.add_parser("optimize", help="Optimal portfolios and efficient frontier")
+    optimizer_options.add_arguments(optimize)
+    optimize.set_defaults(run=run_optimize)
+
+    stress = commands.add_parser("stress", help="Stress-test the saved optimal portfolios under shock scenarios")
+    stress.add_argument("--scenarios", type=int, help="Generated scenarios on top of the named ones (stress_testing.GENERATED_SCENARIOS)")
+    stress.set_defaults(run=run_stress)
+
+    pipeline_parser = commands.add_parser("pipeline", help="All stages in order, skipping the ones that are up to date")
+    pipeline_parser.add_argument("--only", nargs="+", choices=[stage["name"] for stage in pipeline.STAGES], help="Only consider these stages")
+    pipeline_parser.add_argument("--force", action="store_true", help="Rerun stages even if they are up to date")
+    pipeline_parser.add_argument("--in-memory", action="store_true", help="Chain the stages in one process without CSV round-trips")
+    pipeline_parser.add_argument("--write-csv", action="store_true", help="With --in-memory, still write the intermediate CSVs")
+    pipeline_parser.add_argument("--no-plot", action="store_true", help="With --in-memory, skip the heatmap and frontier plot")
+    pipeline_parser.set_defaults(run=run_pipeline)
+
+    serve = commands.add_parser("serve", help="Resident portfolio evaluation service (portfolio_service.py)")
+    serve.add_argument("--host", help="Default: portfolio_service.HOST")
+    serve.add_argument("--port", type=int, help="Default: portfolio_service.PORT")
+    serve.set_defaults(run=run_serve)
+
+    benchmark = commands.add_parser("benchmark", help="Time every stage on synthetic data")
+    benchmark.add_argument("--scenario", default="small")
+    benchmark.add_argument("--repeats", type=int, help="Default: benchmark.REPEATS")
+    benchmark.set_defaults(run=run_benchmark)
+
+    return parser
+
+
+def main(argv=None):
+    """
+    One entry point for every stage:
+        python scripts/cli.py [--headless] [--quiet] <command> [options]
+    Commands run from the project root (the stages use data/ as a relative
+    path). Returns the process exit code.
+    """
+    args = build_parser().parse_args(argv)
+    os.chdir(PROJECT_ROOT)
+
+    # Both are read when the stage modules are first used, so set them before running anything
+    if args.headless:
+        os.environ["MPLBACKEND"] = "Agg"
+    if args.quiet:
+        os.environ["PIPELINE_VERBOSITY"] = "quiet"
+        import instrumentation
+        instrumentation.VERBOSITY = "quiet"
+
+    return 1 if args.run(args) is False else 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -1,95 +1,186 @@
 import pandas as pd
 import numpy as np
 import os
-import matplotlib.pyplot as plt
-import seaborn as sns
+import json
+from blocked_correlation import blocked_correlation
+from correlation_heatmap import plot_correlation_heatmap
+from instrumentation import instrumented_stage, step, throughput
+from return_moments import load_return_moments, moments_from_frame
 
 # --- Configuration ---
 OUTPUT_DIR = "data"
 ROBLOX_ITEMS = ["Dominus_Empyreus", "Violet_Valkyrie", "Red_Valkyrie"]
 STOCK_TICKERS = ["RBLX", "VWCE_DE"]
 
-def analyze_correlations():
+# Large universes: above BLOCKED_THRESHOLD assets ("auto") the matrix is computed
+# in tiles by blocked_correlation.py and written to a memory-mapped .npy file.
+CORRELATION_ENGINE = "auto"  # "auto", "pandas" or "blocked"
+BLOCKED_THRESHOLD = 500
+BLOCKED_DTYPE = np.float32
+MATRIX_NPY_FILE = os.path.join(OUTPUT_DIR, "correlation_matrix.npy")
+MATRIX_ASSETS_FILE = os.path.join(OUTPUT_DIR, "correlation_matrix_assets.json")
+TOP_PAIRS_FILE = os.path.join(OUTPUT_DIR, "correlation_top_pairs.csv")
+TOP_K_PAIRS = 20
+PLOT_HEATMAP = True  # False = skip the heatmap (compute-only runs; matplotlib is then never imported)
+
+def compute_correlation_matrix(returns_df):
+    """
+    In-memory core: Pearson correlation matrix of all return columns,
+    labelled with plain asset names (the _Return suffix removed).
+    """
+    return correlation_from_moments(moments_from_frame(returns_df))
+
+def correlation_from_moments(moments):
+    # Correlation DataFrame from return_moments.py statistics (the pass shared with the other stages)
+    return pd.DataFrame(moments['correlation'], index=moments['assets'], columns=moments['assets'])
+
+def compute_blocked_correlation(returns_df, output_path=MATRIX_NPY_FILE):
+    """
+    Tiled version of compute_correlation_matrix for thousands of assets.
+    output_path=None keeps the matrix in memory instead of a .npy file.
+    Stocks are STOCK_TICKERS and every other column counts as a Roblox item.
+    Returns (matrix, top_pairs): the matrix is a DataFrame backed by the
+    (memory-mapped) array without a copy; top_pairs holds the TOP_K_PAIRS least
+    and most correlated item/stock pairs ('least' / 'most' DataFrames).
+    """
+    return_cols = [col for col in returns_df.columns if col != 'Date']
+    assets = [col.replace('_Return', '') for col in return_cols]
+    stocks = [asset for asset in assets if asset in STOCK_TICKERS]
+    items = [asset for asset in assets if asset not in STOCK_TICKERS]
+
+    matrix, top_pairs = blocked_correlation(returns_df[return_cols].to_numpy(), assets,
+                                            group_a=items, group_b=stocks, dtype=BLOCKED_DTYPE,
+                                            output_path=output_path, top_k=TOP_K_PAIRS)
+    for frame in top_pairs.values():
+        frame.rename(columns={'Asset_A': 'Item', 'Asset_B': 'Stock'}, inplace=True)
+
+    correlation_matrix = pd.DataFrame(matrix, index=assets, columns=assets, copy=False)
+    return correlation_matrix, top_pairs
+
+def diversification_quality(corr):
+    return "EXCELLENT ✨" if corr < 0.3 else "GOOD ✅" if corr < 0.5 else "MODERATE ⚠️" if corr < 0.7 else "POOR ❌"
+
+@instrumented_stage("analyze_correlations")
+def analyze_correlations(returns_df=None, save_csv=True, moments=None):
     """
     Computes correlation matrix between all assets.
     Creates heatmap visualization for portfolio diversification analysis.
+    Pass returns_df to use in-memory returns instead of returns_calculated.csv;
+    save_csv=False skips writing correlation_matrix.csv. Returns the matrix.
+    moments: precomputed return_moments.py statistics; the (non-tiled) matrix
+    is then taken from them instead of scanning the returns again.
     """
     print("=" * 70)
     print("🔗 CORRELATION ANALYZER - Portfolio Diversification Study")
     print("=" * 70)
     
-    # Load returns data
     filepath = os.path.join(OUTPUT_DIR, "returns_calculated.csv")
-    if not os.path.exists(filepath):
+    if returns_df is None and moments is None and not os.path.exists(filepath):
         print(f"❌ ERROR: {filepath} not found!")
         print("   Please run calculate_returns.py first.")
         return
-    
-    print(f"\n📥 Loading returns from {filepath}...")
-    returns_df = pd.read_csv(filepath)
-    
+
+    if returns_df is not None:
+        columns = returns_df.columns
+    elif moments is not None:
+        columns = moments['assets']
+    else:
+        columns = pd.read_csv(filepath, nrows=0).columns
+    n_assets = len([col for col in columns if col != 'Date'])
+    blocked = CORRELATION_ENGINE == "blocked" or (CORRELATION_ENGINE == "auto" and n_assets > BLOCKED_THRESHOLD)
+
+    if blocked and returns_df is None:
+        # The tiled engine works on the returns themselves
+        step("load_csv")
+        print(f"\n📥 Loading returns from {filepath}...")
+        returns_df = pd.read_csv(filepath)
+    elif not blocked and moments is None:
+        if returns_df is None:
+            step("load_moments")
+            print(f"\n📥 Loading returns from {filepath}...")
+            moments = load_return_moments(filepath, os.path.join(OUTPUT_DIR, "return_moments.npz"))
+        else:
+            step("return_moments")
+            moments = moments_from_frame(returns_df)
+
     # Build correlation matrix
-    print("\n🧮 Computing Pearson correlation coefficients...")
-    
-    # Select only return columns
-    return_cols = [col for col in returns_df.columns if col != 'Date']
-    correlation_matrix = returns_df[return_cols].corr()
-    
-    # Clean up column names for display
-    correlation_matrix.index = [col.replace('_Return', '') for col in correlation_matrix.index]
-    correlation_matrix.columns = [col.replace('_Return', '') for col in correlation_matrix.columns]
-    
-    # Save correlation matrix
-    output_path = os.path.join(OUTPUT_DIR, "correlation_matrix.csv")
-    correlation_matrix.to_csv(output_path)
-    
-    print(f"\n✅ Correlation Matrix Computed:")
-    print(correlation_matrix.round(3))
-    print(f"\n   📄 Saved to: {output_path}")
-    
-    # Create heatmap visualization
-    print("\n📊 Creating correlation heatmap...")
-    plt.figure(figsize=(10, 8))
-    sns.heatmap(correlation_matrix, annot=True, fmt='.3f', cmap='coolwarm', 
-                center=0, vmin=-1, vmax=1, square=True, cbar_kws={'label': 'Correlation'})
-    plt.title('Asset Correlation Matrix\n(Negative = Diversification Benefit)', fontsize=14, fontweight='bold')
-    plt.tight_layout()
+    step("correlation_matrix")
+    throughput(n_assets * (n_assets + 1) // 2, "asset pairs")
+    top_pairs = None
+    if blocked:
+        print(f"\n🧮 Computing Pearson correlation coefficients for {n_assets:,} assets in tiles...")
+        correlation_matrix, top_pairs = compute_blocked_correlation(returns_df, MATRIX_NPY_FILE if save_csv else None)
+
+        print(f"\n✅ Correlation Matrix Computed ({n_assets:,} x {n_assets:,}, {np.dtype(BLOCKED_DTYPE).name})")
+        if save_csv:
+            with open(MATRIX_ASSETS_FILE, "w") as f:
+                json.dump(list(correlation_matrix.index), f)
+            top_pairs_df = pd.concat([top_pairs['least'].assign(Rank='least'), top_pairs['most'].assign(Rank='most')])
+            top_pairs_df.to_csv(TOP_PAIRS_FILE, index=False)
+            print(f"   📄 Saved to: {MATRIX_NPY_FILE} (asset names in {MATRIX_ASSETS_FILE})")
+            print(f"   📄 Top item/stock pairs saved to: {TOP_PAIRS_FILE}")
+    else:
+        print("\n🧮 Computing Pearson correlation coefficients...")
+        correlation_matrix = correlation_from_moments(moments)
+        
+        # Save correlation matrix
+        output_path = os.path.join(OUTPUT_DIR, "correlation_matrix.csv")
+        if save_csv:
+            correlation_matrix.to_csv(output_path)
+        
+        print(f"\n✅ Correlation Matrix Computed:")
+        print(correlation_matrix.round(3))
+        if save_csv:
+            print(f"\n   📄 Saved to: {output_path}")
+        
     
-    heatmap_path = os.path.join(OUTPUT_DIR, "correlation_heatmap.png")
-    plt.savefig(heatmap_path, dpi=300, bbox_inches='tight')
-    print(f"   ✅ Heatmap saved to: {heatmap_path}")
-    plt.close()
+    if PLOT_HEATMAP:
+        step("heatmap")
+        # Create heatmap visualization (annotated for small matrices, clustered + downsampled for large ones)
+        print("\n📊 Creating correlation heatmap...")
+        heatmap_path = plot_correlation_heatmap(correlation_matrix, os.path.join(OUTPUT_DIR, "correlation_heatmap.png"))
+        print(f"   ✅ Heatmap saved to: {heatmap_path}")
     
     # Analyze diversification potential
+    step("diversification_report")
     print(f"\n{'=' * 70}")
     print("💡 DIVERSIFICATION ANALYSIS")
     print(f"{'=' * 70}\n")
     
-    # Roblox vs Stocks correlation
-    print("🎮 Roblox Items vs Stocks:")
-    for item in ROBLOX_ITEMS:
-        for ticker in STOCK_TICKERS:
-            if item in correlation_matrix.index and ticker in correlation_matrix.columns:
-                corr = correlation_matrix.loc[item, ticker]
-                quality = "EXCELLENT ✨" if corr < 0.3 else "GOOD ✅" if corr < 0.5 else "MODERATE ⚠️" if corr < 0.7 else "POOR ❌"
-                print(f"   {item} vs {ticker}: {corr:.3f} ({quality})")
+    if top_pairs is not None:
+        # Large universe: answer from the top-K index instead of walking all pairs
+        print(f"🎮 Roblox Items vs Stocks - {TOP_K_PAIRS} least correlated pairs (best diversifiers):")
+        for _, pair in top_pairs['least'].iterrows():
+            print(f"   {pair['Item']} vs {pair['Stock']}: {pair['Correlation']:.3f} ({diversification_quality(pair['Correlation'])})")
+
+        print(f"\n🎮 Roblox Items vs Stocks - {TOP_K_PAIRS} most correlated pairs:")
+        for _, pair in top_pairs['most'].iterrows():
+            print(f"   {pair['Item']} vs {pair['Stock']}: {pair['Correlation']:.3f} ({diversification_quality(pair['Correlation'])})")
+    else:
+        # Roblox vs Stocks correlation
+        print("🎮 Roblox Items vs Stocks:")
+        for item in ROBLOX_ITEMS:
+            for ticker in STOCK_TICKERS:
+                if item in correlation_matrix.index and ticker in correlation_matrix.columns:
+                    corr = correlation_matrix.loc[item, ticker]
+                    print(f"   {item} vs {ticker}: {corr:.3f} ({diversification_quality(corr)})")
     
-    # Roblox vs Roblox correlation
-    print("\n🎮 Roblox Items Correlation (within-asset risk):")
-    for i, item1 in enumerate(ROBLOX_ITEMS):
-        for item2 in ROBLOX_ITEMS[i+1:]:
-            if item1 in correlation_matrix.index and item2 in correlation_matrix.columns:
-                corr = correlation_matrix.loc[item1, item2]
-                print(f"   {item1} vs {item2}: {corr:.3f}")
+        # Roblox vs Roblox correlation
+        print("\n🎮 Roblox Items Correlation (within-asset risk):")
+        for i, item1 in enumerate(ROBLOX_ITEMS):
+            for item2 in ROBLOX_ITEMS[i+1:]:
+                if item1 in correlation_matrix.index and item2 in correlation_matrix.columns:
+                    corr = correlation_matrix.loc[item1, item2]
+                    print(f"   {item1} vs {item2}: {corr:.3f}")
     
-    # Stocks vs Stocks correlation
-    print("\n📈 Stocks Correlation (market risk):")
-    if len(STOCK_TICKERS) > 1:
-        for i, ticker1 in enumerate(STOCK_TICKERS):
-            for ticker2 in STOCK_TICKERS[i+1:]:
-                if ticker1 in correlation_matrix.index and ticker2 in correlation_matrix.columns:
-                    corr = correlation_matrix.loc[ticker1, ticker2]
-                    print(f"   {ticker1} vs {ticker2}: {corr:.3f}")
+        # Stocks vs Stocks correlation
+        print("\n📈 Stocks Correlation (market risk):")
+        if len(STOCK_TICKERS) > 1:
+            for i, ticker1 in enumerate(STOCK_TICKERS):
+                for ticker2 in STOCK_TICKERS[i+1:]:
+                    if ticker1 in correlation_matrix.index and ticker2 in correlation_matrix.columns:
+                        corr = correlation_matrix.loc[ticker1, ticker2]
+                        print(f"   {ticker1} vs {ticker2}: {corr:.3f}")
     
     print(f"\n{'=' * 70}")
     print("📝 INTERPRETATION GUIDE:")
@@ -99,5 +190,7 @@ def analyze_correlations():
     print("   > 0.7  : POOR diversification (highly correlated)")
     print(f"{'=' * 70}\n")
 
+    return correlation_matrix
+
 if __name__ == "__main__":
-    analyze_correlations()
\ No newline at end of file
+    analyze_correlations()
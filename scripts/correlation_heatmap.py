@@ -0,0 +1,169 @@
+import pandas as pd
+import numpy as np
+import json
+import os
+
+# --- Configuration ---
+OUTPUT_DIR = "data"
+MATRIX_CSV_FILE = os.path.join(OUTPUT_DIR, "correlation_matrix.csv")
+MATRIX_NPY_FILE = os.path.join(OUTPUT_DIR, "correlation_matrix.npy")
+MATRIX_ASSETS_FILE = os.path.join(OUTPUT_DIR, "correlation_matrix_assets.json")
+HEATMAP_FILE = os.path.join(OUTPUT_DIR, "correlation_heatmap.png")
+
+ANNOTATION_LIMIT = 30         # Up to this many assets: annotated seaborn heatmap (one label per cell)
+PIXEL_BUDGET = 2000           # Large mode: at most this many cells per side; bigger matrices are block-averaged
+CLUSTER_ASSETS = True         # Large mode: reorder assets so correlated groups sit next to each other
+CLUSTER_MAX_ASSETS = 5000     # Above this, only this many evenly spaced "landmark" assets are clustered
+ROW_CHUNK = 256               # Rows read at a time when reordering / downsampling a memory-mapped matrix
+LARGE_DPI = 150
+
+
+def load_correlation_matrix(npy_path=MATRIX_NPY_FILE, csv_path=MATRIX_CSV_FILE, assets_path=MATRIX_ASSETS_FILE):
+    """
+    Loads a saved correlation matrix as a DataFrame, so the heatmap can be
+    redrawn without recomputing it. Uses whichever was written last: the
+    memory-mapped .npy from blocked mode (not read into RAM) or the CSV.
+    """
+    npy_is_newer = not os.path.exists(csv_path) or (os.path.exists(npy_path) and os.path.getmtime(npy_path) >= os.path.getmtime(csv_path))
+    if npy_is_newer and os.path.exists(npy_path) and os.path.exists(assets_path):
+        with open(assets_path) as f:
+            assets = json.load(f)
+        matrix = np.load(npy_path, mmap_mode="r")
+        return pd.DataFrame(matrix, index=assets, columns=assets, copy=False)
+    return pd.read_csv(csv_path, index_col=0)
+
+
+def cluster_order(matrix):
+    """
+    Asset order that puts correlated assets next to each other: average-linkage
+    hierarchical clustering on the distance 1 - correlation. A NaN correlation
+    (an asset whose price never changes) counts as 0, i.e. distance 1.
+    Falls back to the original order if scipy is not installed.
+    """
+    try:
+        from scipy.cluster.hierarchy import leaves_list, linkage
+        from scipy.spatial.distance import squareform
+    except ImportError:
+        print("   ⚠️  scipy not installed, assets are shown in their original order")
+        return np.arange(len(matrix))
+
+    distances = 1.0 - np.nan_to_num(np.asarray(matrix, dtype=np.float64), nan=0.0)
+    np.fill_diagonal(distances, 0.0)
+    distances = np.clip((distances + distances.T) / 2, 0.0, 2.0)
+    return leaves_list(linkage(squareform(distances, checks=False), method="average"))
+
+
+def landmark_order(matrix, n_landmarks=CLUSTER_MAX_ASSETS):
+    """
+    cluster_order for matrices too big to cluster directly: clusters
+    n_landmarks evenly spaced assets, then places every asset right after
+    the landmark it is most correlated with.
+    """
+    n = len(matrix)
+    landmarks = np.linspace(0, n - 1, n_landmarks).astype(int)
+    landmark_rank = np.empty(n_landmarks, dtype=np.int64)
+    landmark_rank[cluster_order(matrix[np.ix_(landmarks, landmarks)])] = np.arange(n_landmarks)
+
+    nearest = np.empty(n, dtype=np.int64)
+    for row_start in range(0, n, ROW_CHUNK):
+        # NaN (constant asset) would win argmax; treat it as uncorrelated
+        chunk = np.nan_to_num(np.asarray(matrix[row_start:row_start + ROW_CHUNK][:, landmarks]), nan=0.0)
+        nearest[row_start:row_start + ROW_CHUNK] = np.argmax(chunk, axis=1)
+    return np.lexsort((np.arange(n), landmark_rank[nearest]))
+
+
+def block_average(matrix, order, pixel_budget=PIXEL_BUDGET):
+    """
+    matrix[order][:, order] shrunk to at most pixel_budget cells per side by
+    averaging square blocks. Reads ROW_CHUNK rows at a time, so a memory-mapped
+    matrix is never fully loaded. Returns (image, block size).
+    """
+    n = len(order)
+    block = int(np.ceil(n / pixel_budget))
+    n_cells = int(np.ceil(n / block))
+    # Column boundaries of each block; the last block may be smaller
+    starts = np.arange(0, n, block)
+
+    image = np.empty((n_cells, n_cells), dtype=np.float32)
+    rows_per_chunk = max(block, (ROW_CHUNK // block) * block)
+    for row_start in range(0, n, rows_per_chunk):
+        rows = order[row_start:row_start + rows_per_chunk]
+        chunk = np.asarray(matrix[np.sort(rows)], dtype=np.float32)
+        # Rows came back in sorted order; put them back in cluster order
+        chunk = chunk[np.argsort(np.argsort(rows))][:, order]
+
+        col_sums = np.add.reduceat(chunk, starts, axis=1)
+        row_sums = np.add.reduceat(col_sums, np.arange(0, len(rows), block), axis=0)
+        row_sizes = np.diff(np.append(np.arange(0, len(rows), block), len(rows)))
+        col_sizes = np.diff(np.append(starts, n))
+        first_cell = row_start // block
+        image[first_cell:first_cell + len(row_sizes)] = row_sums / np.outer(row_sizes, col_sizes)
+    return image, block
+
+
+def plot_large_heatmap(correlation_matrix, output_path=HEATMAP_FILE, pixel_budget=PIXEL_BUDGET, cluster=CLUSTER_ASSETS):
+    """
+    Heatmap for hundreds or thousands of assets: clustered order, no cell
+    labels, at most pixel_budget cells per side, drawn as one rasterized image.
+    Uses a bare Agg Figure (no pyplot), so it never opens a window.
+    """
+    from matplotlib.figure import Figure
+
+    matrix = correlation_matrix.values
+    n = len(matrix)
+    order = np.arange(n)
+
+    if cluster:
+        order = cluster_order(matrix) if n <= CLUSTER_MAX_ASSETS else landmark_order(matrix)
+
+    image, block = block_average(matrix, order, pixel_budget)
+
+    fig = Figure(figsize=(10, 9))
+    ax = fig.add_subplot()
+    im = ax.imshow(image, cmap="coolwarm", vmin=-1, vmax=1, interpolation="nearest", rasterized=True)
+    fig.colorbar(im, ax=ax, label="Correlation")
+
+    if n <= pixel_budget and n <= 100:
+        labels = [correlation_matrix.index[i] for i in order]
+        ax.set_xticks(range(n), labels, rotation=90, fontsize=6)
+        ax.set_yticks(range(n), labels, fontsize=6)
+    else:
+        ax.set_xticks([])
+        ax.set_yticks([])
+        ax.set_xlabel(f"{n:,} assets" + (" (clustered)" if cluster else "") + (f", {block}x{block} blocks averaged" if block > 1 else ""))
+
+    ax.set_title("Asset Correlation Matrix\n(Negative = Diversification Benefit)", fontsize=14, fontweight="bold")
+    fig.savefig(output_path, dpi=LARGE_DPI, bbox_inches="tight")
+    return output_path
+
+
+def plot_annotated_heatmap(correlation_matrix, output_path=HEATMAP_FILE):
+    # The original small-matrix heatmap (one annotated cell per asset pair), on a bare Agg Figure
+    import seaborn as sns
+    from matplotlib.figure import Figure
+
+    fig = Figure(figsize=(10, 8))
+    ax = fig.add_subplot()
+    sns.heatmap(correlation_matrix, annot=True, fmt='.3f', cmap='coolwarm',
+                center=0, vmin=-1, vmax=1, square=True, cbar_kws={'label': 'Correlation'}, ax=ax)
+    ax.set_title('Asset Correlation Matrix\n(Negative = Diversification Benefit)', fontsize=14, fontweight='bold')
+    fig.tight_layout()
+    fig.savefig(output_path, dpi=300, bbox_inches='tight')
+    return output_path
+
+
+def plot_correlation_heatmap(correlation_matrix, output_path=HEATMAP_FILE):
+    """
+    Draws the heatmap for a correlation DataFrame: annotated for up to
+    ANNOTATION_LIMIT assets, otherwise the large-matrix mode.
+    """
+    if len(correlation_matrix) <= ANNOTATION_LIMIT:
+        return plot_annotated_heatmap(correlation_matrix, output_path)
+    return plot_large_heatmap(correlation_matrix, output_path)
+
+
+if __name__ == "__main__":
+    # Redraw the heatmap from the saved matrix (no returns needed)
+    print("📊 Redrawing correlation heatmap from the saved matrix...")
+    correlation_matrix = load_correlation_matrix()
+    print(f"   ✅ Heatmap saved to: {plot_correlation_heatmap(correlation_matrix)}")
@@ -0,0 +1,335 @@
+import numpy as np
+import warnings
+
+# --- Configuration ---
+FRONTIER_POINTS = 100      # Number of target returns solved along the frontier
+ADMM_RHO = 0.1             # Step size of the ADMM iterations
+ADMM_SIGMA = 1e-6          # Small regularization that keeps the linear system invertible
+ADMM_ALPHA = 1.6           # Over-relaxation factor (1.6 is the usual choice)
+ADMM_MAX_ITERATIONS = 20000
+ADMM_TOLERANCE = 1e-7      # Stop when primal and dual residuals are below this
+EQUALITY_RHO_SCALE = 1e3   # Equality rows get a much stiffer penalty than inequalities
+POLISH_TOLERANCE = 1e-9    # Allowed constraint violation for a polished solution
+POLISH_PASSES = 20         # Corrections of the guessed active set before giving up on a certificate
+
+
+def long_only_constraints(n_assets):
+    """
+    Builds the constraint rows  l <= A w <= u  for a fully invested,
+    long-only portfolio:
+    - sum of weights = 1
+    - 0 <= each weight <= 1
+    """
+    A = np.vstack([np.ones(n_assets), np.eye(n_assets)])
+    lower = np.concatenate([[1.0], np.zeros(n_assets)])
+    upper = np.ones(n_assets + 1)
+    return A, lower, upper
+
+
+def solve_qp(P, q, A, lower, upper, return_status=False):
+    """
+    Solves one or many convex quadratic programs that share P and A:
+
+        minimize    1/2 x^T P x + q^T x
+        subject to  lower <= A x <= upper
+
+    q, lower and upper can be 1-D (one problem) or 2-D (one problem per row),
+    so a whole efficient frontier is solved in a single batch.
+    Uses ADMM (the method behind OSQP) with one matrix factorization shared by
+    the whole batch, then "polishes" each answer by solving the exact
+    equality system on the constraints that ended up active.
+    Returns x with the same batch shape as q. A problem counts as converged if
+    the ADMM residuals got below ADMM_TOLERANCE or its polished answer passes
+    the optimality (KKT) check. A RuntimeWarning is raised for any other;
+    return_status=True returns (x, converged) instead, converged being a bool
+    (one problem) or one bool per problem.
+    """
+    P = np.asarray(P, dtype=float)
+    A = np.asarray(A, dtype=float)
+    single_problem = np.ndim(q) == 1 and np.ndim(lower) == 1 and np.ndim(upper) == 1
+
+    q = np.atleast_2d(np.asarray(q, dtype=float))
+    lower = np.atleast_2d(np.asarray(lower, dtype=float))
+    upper = np.atleast_2d(np.asarray(upper, dtype=float))
+    n_problems = max(q.shape[0], lower.shape[0], upper.shape[0])
+    n_vars = P.shape[0]
+    n_rows = A.shape[0]
+    q = np.broadcast_to(q, (n_problems, n_vars))
+    lower = np.broadcast_to(lower, (n_problems, n_rows))
+    upper = np.broadcast_to(upper, (n_problems, n_rows))
+
+    # Rows that are equalities in every problem of the batch get a stiffer rho
+    is_equality = np.all(lower == upper, axis=0)
+    rho = np.where(is_equality, ADMM_RHO * EQUALITY_RHO_SCALE, ADMM_RHO)
+
+    # The only linear system in ADMM: (P + sigma*I + A^T diag(rho) A) x = rhs
+    # It is the same for every iteration and every problem, so invert it once
+    kkt_matrix = P + ADMM_SIGMA * np.eye(n_vars) + A.T @ (rho[:, None] * A)
+    kkt_inverse = np.linalg.inv(kkt_matrix)
+
+    x = np.zeros((n_problems, n_vars))
+    z = np.zeros((n_problems, n_rows))
+    y = np.zeros((n_problems, n_rows))
+
+    for iteration in range(ADMM_MAX_ITERATIONS):
+        rhs = ADMM_SIGMA * x - q + (rho * z - y) @ A
+        x_tilde = rhs @ kkt_inverse
+        z_tilde = x_tilde @ A.T
+
+        x = ADMM_ALPHA * x_tilde + (1 - ADMM_ALPHA) * x
+        z_relaxed = ADMM_ALPHA * z_tilde + (1 - ADMM_ALPHA) * z
+        z_new = np.clip(z_relaxed + y / rho, lower, upper)
+        y = y + rho * (z_relaxed - z_new)
+        z = z_new
+
+        # Checking convergence costs as much as an iteration, so only do it every 10
+        if iteration % 10 == 9:
+            primal_residual = np.max(np.abs(x @ A.T - z))
+            dual_residual = np.max(np.abs(x @ P + q + y @ A))
+            if primal_residual < ADMM_TOLERANCE and dual_residual < ADMM_TOLERANCE:
+                break
+
+    primal_residuals = np.max(np.abs(x @ A.T - z), axis=1)
+    dual_residuals = np.max(np.abs(x @ P + q + y @ A), axis=1)
+    converged = (primal_residuals < ADMM_TOLERANCE) & (dual_residuals < ADMM_TOLERANCE)
+
+    for k in range(n_problems):
+        x[k], optimal = _polish(P, q[k], A, lower[k], upper[k], x[k], z[k], y[k])
+        converged[k] |= optimal
+
+    if return_status:
+        return (x[0], bool(converged[0])) if single_problem else (x, converged)
+    if not np.all(converged):
+        warnings.warn(f"solve_qp: {np.sum(~converged)} of {n_problems} problem(s) did not converge in "
+                      f"{ADMM_MAX_ITERATIONS} ADMM iterations (largest residual {max(primal_residuals.max(), dual_residuals.max()):.1e})",
+                      RuntimeWarning, stacklevel=2)
+    return x[0] if single_problem else x
+
+
+def _polish(P, q, A, lower, upper, x, z, y):
+    # Guess which constraints are active from the ADMM dual variables, then
+    # solve the equality-constrained problem on that active set exactly.
+    # Returns (x, optimal): optimal is True when the polished answer satisfies
+    # every KKT condition (feasible, stationary, multipliers of the right sign),
+    # with tolerances relative to the size of the problem's numbers.
+    # A degenerate optimum (more rows active than there are weights, or a bound
+    # touched with a zero multiplier) can make the first guess wrong, so the
+    # guess is corrected up to POLISH_PASSES times, as an active-set method would:
+    # - active rows that cannot all hold: drop the inequality ADMM was least sure of
+    # - rows outside their bounds: make them active at the bound they cross
+    # - multipliers of the wrong sign: drop those rows
+    # side: 0 = inactive, -1 = held at lower, +1 = held at upper
+    equality = lower == upper
+    side = np.where((upper - z) < y, 1, np.where((z - lower) < -y, -1, 0))
+    side[equality] = -1
+    # How sure ADMM is that a row is active; rows found violated are kept from then on
+    confidence = np.abs(y).astype(float)
+
+    finite_bounds = np.abs(np.concatenate([lower[np.isfinite(lower)], upper[np.isfinite(upper)]]))
+    feasibility_tolerance = POLISH_TOLERANCE * (1 + (finite_bounds.max() if len(finite_bounds) else 0))
+
+    def violations(point):
+        # How far each row is outside its bounds (0 inside)
+        values = A @ point
+        return np.maximum(lower - values, 0) + np.maximum(values - upper, 0)
+
+    def objective(point):
+        return 0.5 * point @ P @ point + q @ point
+
+    # Without a certificate, return the best feasible point seen (the ADMM iterate if nothing is)
+    best = x
+    best_objective = objective(x) if np.all(violations(x) <= feasibility_tolerance) else np.inf
+
+    for _ in range(POLISH_PASSES):
+        active = side != 0
+        if not np.any(active):
+            return best, False
+        A_active = A[active]
+        b_active = np.where(side[active] > 0, upper[active], lower[active])
+        x_polished, multipliers = _solve_active_set(P, q, A_active, b_active)
+        rows = np.flatnonzero(active)
+
+        if np.max(np.abs(A_active @ x_polished - b_active)) > feasibility_tolerance:
+            droppable = rows[~equality[rows]]
+            if len(droppable) == 0:
+                return best, False
+            side[droppable[np.argmin(confidence[droppable])]] = 0
+            continue
+
+        violation = violations(x_polished)
+        violated = violation > feasibility_tolerance
+        if np.any(violated):
+            side[violated] = np.where(A[violated] @ x_polished > upper[violated], 1, -1)
+            confidence[violated] = np.inf
+            continue
+
+        objective_polished = objective(x_polished)
+        if objective_polished < best_objective:
+            best, best_objective = x_polished, objective_polished
+
+        # Optimal if P x + q + A_active^T multipliers = 0 with multipliers >= 0 on upper bounds
+        # and <= 0 on lower bounds (either sign on equalities)
+        gradient = P @ x_polished + q
+        stationarity_scale = 1 + max(np.max(np.abs(gradient)), np.max(np.abs(A_active.T @ multipliers)))
+        if np.max(np.abs(gradient + A_active.T @ multipliers)) > ADMM_TOLERANCE * stationarity_scale:
+            return best, False
+        wrong_sign = np.where(side[active] > 0, -multipliers, multipliers)
+        wrong_sign[equality[active]] = 0
+        wrong = wrong_sign > ADMM_TOLERANCE * (1 + np.max(np.abs(multipliers)))
+        if not np.any(wrong):
+            return x_polished, True
+        side[rows[wrong]] = 0
+
+    return best, False
+
+
+def _solve_active_set(P, q, A_active, b_active):
+    """
+    Minimizes 1/2 x^T P x + q^T x with every row of A_active x = b_active held
+    exactly. Returns (x, one multiplier per row).
+    Rows on a single variable (bounds, mostly weights at 0) just fix that
+    variable, so only the free variables and the other rows go into the
+    linear system: with many assets at a bound it is far smaller than the
+    full KKT system.
+    """
+    n_vars = P.shape[0]
+    nonzero = A_active != 0
+    single = np.flatnonzero(nonzero.sum(axis=1) == 1)
+    # The first row on each variable fixes it; a second one stays a general row
+    variables, first = np.unique(np.argmax(nonzero[single], axis=1), return_index=True)
+    fixing = single[first]
+    general = np.setdiff1d(np.arange(len(A_active)), fixing)
+
+    x = np.zeros(n_vars)
+    x[variables] = b_active[fixing] / A_active[fixing, variables]
+    free = np.setdiff1d(np.arange(n_vars), variables)
+    A_free = A_active[np.ix_(general, free)]
+    n_general = len(general)
+
+    kkt = np.block([[P[np.ix_(free, free)], A_free.T], [A_free, np.zeros((n_general, n_general))]])
+    rhs = np.concatenate([-(q[free] + P[np.ix_(free, variables)] @ x[variables]),
+                          b_active[general] - A_active[np.ix_(general, variables)] @ x[variables]])
+    try:
+        solution = np.linalg.solve(kkt, rhs)
+    except np.linalg.LinAlgError:
+        # Dependent active rows (a degenerate vertex): least squares picks one solution
+        solution = np.linalg.lstsq(kkt, rhs, rcond=None)[0]
+    x[free] = solution[:len(free)]
+
+    # The fixing rows' multipliers make the gradient vanish on their variables
+    multipliers = np.zeros(len(A_active))
+    multipliers[general] = solution[len(free):]
+    gradient = P @ x + q + A_active[general].T @ multipliers[general]
+    multipliers[fixing] = -gradient[variables] / A_active[fixing, variables]
+    return x, multipliers
+
+
+def _clean_long_only(weights):
+    # Plain long-only problems only: clip round-off below 0 and renormalize to sum to 1.
+    # With constraint rows this could move the weights off a bound or a target, so it is not used there
+    weights = np.maximum(weights, 0)
+    return weights / np.sum(weights, axis=-1, keepdims=True)
+
+
+def min_variance_weights(cov_matrix, constraints=None):
+    """
+    Exact long-only minimum variance portfolio: minimize w^T Cov w.
+    constraints: optional (A, lower, upper) rows replacing the plain long-only
+    ones (see portfolio_constraints.constraint_rows); the same for every function below.
+    """
+    n_assets = cov_matrix.shape[0]
+    if constraints is not None:
+        return solve_qp(cov_matrix, np.zeros(n_assets), *constraints)
+    return _clean_long_only(solve_qp(cov_matrix, np.zeros(n_assets), *long_only_constraints(n_assets)))
+
+
+def max_return_weights(expected_returns, cov_matrix, constraints=None):
+    """
+    Long-only portfolio with the highest attainable expected return.
+    A tiny variance term picks the least risky one when several tie.
+    """
+    n_assets = cov_matrix.shape[0]
+    A, lower, upper = constraints if constraints is not None else long_only_constraints(n_assets)
+    return solve_qp(1e-6 * cov_matrix, -expected_returns, A, lower, upper)
+
+
+def max_sharpe_weights(expected_returns, cov_matrix, risk_free_rate, constraints=None):
+    """
+    Exact long-only maximum Sharpe ratio portfolio.
+
+    Max Sharpe is not a QP as written, but after the change of variables
+    y = w / (excess return of w) it becomes one:
+        minimize y^T Cov y  subject to  (returns - rf)^T y = 1, y >= 0
+    and the weights are w = y / sum(y).
+    Returns None when no asset beats the risk-free rate.
+    """
+    excess_returns = expected_returns - risk_free_rate
+    if constraints is not None:
+        return _constrained_max_sharpe_weights(excess_returns, cov_matrix, constraints)
+    if np.max(excess_returns) <= 0:
+        return None
+
+    n_assets = cov_matrix.shape[0]
+    A = np.vstack([excess_returns, np.eye(n_assets)])
+    lower = np.concatenate([[1.0], np.zeros(n_assets)])
+    upper = np.concatenate([[1.0], np.full(n_assets, np.inf)])
+    y = solve_qp(cov_matrix, np.zeros(n_assets), A, lower, upper)
+    return _clean_long_only(y)
+
+
+def _constrained_max_sharpe_weights(excess_returns, cov_matrix, constraints):
+    # Same change of variables with a scale kappa = 1 / (excess return of w) as an extra
+    # variable, y = kappa w: every row  lower <= A w <= upper  becomes
+    # A y - lower kappa >= 0  and  A y - upper kappa <= 0, which is still a QP in (y, kappa)
+    A, lower, upper = constraints
+    n_assets = cov_matrix.shape[0]
+    best = max_return_weights(excess_returns, cov_matrix, constraints)
+    if best @ excess_returns <= 0:
+        return None
+
+    # (row over [y, kappa], lower, upper) for the homogenized problem
+    rows = []
+    for a, low, high in zip(A, lower, upper):
+        if low == high:
+            rows.append((np.append(a, -low), 0.0, 0.0))
+            continue
+        if np.isfinite(low):
+            rows.append((np.append(a, -low), 0.0, np.inf))
+        if np.isfinite(high):
+            rows.append((np.append(a, -high), -np.inf, 0.0))
+    rows.append((np.append(excess_returns, 0.0), 1.0, 1.0))
+    rows.append((np.append(np.zeros(n_assets), 1.0), 0.0, np.inf))
+    A_homogenized = np.array([row for row, _, _ in rows])
+    lower_homogenized = np.array([low for _, low, _ in rows])
+    upper_homogenized = np.array([high for _, _, high in rows])
+
+    P = np.zeros((n_assets + 1, n_assets + 1))
+    P[:n_assets, :n_assets] = cov_matrix
+    solution = solve_qp(P, np.zeros(n_assets + 1), A_homogenized, lower_homogenized, upper_homogenized)
+    y, kappa = solution[:n_assets], solution[n_assets]
+    return y / kappa
+
+
+def efficient_frontier_weights(expected_returns, cov_matrix, n_points=FRONTIER_POINTS, constraints=None):
+    """
+    Weights of n_points long-only portfolios on the efficient frontier, from
+    the minimum variance portfolio up to the maximum return portfolio.
+    For each target return: minimize w^T Cov w subject to w^T returns = target.
+    All targets are solved together as one batch.
+    """
+    n_assets = cov_matrix.shape[0]
+
+    min_var_return = min_variance_weights(cov_matrix, constraints) @ expected_returns
+    max_return = max_return_weights(expected_returns, cov_matrix, constraints) @ expected_returns
+    target_returns = np.linspace(min_var_return, max_return, n_points)
+
+    A, lower, upper = constraints if constraints is not None else long_only_constraints(n_assets)
+    A = np.vstack([A, expected_returns])
+    lower = np.column_stack([np.tile(lower, (n_points, 1)), target_returns])
+    upper = np.column_stack([np.tile(upper, (n_points, 1)), target_returns])
+
+    weights = solve_qp(cov_matrix, np.zeros((n_points, n_assets)), A, lower, upper)
+
+    # Clean up round-off so weights are exactly long-only and sum to 1 (plain long-only only:
+    # with constraint rows the solver's answer already satisfies them and the target return)
+    return _clean_long_only(weights) if constraints is None else weights
@@ -1,20 +1,203 @@
-import yfinance as yf
 import pandas as pd
+import json
 import os
+from concurrent.futures import ThreadPoolExecutor
+from datetime import timedelta
+from instrumentation import instrumented_stage, step, throughput
 
 # --- Configuration ---
 # A list of the stock tickers you want to download.
 TICKERS = ["RBLX", "VWCE.DE"]
-# The start and end dates for the historical data.
+# The start and end dates for the historical data (the end date is not included).
 START_DATE = "2023-01-01"
 END_DATE = "2026-01-18"
 # The name of the folder where the output files will be saved.
 OUTPUT_DIR = "data"
+# Where to get prices from: "yahoo" (internet) or "fixtures" (local CSVs, e.g. for tests).
+DATA_PROVIDER = "yahoo"
+FIXTURE_DIR = os.path.join("data", "fixtures")
+# How many tickers to download at the same time.
+MAX_WORKERS = 8
+# Remembers which date range is already saved for each ticker.
+CACHE_FILE = os.path.join(OUTPUT_DIR, ".fetch_cache.json")
+# A saved file without a cache entry whose first row is at most this many business days after
+# START_DATE is taken to start at START_DATE (the first days of the range were market holidays).
+HOLIDAY_SLACK_DAYS = 3
 
-def fetch_stock_data():
+PRICE_COLUMNS = ["Open", "High", "Low", "Close", "Volume"]
+
+
+def price_filename(ticker):
+    """
+    File name for a ticker, e.g. "VWCE.DE" -> "vwce_de_prices.csv".
+    The dot is replaced so the name matches what merge_datasets.py reads.
+    """
+    return f"{ticker.lower().replace('.', '_')}_prices.csv"
+
+
+def read_price_csv(filepath):
+    """
+    Reads a price CSV into a DataFrame indexed by Date.
+    Understands both the flat layout (Date,Open,High,Low,Close,Volume) and
+    the three-row header that yfinance writes (Price / Ticker / Date rows).
+    """
+    with open(filepath) as f:
+        f.readline()
+        second_line = f.readline()
+
+    if second_line.startswith("Ticker,"):
+        # yfinance layout: row 1 = column names, row 2 = ticker, row 3 = "Date,,,"
+        df = pd.read_csv(filepath, header=0, skiprows=[1, 2], index_col=0)
+    else:
+        df = pd.read_csv(filepath, index_col=0)
+
+    df.index = pd.to_datetime(df.index)
+    df.index.name = "Date"
+    return df
+
+
+# --- Data providers ---
+# A provider is any function (ticker, start, end) -> DataFrame indexed by Date
+# with PRICE_COLUMNS, covering start <= Date < end (empty if there is no data).
+
+def yahoo_provider(ticker, start, end):
+    # yfinance is only needed when we actually download from Yahoo
+    import yfinance as yf
+
+    # Tickers are fetched from several threads at once. yf.download collects its results in
+    # module-global state (yfinance.shared), so parallel calls can mix up or lose each other's
+    # frames; Ticker.history keeps everything in its own object.
+    data = yf.Ticker(ticker).history(start=start, end=end)
+    if data.empty:
+        return data
+
+    # history() stamps rows with the exchange's time zone; keep the plain trading dates
+    if data.index.tz is not None:
+        data.index = data.index.tz_localize(None)
+    data.index.name = "Date"
+    return data[[col for col in PRICE_COLUMNS if col in data.columns]]
+
+
+def make_fixture_provider(fixture_dir=FIXTURE_DIR):
+    """
+    Provider that serves prices from saved CSVs in fixture_dir
+    (same file names as the outputs), so the fetcher can run offline.
+    """
+    def fixture_provider(ticker, start, end):
+        filepath = os.path.join(fixture_dir, price_filename(ticker))
+        if not os.path.exists(filepath):
+            return pd.DataFrame(columns=PRICE_COLUMNS)
+        df = read_price_csv(filepath)
+        return df[(df.index >= pd.Timestamp(start)) & (df.index < pd.Timestamp(end))]
+
+    return fixture_provider
+
+
+def get_provider(name=DATA_PROVIDER):
+    if name == "yahoo":
+        return yahoo_provider
+    if name == "fixtures":
+        return make_fixture_provider()
+    raise ValueError(f"Unknown data provider: {name} (expected 'yahoo' or 'fixtures')")
+
+
+# --- Cache ---
+
+def load_cache():
+    if not os.path.exists(CACHE_FILE):
+        return {}
+    with open(CACHE_FILE) as f:
+        return json.load(f)
+
+
+def save_cache(cache):
+    with open(CACHE_FILE, "w") as f:
+        json.dump(cache, f, indent=2, sort_keys=True)
+
+
+def cached_range(ticker, cache, output_path):
+    """
+    (start, end) already saved for a ticker, or None.
+    Files without a cache entry (e.g. a fresh checkout: the cache is not
+    committed) are trusted from their first date, or from START_DATE when the
+    first row is within HOLIDAY_SLACK_DAYS business days of it, to the day
+    after their last date.
+    """
+    if ticker in cache and os.path.exists(output_path):
+        return cache[ticker]["start"], cache[ticker]["end"]
+    if os.path.exists(output_path):
+        existing = read_price_csv(output_path)
+        if not existing.empty:
+            first = existing.index.min()
+            start = str(first.date())
+            if first > pd.Timestamp(START_DATE) and business_days(START_DATE, start) <= HOLIDAY_SLACK_DAYS:
+                start = START_DATE
+            return start, str((existing.index.max() + timedelta(days=1)).date())
+    return None
+
+
+def business_days(start, end):
+    # Weekdays in [start, end); no trading day can be missing from a range without any
+    return len(pd.bdate_range(start, end, inclusive="left"))
+
+
+def missing_ranges(held, start, end):
+    """
+    Date ranges inside [start, end) that are not in the held (start, end) range.
+    Usually just the tail since the last run. Ranges that are only a weekend
+    are left out, as no prices can be missing there.
+    """
+    if held is None:
+        return [(start, end)]
+    held_start, held_end = held
+    ranges = []
+    if start < held_start:
+        ranges.append((start, held_start))
+    if end > held_end:
+        ranges.append((held_end, end))
+    return [(range_start, range_end) for range_start, range_end in ranges if business_days(range_start, range_end) > 0]
+
+
+def update_ticker(ticker, provider, held):
+    """
+    Downloads only the missing date ranges for one ticker, appends them to its
+    CSV and returns (ticker, new held range or None, message).
+    Runs in a worker thread, so it returns messages instead of printing.
+    """
+    output_path = os.path.join(OUTPUT_DIR, price_filename(ticker))
+    to_fetch = missing_ranges(held, START_DATE, END_DATE)
+    if not to_fetch:
+        # Record the whole requested range, including the weekend or holidays at its edges
+        held = (min(START_DATE, held[0]), max(END_DATE, held[1]))
+        return ticker, held, f"⏭️  {ticker}: already up to date ({held[0]} to {held[1]})"
+
+    new_parts = [provider(ticker, start, end) for start, end in to_fetch]
+    new_parts = [part for part in new_parts if not part.empty]
+
+    if held is None and not new_parts:
+        return ticker, None, f"⚠️  Warning: No data was returned for {ticker}. Skipping file save."
+
+    frames = ([read_price_csv(output_path)] if held is not None else []) + new_parts
+    data = pd.concat(frames)
+    # If a date was downloaded again, keep the newest version
+    data = data[~data.index.duplicated(keep="last")].sort_index()
+    data.to_csv(output_path)
+
+    new_held = (min([START_DATE] + ([held[0]] if held else [])), max([END_DATE] + ([held[1]] if held else [])))
+    added_rows = sum(len(part) for part in new_parts)
+    return ticker, new_held, f"✅  {ticker}: +{added_rows} new rows, {len(data)} total, saved to {output_path}"
+
+
+@instrumented_stage("fetch_stock_data")
+def fetch_stock_data(provider=None):
     """
     This is our main function. It creates the output directory if needed,
-    then loops through the TICKERS list and downloads the data for each one.
+    then updates every ticker in TICKERS at the same time (one thread each,
+    up to MAX_WORKERS). Only dates that are not saved yet are downloaded.
+    provider: optional data source function (defaults to DATA_PROVIDER).
+    Returns True if every ticker is saved and up to date, False if any
+    failed (download error, no data, yfinance not installed), so the
+    pipeline does not record the stage as done.
     """
     # First, check if the output directory exists.
     if not os.path.exists(OUTPUT_DIR):
@@ -22,46 +205,48 @@ def fetch_stock_data():
         print(f"Directory '{OUTPUT_DIR}' not found. Creating it now...")
         os.makedirs(OUTPUT_DIR)
 
+    if provider is None:
+        provider = get_provider()
+    failed = []
+
     print("--- Starting Data Fetching Process ---")
-    
-    # This loop will run once for "RBLX" and once for "VWCE.DE".
-    for ticker in TICKERS:
-        # A try/except block is used to prevent the script from crashing
-        # if there's a network error or a problem with one specific ticker.
-        try:
-            # --- All actions that might fail go inside the 'try' block. ---
-            
-            print(f"Fetching data for ticker: {ticker}...")
-            
-            # 1. Download the data from Yahoo Finance.
-            data = yf.download(ticker, start=START_DATE, end=END_DATE)
-
-            # 2. Check if the download was successful. Sometimes yfinance
-            # returns an empty table (DataFrame) if the ticker is wrong
-            # or there's no data for the requested dates.
-            if data.empty:
-                print(f"⚠️  Warning: No data was returned for {ticker}. Skipping file save.")
-                # 'continue' immediately stops this iteration of the loop
-                # and jumps to the next ticker.
-                continue
-
-            # 3. Create a clean filename (e.g., "rblx_prices.csv").
-            filename = f"{ticker.lower()}_prices.csv"
-            # 4. Safely join the directory and filename to create the full path.
-            output_path = os.path.join(OUTPUT_DIR, filename)
-
-            # 5. Save the downloaded data table to the CSV file.
-            data.to_csv(output_path)
-            
-            print(f"✅  Success! Data for {ticker} saved to {output_path}")
-
-        # If any line inside the 'try' block causes an error,
-        # the program will immediately jump here.
-        except Exception as e:
-            # This will print a helpful error message without crashing the script.
-            print(f"❌ ERROR: An error occurred for ticker {ticker}. Reason: {e}")
+
+    step("load_cache")
+    cache = load_cache()
+    held_ranges = {ticker: cached_range(ticker, cache, os.path.join(OUTPUT_DIR, price_filename(ticker))) for ticker in TICKERS}
+
+    step("download")
+    throughput(len(TICKERS), "tickers")
+    with ThreadPoolExecutor(max_workers=MAX_WORKERS) as pool:
+        futures = {ticker: pool.submit(update_ticker, ticker, provider, held_ranges[ticker]) for ticker in TICKERS}
+
+        for ticker, future in futures.items():
+            # A try/except block is used to prevent the script from crashing
+            # if there's a network error or a problem with one specific ticker.
+            try:
+                _, new_held, message = future.result()
+                print(message)
+                if new_held is not None:
+                    cache[ticker] = {"start": new_held[0], "end": new_held[1], "file": price_filename(ticker)}
+                else:
+                    failed.append(ticker)
+            except Exception as e:
+                # This will print a helpful error message without crashing the script.
+                print(f"❌ ERROR: An error occurred for ticker {ticker}. Reason: {e}")
+                failed.append(ticker)
+
+    step("save_cache")
+    save_cache(cache)
+
+    if failed:
+        print(f"❌ ERROR: {len(failed)} of {len(TICKERS)} ticker(s) could not be updated: {', '.join(failed)}")
+        return False
+    return True
+
 
 # This special block ensures the script runs our main function
 # when you execute the file directly from the terminal.
 if __name__ == "__main__":
-    fetch_stock_data()
\ No newline at end of file
+    import sys
+    # A non-zero exit code tells run_pipeline.py the stage failed
+    sys.exit(0 if fetch_stock_data() else 1)
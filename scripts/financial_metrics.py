@@ -1,6 +1,8 @@
 import pandas as pd
 import numpy as np
 import os
+from instrumentation import instrumented_stage, step, throughput
+from return_moments import load_return_moments, moments_from_frame
 
 # --- Configuration ---
 OUTPUT_DIR = "data"
@@ -11,44 +13,38 @@ WEEKS_YEAR = 52
 ROBLOX_ITEMS = ["Dominus_Empyreus", "Violet_Valkyrie", "Red_Valkyrie"]
 STOCK_TICKERS = ["RBLX", "VWCE_DE"]
 
-def calculate_financial_metrics():
+def compute_financial_metrics(returns_df, round_values=True):
     """
-    Calculates:
-    - Annual Returns
-    - Annualized Volatility
-    - Sharpe Ratios
-    - Risk-adjusted performance comparison
+    In-memory core: one row per asset with annual return, annualized
+    volatility and Sharpe ratio, computed from a returns DataFrame.
+    round_values=False keeps full precision (used by the in-memory pipeline,
+    where the optimizer rebuilds covariance from these numbers).
     """
-    print("=" * 70)
-    print("💰 FINANCIAL METRICS CALCULATOR")
-    print("=" * 70)
-    
-    # Load returns data
-    filepath = os.path.join(OUTPUT_DIR, "returns_calculated.csv")
-    if not os.path.exists(filepath):
-        print(f"❌ ERROR: {filepath} not found!")
-        print("   Please run calculate_returns.py first.")
-        return
-    
-    print(f"\n📥 Loading returns from {filepath}...")
-    returns_df = pd.read_csv(filepath)
-    
+    return metrics_from_moments(moments_from_frame(returns_df), round_values)
+
+def metrics_from_moments(moments, round_values=True):
+    """
+    Same table as compute_financial_metrics, from the per-period means and
+    standard deviations of return_moments.py (one pass over the returns,
+    shared with the correlation matrix and the optimizer).
+    """
+    def maybe_round(value, digits):
+        return round(value, digits) if round_values else value
+
+    position = {asset: i for i, asset in enumerate(moments['assets'])}
+
     # Initialize results dataframe
     metrics = []
     
     # Process Roblox items (weekly data -> annualize by √52)
-    print("\n🎮 Processing Roblox Items (weekly data)...")
     for item in ROBLOX_ITEMS:
-        col = f'{item}_Return'
-        if col in returns_df.columns:
-            returns = returns_df[col].dropna()
-            
+        if item in position:
             # Annual return: (1 + mean_weekly_return)^52 - 1
-            mean_weekly_return = returns.mean()
+            mean_weekly_return = moments['mean'][position[item]]
             annual_return = (1 + mean_weekly_return) ** WEEKS_YEAR - 1
             
             # Annualized volatility: std_dev_weekly * √52
-            weekly_volatility = returns.std()
+            weekly_volatility = moments['std'][position[item]]
             annual_volatility = weekly_volatility * np.sqrt(WEEKS_YEAR)
             
             # Sharpe ratio: (Annual Return - Risk Free Rate) / Annual Volatility
@@ -57,29 +53,22 @@ def calculate_financial_metrics():
             metrics.append({
                 'Asset': item,
                 'Type': 'Roblox Item',
-                'Annual_Return_%': round(annual_return * 100, 2),
-                'Annual_Volatility_%': round(annual_volatility * 100, 2),
-                'Sharpe_Ratio': round(sharpe_ratio, 3),
-                'Data_Points': len(returns),
-                'Mean_Weekly_Return_%': round(mean_weekly_return * 100, 3)
+                'Annual_Return_%': maybe_round(annual_return * 100, 2),
+                'Annual_Volatility_%': maybe_round(annual_volatility * 100, 2),
+                'Sharpe_Ratio': maybe_round(sharpe_ratio, 3),
+                'Data_Points': int(moments['count'][position[item]]),
+                'Mean_Weekly_Return_%': maybe_round(mean_weekly_return * 100, 3)
             })
-            
-            print(f"   ✅ {item}")
-            print(f"      Return: {annual_return*100:.2f}% | Volatility: {annual_volatility*100:.2f}% | Sharpe: {sharpe_ratio:.3f}")
     
     # Process stocks (daily data -> annualize by √252)
-    print("\n📈 Processing Stocks (daily data)...")
     for ticker in STOCK_TICKERS:
-        col = f'{ticker}_Return'
-        if col in returns_df.columns:
-            returns = returns_df[col].dropna()
-            
+        if ticker in position:
             # Annual return: (1 + mean_daily_return)^252 - 1
-            mean_daily_return = returns.mean()
+            mean_daily_return = moments['mean'][position[ticker]]
             annual_return = (1 + mean_daily_return) ** TRADING_DAYS_YEAR - 1
             
             # Annualized volatility: std_dev_daily * √252
-            daily_volatility = returns.std()
+            daily_volatility = moments['std'][position[ticker]]
             annual_volatility = daily_volatility * np.sqrt(TRADING_DAYS_YEAR)
             
             # Sharpe ratio
@@ -88,22 +77,61 @@ def calculate_financial_metrics():
             metrics.append({
                 'Asset': ticker,
                 'Type': 'Stock',
-                'Annual_Return_%': round(annual_return * 100, 2),
-                'Annual_Volatility_%': round(annual_volatility * 100, 2),
-                'Sharpe_Ratio': round(sharpe_ratio, 3),
-                'Data_Points': len(returns),
-                'Mean_Daily_Return_%': round(mean_daily_return * 100, 3)
+                'Annual_Return_%': maybe_round(annual_return * 100, 2),
+                'Annual_Volatility_%': maybe_round(annual_volatility * 100, 2),
+                'Sharpe_Ratio': maybe_round(sharpe_ratio, 3),
+                'Data_Points': int(moments['count'][position[ticker]]),
+                'Mean_Daily_Return_%': maybe_round(mean_daily_return * 100, 3)
             })
-            
-            print(f"   ✅ {ticker}")
-            print(f"      Return: {annual_return*100:.2f}% | Volatility: {annual_volatility*100:.2f}% | Sharpe: {sharpe_ratio:.3f}")
     
-    # Create metrics dataframe
-    metrics_df = pd.DataFrame(metrics)
+    return pd.DataFrame(metrics)
+
+@instrumented_stage("calculate_financial_metrics")
+def calculate_financial_metrics(returns_df=None, save_csv=True, round_values=True, moments=None):
+    """
+    Calculates:
+    - Annual Returns
+    - Annualized Volatility
+    - Sharpe Ratios
+    - Risk-adjusted performance comparison
+    Pass returns_df to use in-memory returns instead of returns_calculated.csv;
+    save_csv=False skips writing financial_metrics.csv. Returns the metrics DataFrame.
+    moments: precomputed return_moments.py statistics, so the returns are not
+    scanned again (the in-memory pipeline shares one pass between stages).
+    """
+    print("=" * 70)
+    print("💰 FINANCIAL METRICS CALCULATOR")
+    print("=" * 70)
+    
+    if moments is None and returns_df is None:
+        # Load returns data (one streaming pass, cached in return_moments.npz)
+        filepath = os.path.join(OUTPUT_DIR, "returns_calculated.csv")
+        if not os.path.exists(filepath):
+            print(f"❌ ERROR: {filepath} not found!")
+            print("   Please run calculate_returns.py first.")
+            return
+        
+        step("load_moments")
+        print(f"\n📥 Loading returns from {filepath}...")
+        moments = load_return_moments(filepath, os.path.join(OUTPUT_DIR, "return_moments.npz"))
+    elif moments is None:
+        step("return_moments")
+        moments = moments_from_frame(returns_df)
+    
+    step("compute_financial_metrics")
+    metrics_df = metrics_from_moments(moments, round_values)
+    throughput(int(moments['count'].sum()), "values")
+
+    print("\n🧮 Per-asset metrics (Roblox items: weekly → √52, stocks: daily → √252)...")
+    for _, row in metrics_df.iterrows():
+        print(f"   ✅ {row['Asset']}")
+        print(f"      Return: {row['Annual_Return_%']:.2f}% | Volatility: {row['Annual_Volatility_%']:.2f}% | Sharpe: {row['Sharpe_Ratio']:.3f}")
     
     # Save to CSV
     output_path = os.path.join(OUTPUT_DIR, "financial_metrics.csv")
-    metrics_df.to_csv(output_path, index=False)
+    if save_csv:
+        step("save_csv")
+        metrics_df.to_csv(output_path, index=False)
     
     # Display results
     print(f"\n{'=' * 70}")
@@ -127,5 +155,7 @@ def calculate_financial_metrics():
     
     print(f"\n{'=' * 70}\n")
 
+    return metrics_df
+
 if __name__ == "__main__":
-    calculate_financial_metrics()
\ No newline at end of file
+    calculate_financial_metrics()
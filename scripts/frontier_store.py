@@ -0,0 +1,111 @@
+import numpy as np
+import json
+import os
+
+# --- Configuration ---
+METRIC_COLUMNS = ["return", "volatility", "sharpe_ratio"]  # Stored as fractions, not %
+FILTER_CHUNK_SIZE = 1000000  # Rows scanned at a time by filter_frontier
+
+
+def save_frontier_npy(directory, results, weights, assets):
+    """
+    Saves portfolios as one .npy file per column plus the full weight matrix:
+
+        <directory>/return.npy        (N,)
+        <directory>/volatility.npy    (N,)
+        <directory>/sharpe_ratio.npy  (N,)
+        <directory>/weights.npy       (N, n_assets)
+        <directory>/meta.json         asset order and row count
+
+    results has the usual 3 x N layout [return, volatility, sharpe].
+    .npy files are raw binary with a tiny header, so they can be memory-mapped
+    and sliced without reading the whole file.
+    """
+    os.makedirs(directory, exist_ok=True)
+
+    for row, column in enumerate(METRIC_COLUMNS):
+        np.save(os.path.join(directory, f"{column}.npy"), np.ascontiguousarray(results[row]))
+    np.save(os.path.join(directory, "weights.npy"), np.ascontiguousarray(weights))
+
+    meta = {"assets": list(assets), "rows": int(results.shape[1]), "columns": METRIC_COLUMNS + ["weights"]}
+    with open(os.path.join(directory, "meta.json"), "w") as f:
+        json.dump(meta, f, indent=2)
+
+
+def load_frontier(directory, columns=None, rows=None):
+    """
+    Opens a frontier saved by save_frontier_npy without parsing it.
+    - columns: subset of METRIC_COLUMNS + ["weights"] (default: all)
+    - rows: optional slice or index array, applied to every column
+    Returns a dict of arrays plus "assets". Without rows the arrays are
+    read-only memory maps, so nothing is read from disk until it is used.
+    """
+    with open(os.path.join(directory, "meta.json")) as f:
+        meta = json.load(f)
+
+    if columns is None:
+        columns = meta["columns"]
+
+    frontier = {"assets": meta["assets"]}
+    for column in columns:
+        values = np.load(os.path.join(directory, f"{column}.npy"), mmap_mode="r")
+        frontier[column] = values if rows is None else np.asarray(values[rows])
+    return frontier
+
+
+def filter_frontier(directory, min_return=None, max_volatility=None, min_sharpe=None, include_weights=True):
+    """
+    Returns the rows that satisfy all given bounds, e.g.
+        filter_frontier(path, max_volatility=0.10, min_sharpe=1.0)
+    The metric columns are scanned from the memory maps FILTER_CHUNK_SIZE rows
+    at a time, and only the weights of matching rows are read.
+    The result also has an "index" array with the matching row numbers.
+    """
+    frontier = load_frontier(directory)
+    n_rows = len(frontier["return"])
+
+    matches = []
+    for start in range(0, n_rows, FILTER_CHUNK_SIZE):
+        stop = min(start + FILTER_CHUNK_SIZE, n_rows)
+        keep = np.ones(stop - start, dtype=bool)
+        if min_return is not None:
+            keep &= frontier["return"][start:stop] >= min_return
+        if max_volatility is not None:
+            keep &= frontier["volatility"][start:stop] <= max_volatility
+        if min_sharpe is not None:
+            keep &= frontier["sharpe_ratio"][start:stop] >= min_sharpe
+        matches.append(start + np.flatnonzero(keep))
+
+    index = np.concatenate(matches) if matches else np.zeros(0, dtype=np.int64)
+
+    selected = {"assets": frontier["assets"], "index": index}
+    for column in METRIC_COLUMNS:
+        selected[column] = np.asarray(frontier[column][index])
+    if include_weights:
+        selected["weights"] = np.asarray(frontier["weights"][index])
+    return selected
+
+
+def save_frontier_parquet(path, results, weights, assets):
+    """
+    Saves the same data as one Parquet file with a column per metric and per
+    asset weight. Needs pyarrow (pip install pyarrow).
+    """
+    import pyarrow as pa
+    import pyarrow.parquet as pq
+
+    table = {column: results[row] for row, column in enumerate(METRIC_COLUMNS)}
+    for i, asset in enumerate(assets):
+        table[f"weight_{asset}"] = weights[:, i]
+    pq.write_table(pa.table(table), path)
+
+
+def load_frontier_parquet(path, columns=None, filters=None):
+    """
+    Reads a Parquet frontier. Only the requested columns are decoded, and
+    filters such as [("sharpe_ratio", ">=", 1.0)] skip row groups that cannot
+    match. Returns a pandas DataFrame.
+    """
+    import pyarrow.parquet as pq
+
+    return pq.read_table(path, columns=columns, filters=filters).to_pandas()
@@ -14,30 +14,105 @@ ITEMS = {
 }
 
 WEEKS_TO_SIMULATE = 159
-TART_DATE_SIM = datetime.strptime("2023-01-01", "%Y-%m-%d")
-
-def simulate_price_history(item_name, config):
-   prices = [config["initial_price"]]
-    
-for _ in range(WEEKS_TO_SIMULATE - 1):
-        weekly_return = config["drift"] + np.random.normal(0, config["volatility"])
-        new_price = prices[-1] * (1 + weekly_return)
-        prices.append(new_price)
-        
-        dates = [TART_DATE_SIM + timedelta(weeks=i) for i in range(WEEKS_TO_SIMULATE)]
-      
-        df = pd.DataFrame({"Date": dates, "RAP": prices})
-        df['RAP'] = df['RAP'].astype(int)
-        df.set_index("Date", inplace=True)
-return df
+START_DATE_SIM = datetime.strptime("2023-01-01", "%Y-%m-%d")
+SIMULATION_SEED = None  # Set to an int for reproducible simulations
+
+# Monte Carlo stress paths (python generate_Roblox_historical_prices.py --paths N; does not rewrite the CSVs)
+STRESS_PATHS_FILE = os.path.join(OUTPUT_DIR, "simulated_price_paths.npy")
+MAX_BLOCK_BYTES = 256 * 1024 * 1024  # Largest block of returns generated at once
+
+
+def item_parameters(items=ITEMS):
+    """
+    Per-item parameters as arrays, in the order of the ITEMS dictionary:
+    (names, initial prices, weekly drifts, weekly volatilities).
+    """
+    names = list(items.keys())
+    initial_prices = np.array([items[name]["initial_price"] for name in names], dtype=float)
+    drifts = np.array([items[name]["drift"] for name in names], dtype=float)
+    volatilities = np.array([items[name]["volatility"] for name in names], dtype=float)
+    return names, initial_prices, drifts, volatilities
+
+
+def simulate_price_paths(initial_prices, drifts, volatilities, n_paths, n_weeks, rng):
+    """
+    Simulates every item and every path in one go.
+    Weekly return = drift + Normal(0, volatility), and
+    price_t = initial_price × (1 + r_1) × ... × (1 + r_t)
+    Returns an array of shape (items, paths, weeks); week 0 is the initial price.
+    """
+    n_items = len(initial_prices)
+
+    # One block of random returns for all items × paths × weeks
+    shocks = rng.standard_normal((n_items, n_paths, n_weeks - 1))
+    weekly_returns = drifts[:, None, None] + volatilities[:, None, None] * shocks
+
+    prices = np.empty((n_items, n_paths, n_weeks))
+    prices[:, :, 0] = initial_prices[:, None]
+    prices[:, :, 1:] = initial_prices[:, None, None] * np.cumprod(1 + weekly_returns, axis=2)
+    return prices
+
+
+def simulation_dates(n_weeks=WEEKS_TO_SIMULATE):
+    return [START_DATE_SIM + timedelta(weeks=i) for i in range(n_weeks)]
+
+
+def simulate_price_history(item_name, config, rng=None):
+    """
+    One simulated weekly price history for one item, as a DataFrame indexed
+    by Date with an integer RAP column.
+    """
+    if rng is None:
+        rng = np.random.default_rng(SIMULATION_SEED)
+
+    _, initial_prices, drifts, volatilities = item_parameters({item_name: config})
+    prices = simulate_price_paths(initial_prices, drifts, volatilities, 1, WEEKS_TO_SIMULATE, rng)[0, 0]
+
+    df = pd.DataFrame({"Date": simulation_dates(), "RAP": prices.astype(int)})
+    df.set_index("Date", inplace=True)
+    return df
+
+
+def simulate_paths_to_disk(n_paths, n_weeks=WEEKS_TO_SIMULATE, items=ITEMS, output_path=STRESS_PATHS_FILE, seed=SIMULATION_SEED):
+    """
+    Simulates n_paths price paths for every item and saves them as a
+    float32 .npy array of shape (items, paths, weeks).
+    Paths are generated in chunks of at most MAX_BLOCK_BYTES and written
+    straight into a memory-mapped file, so the full array never has to fit in RAM.
+    Load it with np.load(output_path, mmap_mode='r').
+    """
+    names, initial_prices, drifts, volatilities = item_parameters(items)
+    rng = np.random.default_rng(seed)
+
+    # float64 returns + float64 prices for one path of every item
+    bytes_per_path = len(names) * n_weeks * 8 * 2
+    paths_per_chunk = max(1, MAX_BLOCK_BYTES // bytes_per_path)
+
+    output = np.lib.format.open_memmap(output_path, mode="w+", dtype=np.float32, shape=(len(names), n_paths, n_weeks))
+    for start in range(0, n_paths, paths_per_chunk):
+        stop = min(start + paths_per_chunk, n_paths)
+        output[:, start:stop, :] = simulate_price_paths(initial_prices, drifts, volatilities, stop - start, n_weeks, rng)
+        print(f"   Simulated {stop:,} / {n_paths:,} paths...")
+    output.flush()
+    del output
+
+    return names
+
 
 def generate_all_simulations():
     print("\n--- Starting Task 1.4: Simulate Roblox Historical Prices ---")
-    
-    for item, params in ITEMS.items():
+
+    # All items are simulated together in one vectorized call
+    names, initial_prices, drifts, volatilities = item_parameters()
+    rng = np.random.default_rng(SIMULATION_SEED)
+    prices = simulate_price_paths(initial_prices, drifts, volatilities, 1, WEEKS_TO_SIMULATE, rng)[:, 0, :]
+    dates = simulation_dates()
+
+    for i, item in enumerate(names):
         print(f"Simulating price history for {item}...")
         try:
-            price_df = simulate_price_history(item, params)
+            price_df = pd.DataFrame({"Date": dates, "RAP": prices[i].astype(int)})
+            price_df.set_index("Date", inplace=True)
             output_path = os.path.join(OUTPUT_DIR, f"{item.lower()}_prices.csv")
             price_df.to_csv(output_path)
             print(f"✅ Successfully saved simulated data for {item} to {output_path}")
@@ -46,5 +121,20 @@ def generate_all_simulations():
 
     print("\n--- Roblox item price simulation complete. ---")
 
+
 if __name__ == "__main__":
-    generate_all_simulations()
\ No newline at end of file
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Simulate Roblox item price histories.")
+    parser.add_argument("--paths", type=int,
+                        help="Only simulate this many Monte Carlo paths per item into STRESS_PATHS_FILE "
+                             "(the item price CSVs are left untouched)")
+    args = parser.parse_args()
+
+    if args.paths:
+        # The price CSVs are pipeline inputs; a stress-path run must not replace them with new random data
+        print(f"\n--- Simulating {args.paths:,} stress paths per item ---")
+        simulate_paths_to_disk(args.paths)
+        print(f"✅ Paths saved to {STRESS_PATHS_FILE}")
+    else:
+        generate_all_simulations()
@@ -0,0 +1,147 @@
+import contextlib
+import functools
+import io
+import json
+import os
+import resource
+import sys
+import time
+from datetime import datetime, timezone
+
+# --- Configuration ---
+OUTPUT_DIR = "data"
+# Where stage timings are appended as JSON lines; None turns the file off
+METRICS_FILE = os.path.join(OUTPUT_DIR, "stage_metrics.jsonl")
+# "verbose" = the scripts' normal output plus a timing summary per stage,
+# "quiet" = only the one-line summary. Read from the environment so run_pipeline.py
+# can pass it on to the stages it starts as separate processes.
+VERBOSITY = os.environ.get("PIPELINE_VERBOSITY", "verbose")
+
+# The stage running right now (stages do not nest; an inner one is recorded on its own)
+_current = []
+
+
+def peak_rss_mb():
+    # Highest resident memory of this process so far (ru_maxrss is KB on Linux, bytes on macOS)
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak / (1024 ** 2 if sys.platform == "darwin" else 1024)
+
+
+def _emit(record):
+    if METRICS_FILE is None:
+        return
+    directory = os.path.dirname(METRICS_FILE)
+    if directory:
+        os.makedirs(directory, exist_ok=True)
+    with open(METRICS_FILE, "a") as f:
+        f.write(json.dumps(record) + "\n")
+
+
+def _close_step(stage_record):
+    # Ends the open sub-step (if any): stores its wall time, throughput and peak RSS, and emits it
+    step_record = stage_record.pop("_open_step", None)
+    if step_record is None:
+        return
+    step_record["seconds"] = time.perf_counter() - step_record.pop("_start")
+    if step_record.get("items") is not None and step_record["seconds"] > 0:
+        step_record["items_per_second"] = step_record["items"] / step_record["seconds"]
+    step_record["peak_rss_mb"] = peak_rss_mb()
+    stage_record["steps"].append(step_record)
+    _emit(dict(event="step", run_id=stage_record["run_id"], stage=stage_record["stage"], **step_record))
+
+
+def step(name):
+    """
+    Starts timing sub-step `name` of the running stage; the previous sub-step
+    ends here. Does nothing outside an instrumented stage, so the functions
+    still work when called on their own.
+    """
+    if not _current:
+        return
+    stage_record = _current[-1]
+    _close_step(stage_record)
+    stage_record["_open_step"] = {"step": name, "_start": time.perf_counter()}
+
+
+def throughput(items, unit):
+    """
+    Records how many items (rows, portfolios, tickers...) the current sub-step
+    processed, for items/second. The largest count also becomes the stage's.
+    """
+    if not _current:
+        return
+    stage_record = _current[-1]
+    if "_open_step" in stage_record:
+        stage_record["_open_step"].update(items=items, unit=unit)
+    if stage_record.get("items") is None or items > stage_record["items"]:
+        stage_record.update(items=items, unit=unit)
+
+
+def _summary_line(stage_record):
+    line = f"⏱️  {stage_record['stage']}: {stage_record['seconds']:.2f}s"
+    if stage_record.get("items_per_second"):
+        line += f", {stage_record['items_per_second']:,.0f} {stage_record['unit']}/s"
+    line += f", peak RSS {stage_record['peak_rss_mb']:,.0f} MB"
+    if stage_record["status"] != "ok":
+        line += f" ({stage_record['status']})"
+    return line
+
+
+def instrumented_stage(name):
+    """
+    Decorator for a stage entry point. Times the whole call and each step()
+    inside it, records throughput and peak RSS, and appends one JSON line per
+    sub-step plus one for the stage to METRICS_FILE. In quiet mode the stage's
+    own console output is swallowed and only a one-line summary is printed,
+    unless the stage fails: it raises, or returns None / False (the stages'
+    way of reporting missing inputs). Its output is then printed after all,
+    so the error messages are not lost, and the status is "failed".
+    """
+    def decorator(function):
+        @functools.wraps(function)
+        def wrapper(*args, **kwargs):
+            stage_record = {
+                "stage": name,
+                "run_id": datetime.now(timezone.utc).strftime("%Y-%m-%dT%H:%M:%S.%fZ"),
+                "pid": os.getpid(),
+                "steps": [],
+                "items": None,
+                "unit": None
+            }
+            _current.append(stage_record)
+            captured = io.StringIO() if VERBOSITY == "quiet" else None
+            output = contextlib.redirect_stdout(captured) if captured is not None else contextlib.nullcontext()
+
+            start = time.perf_counter()
+            status = "ok"
+            try:
+                with output:
+                    result = function(*args, **kwargs)
+                if result is None or result is False:
+                    status = "failed"
+                return result
+            except BaseException as e:
+                status = f"error: {type(e).__name__}"
+                raise
+            finally:
+                if captured is not None and status != "ok":
+                    sys.stdout.write(captured.getvalue())
+                _close_step(stage_record)
+                _current.pop()
+                stage_record["seconds"] = time.perf_counter() - start
+                stage_record["status"] = status
+                stage_record["peak_rss_mb"] = peak_rss_mb()
+                if stage_record["items"] is not None and stage_record["seconds"] > 0:
+                    stage_record["items_per_second"] = stage_record["items"] / stage_record["seconds"]
+
+                steps = stage_record.pop("steps")
+                _emit(dict(event="stage", **stage_record))
+
+                if VERBOSITY != "quiet" and steps:
+                    print(f"\n⏱️  {name} timings:")
+                    for step_record in steps:
+                        rate = f"  ({step_record['items_per_second']:,.0f} {step_record['unit']}/s)" if step_record.get("items_per_second") else ""
+                        print(f"   {step_record['step']:28s} {step_record['seconds']:8.3f}s{rate}")
+                print(_summary_line(stage_record))
+        return wrapper
+    return decorator
@@ -1,6 +1,9 @@
 import pandas as pd
+import numpy as np
 import os
 from datetime import datetime
+import price_store
+from instrumentation import instrumented_stage, step, throughput
 
 # --- Configuration ---
 OUTPUT_DIR = "data"
@@ -9,92 +12,121 @@ STOCK_TICKERS = {
     "rblx_prices": "RBLX",
     "vwce_de_prices": "VWCE_DE"
 }
+ROBLOX_DTYPE = np.float32  # Compact storage for Roblox item prices (exact for whole-Robux values up to ~16.7M)
 
-def merge_datasets():
+def price_sources():
+    """
+    The per-asset CSVs the price store is filled from, as {asset: (path, price column)}:
+    'Close' of <ticker>_prices.csv for stocks, 'RAP' of <item>_prices.csv for Roblox items.
+    """
+    sources = {ticker_name: (os.path.join(OUTPUT_DIR, f"{filename}.csv"), 'Close') for filename, ticker_name in STOCK_TICKERS.items()}
+    for item in ROBLOX_ITEMS:
+        sources[item] = (os.path.join(OUTPUT_DIR, f"{item.lower()}_prices.csv"), 'RAP')
+    return sources
+
+def price_store_dir():
+    # Follows OUTPUT_DIR (benchmark.py points it at the synthetic datasets)
+    return os.path.join(OUTPUT_DIR, "price_store")
+
+def forward_fill(block):
+    """
+    Forward-fills NaNs down every column of a 2-D array at once:
+    each row takes the value of the last row where that column had a price.
+    """
+    row_numbers = np.arange(block.shape[0])[:, None]
+    last_valid_row = np.where(np.isnan(block), 0, row_numbers)
+    np.maximum.accumulate(last_valid_row, axis=0, out=last_valid_row)
+    return block[last_valid_row, np.arange(block.shape[1])]
+
+def merge_price_blocks(date_index, stock_block, roblox_block, stock_names, roblox_names):
+    """
+    In-memory core of the merge, on prices already aligned to one sorted
+    date_index (dates x assets, NaN where an asset has no price): forward-fills
+    the weekly Roblox prices and keeps only dates where every stock has a price.
+    Returns the master DataFrame (Date + one column per asset).
+    """
+    # Forward-fill Roblox data (weekly to daily alignment), all items at once
+    roblox_block = forward_fill(roblox_block)
+
+    # Keep only rows where ALL stocks have data (stocks are our anchor)
+    keep = ~np.isnan(stock_block).any(axis=1)
+
+    columns = {'Date': date_index[keep]}
+    for j, ticker_name in enumerate(stock_names):
+        columns[ticker_name] = stock_block[keep, j]
+    for j, item_name in enumerate(roblox_names):
+        columns[item_name] = roblox_block[keep, j]
+
+    return pd.DataFrame(columns)
+
+def merge_price_store(stock_names, roblox_names, start=None, end=None, store_dir=None):
+    """
+    Merges straight from the price store: every asset already sits on the
+    store's shared date index, so the columns are read as memory-mapped slices
+    (start/end: optional date range) and only the merged result is a new array.
+    Stocks stay float64 (with a float32 store they are widened back); the
+    Roblox columns are narrowed to ROBLOX_DTYPE.
+    """
+    prices = price_store.load_prices(list(stock_names) + list(roblox_names), start, end, store_dir or price_store_dir())
+    stock_block = np.column_stack([prices['columns'][name] for name in stock_names]).astype(np.float64, copy=False)
+    roblox_block = np.column_stack([prices['columns'][name] for name in roblox_names]).astype(ROBLOX_DTYPE, copy=False)
+    return merge_price_blocks(prices['dates'], stock_block, roblox_block, stock_names, roblox_names)
+
+@instrumented_stage("merge_datasets")
+def merge_datasets(save_csv=True):
     """
     Merges Roblox item prices (weekly) with stock prices (daily).
     Creates a master dataset with aligned dates and forward-filled Roblox data.
+    The per-asset CSVs are first synced into the price store (price_store.py),
+    and the merge reads from there.
+    Returns the master DataFrame; save_csv=False skips writing merged_master.csv.
     """
     print("=" * 70)
     print("🔀 DATASET MERGER - Consolidating All Assets")
     print("=" * 70)
     
-    # Load stock data (daily)
-    print("\n📥 Loading stock data...")
-    stock_data = {}
-    for filename, ticker_name in STOCK_TICKERS.items():
-        filepath = os.path.join(OUTPUT_DIR, f"{filename}.csv")
-        if os.path.exists(filepath):
-            df = pd.read_csv(filepath)
-            df['Date'] = pd.to_datetime(df['Date'])
-            stock_data[ticker_name] = df.set_index('Date')[['Close']]
-            print(f"   ✅ {ticker_name}: {len(df)} records")
-        else:
-            print(f"   ⚠️  {ticker_name}: File not found at {filepath}")
-    
-    # Load Roblox item data (weekly)
-    print("\n📥 Loading Roblox item data...")
-    roblox_data = {}
-    for item in ROBLOX_ITEMS:
-        filepath = os.path.join(OUTPUT_DIR, f"{item.lower()}_prices.csv")
-        if os.path.exists(filepath):
-            df = pd.read_csv(filepath)
-            df['Date'] = pd.to_datetime(df['Date'])
-            roblox_data[item] = df.set_index('Date')[['RAP']]
-            print(f"   ✅ {item}: {len(df)} records")
-        else:
-            print(f"   ⚠️  {item}: File not found at {filepath}")
-    
-    if not stock_data or not roblox_data:
+    # Only CSVs that changed since the last run are parsed; everything else is already in the store
+    step("sync_price_store")
+    print("\n🗄️  Updating price store...")
+    store_dir = price_store_dir()
+    sources = price_sources()
+    imported = price_store.sync_price_store(sources, store_dir)
+    for asset in imported:
+        print(f"   ✅ {asset}: imported from {sources[asset][0]}")
+    if not imported:
+        print(f"   ⏭️  {store_dir} is up to date")
+
+    stored = price_store.load_manifest(store_dir)['assets']
+    for asset, (filepath, _) in sources.items():
+        if asset not in stored:
+            print(f"   ⚠️  {asset}: File not found at {filepath}")
+    stock_names = [name for name in STOCK_TICKERS.values() if name in stored]
+    roblox_names = [item for item in ROBLOX_ITEMS if item in stored]
+
+    if not stock_names or not roblox_names:
         print("\n❌ ERROR: Missing required data files!")
         return
     
-    # Combine all data
     print("\n🔗 Merging all datasets...")
-    all_data = {}
-    
-    # Add stocks
-    for ticker_name, data_df in stock_data.items():
-        all_data[ticker_name] = data_df
-    
-    # Add Roblox items
-    for item_name, data_df in roblox_data.items():
-        all_data[item_name] = data_df
-    
-    # Create master dataframe (outer join on dates)
-    master_df = pd.DataFrame()
-    for asset_name, data_df in all_data.items():
-        if master_df.empty:
-            master_df = data_df.copy()
-            master_df.columns = [asset_name]
-        else:
-            master_df = master_df.join(data_df, how='outer')
-            master_df = master_df.rename(columns={list(data_df.columns)[0]: asset_name})
-    
-    # Sort by date
-    master_df = master_df.sort_index()
-    
-    # Forward-fill Roblox data (weekly to daily alignment)
-    for item in ROBLOX_ITEMS:
-        if item in master_df.columns:
-            master_df[item] = master_df[item].fillna(method='ffill')
-    
-    # Drop rows where ANY stock data is missing (stocks are our anchor)
-    master_df = master_df.dropna(subset=list(STOCK_TICKERS.values()))
-    
-    # Reset index to make Date a column
-    master_df = master_df.reset_index()
+    step("merge_price_store")
+    master_df = merge_price_store(stock_names, roblox_names, store_dir=store_dir)
+    throughput(master_df.size, "values")
     
     # Save to CSV
     output_path = os.path.join(OUTPUT_DIR, "merged_master.csv")
-    master_df.to_csv(output_path, index=False)
+    if save_csv:
+        step("save_csv")
+        master_df.to_csv(output_path, index=False)
     
     print(f"\n✅ SUCCESS: Master dataset created")
-    print(f"   📄 File: {output_path}")
+    if save_csv:
+        print(f"   📄 File: {output_path}")
     print(f"   📊 Total rows: {len(master_df)}")
     print(f"   📅 Date range: {master_df['Date'].iloc[0]} to {master_df['Date'].iloc[-1]}")
     print(f"   🎯 Assets included: {', '.join(master_df.columns[1:])}")
     print("\n" + "=" * 70)
 
+    return master_df
+
 if __name__ == "__main__":
-    merge_datasets()
\ No newline at end of file
+    merge_datasets()
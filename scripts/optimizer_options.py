@@ -0,0 +1,17 @@
+# Command-line options of portoflio_optimization_v1.py. They live in their own
+# standard-library-only module so cli.py can declare the "optimize" subcommand
+# without importing the optimizer (numpy, pandas and the solvers) for every command.
+
+OPTIMIZATION_MODES = ["exact", "random", "streaming", "parallel", "resampled"]
+PLOT_STYLES = ["scatter", "density"]
+
+
+def add_arguments(parser):
+    # Read back by portoflio_optimization_v1.configure_from_args
+    parser.add_argument("--mode", choices=OPTIMIZATION_MODES, help="Override OPTIMIZATION_MODE")
+    parser.add_argument("--resamples", type=int, help="Bootstrap resamples in resampled mode (resampled_frontier.RESAMPLES)")
+    parser.add_argument("--plot-style", choices=PLOT_STYLES, help="Override PLOT_STYLE")
+    parser.add_argument("--no-show", action="store_true", help="Save the plot without opening a window")
+    parser.add_argument("--no-plot", action="store_true", help="Skip the plot entirely (matplotlib is not imported)")
+    parser.add_argument("--max-roblox", type=float, help="Cap the total Roblox item weight (fraction, e.g. 0.4)")
+    parser.add_argument("--max-weight", type=float, help="Cap every single asset's weight (fraction, e.g. 0.5)")
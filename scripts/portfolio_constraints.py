@@ -0,0 +1,183 @@
+import numpy as np
+
+import efficient_frontier_solver as frontier_solver
+
+# --- Configuration ---
+HIT_AND_RUN_CHAINS = 1000    # Chains advanced together; each vectorized step yields one sample per chain
+HIT_AND_RUN_BURN_IN = 100    # Steps every chain takes from the start point before samples are kept
+FEASIBILITY_TOLERANCE = 1e-6 # Allowed constraint violation when checking a portfolio
+DIRECTION_TOLERANCE = 1e-12  # Smaller direction components are treated as zero (constraint not hit)
+
+
+def build_constraints(assets, weight_bounds=None, group_bounds=None, fixed_weights=None):
+    """
+    Collects the allocation rules for `assets` (fully invested, long-only) into
+    one dict shared by the exact solver and the samplers:
+    - weight_bounds: {asset: (min, max)}, e.g. {"RBLX": (0.0, 0.30)}
+    - group_bounds:  {name: (assets, min, max)}, e.g. {"Roblox": (ROBLOX_ITEMS, 0.0, 0.40)}
+    - fixed_weights: {asset: weight}, e.g. {"VWCE_DE": 0.25}
+    Returns None when no rule is given (plain long-only, the original problem).
+    Raises ValueError for unknown assets or rules that no portfolio can meet.
+    """
+    if not (weight_bounds or group_bounds or fixed_weights):
+        return None
+
+    assets = list(assets)
+    position = {asset: i for i, asset in enumerate(assets)}
+
+    def index_of(asset):
+        if asset not in position:
+            raise ValueError(f"Unknown asset in constraints: {asset}")
+        return position[asset]
+
+    lower = np.zeros(len(assets))
+    upper = np.ones(len(assets))
+    for asset, (low, high) in (weight_bounds or {}).items():
+        i = index_of(asset)
+        lower[i], upper[i] = max(low, 0.0), min(high, 1.0)
+    for asset, weight in (fixed_weights or {}).items():
+        i = index_of(asset)
+        lower[i] = upper[i] = weight
+
+    group_names = list(group_bounds or {})
+    groups = np.zeros((len(group_names), len(assets)))
+    group_lower = np.zeros(len(group_names))
+    group_upper = np.ones(len(group_names))
+    for g, name in enumerate(group_names):
+        members, low, high = group_bounds[name]
+        groups[g, [index_of(asset) for asset in members]] = 1.0
+        group_lower[g], group_upper[g] = low, high
+
+    if np.any(lower > upper) or np.any(group_lower > group_upper):
+        raise ValueError("Infeasible constraints: a minimum is above its maximum")
+    if lower.sum() > 1 + FEASIBILITY_TOLERANCE or upper.sum() < 1 - FEASIBILITY_TOLERANCE:
+        raise ValueError("Infeasible constraints: the weight bounds cannot add up to 100%")
+
+    constraints = {
+        'assets': assets,
+        'lower': lower,
+        'upper': upper,
+        'group_names': group_names,
+        'groups': groups,
+        'group_lower': group_lower,
+        'group_upper': group_upper
+    }
+
+    # Inequality rows checked along each hit-and-run direction: one per asset, one per group
+    constraints['rows'] = np.vstack([np.eye(len(assets)), groups])
+    constraints['rows_lower'] = np.concatenate([lower, group_lower])
+    constraints['rows_upper'] = np.concatenate([upper, group_upper])
+
+    # Directions that keep the budget and every pinned weight / group total unchanged:
+    # the null space of those equality rows
+    pinned = constraints['rows'][constraints['rows_lower'] == constraints['rows_upper']]
+    equalities = np.vstack([np.ones(len(assets)), pinned])
+    _, singular_values, vt = np.linalg.svd(equalities)
+    rank = int(np.sum(singular_values > 1e-10))
+    constraints['directions'] = vt[rank:].T
+
+    constraints['start'] = feasible_center(constraints)
+    if not np.all(satisfies(constraints['start'][None, :], constraints)):
+        raise ValueError("Infeasible constraints: no portfolio satisfies all of them")
+    return constraints
+
+
+def constraint_rows(constraints):
+    """
+    The rules as  lower <= A w <= upper  rows for efficient_frontier_solver.solve_qp
+    (budget row first, then one row per asset, then one per group), the
+    constrained counterpart of frontier_solver.long_only_constraints.
+    """
+    n_assets = len(constraints['assets'])
+    A = np.vstack([np.ones(n_assets), constraints['rows']])
+    lower = np.concatenate([[1.0], constraints['rows_lower']])
+    upper = np.concatenate([[1.0], constraints['rows_upper']])
+    return A, lower, upper
+
+
+def satisfies(weights, constraints, tolerance=FEASIBILITY_TOLERANCE):
+    # One bool per portfolio (row of weights): fully invested and inside every bound
+    weights = np.atleast_2d(weights)
+    values = weights @ constraints['rows'].T
+    return (np.abs(weights.sum(axis=1) - 1) <= tolerance) \
+        & np.all(values >= constraints['rows_lower'] - tolerance, axis=1) \
+        & np.all(values <= constraints['rows_upper'] + tolerance, axis=1)
+
+
+def feasible_center(constraints):
+    """
+    A point well inside the feasible region: the average of the feasible
+    portfolios closest to putting everything in each single asset (one
+    projection QP per asset, solved as one batch). Hit-and-run chains start here.
+    The projections have a full quadratic term, so the solver converges and
+    certifies them quickly (maximizing each weight as an almost-linear
+    program made it run out of iterations).
+    """
+    n_assets = len(constraints['assets'])
+    A, lower, upper = constraint_rows(constraints)
+    # minimize 1/2 ||w - e_i||^2  ->  P = I, q = -e_i. Rules no portfolio can meet do not
+    # converge; build_constraints reports those by checking the returned point
+    closest, _ = frontier_solver.solve_qp(np.eye(n_assets), -np.eye(n_assets), A, lower, upper, return_status=True)
+    return closest.mean(axis=0)
+
+
+def _hit_and_run_step(rng, constraints, chains):
+    # Moves every chain to a uniform random point on the feasible segment through it along a random direction
+    directions = constraints['directions']
+    d = rng.standard_normal((len(chains), directions.shape[1])) @ directions.T
+
+    values = chains @ constraints['rows'].T
+    speeds = d @ constraints['rows'].T
+    moving_up = speeds > DIRECTION_TOLERANCE
+    moving_down = speeds < -DIRECTION_TOLERANCE
+    with np.errstate(divide='ignore', invalid='ignore'):
+        to_upper = (constraints['rows_upper'] - values) / speeds
+        to_lower = (constraints['rows_lower'] - values) / speeds
+    t_max = np.min(np.where(moving_up, to_upper, np.where(moving_down, to_lower, np.inf)), axis=1)
+    t_min = np.max(np.where(moving_up, to_lower, np.where(moving_down, to_upper, -np.inf)), axis=1)
+    t_max = np.maximum(t_max, 0.0)
+    t_min = np.minimum(t_min, 0.0)
+
+    t = t_min + rng.random(len(chains)) * (t_max - t_min)
+    return chains + t[:, None] * d
+
+
+def hit_and_run(rng, constraints, n_samples, state=None):
+    """
+    n_samples portfolios drawn directly inside the feasible region: no sample
+    is ever rejected, so the cost per portfolio stays the same however tight
+    the constraints are. HIT_AND_RUN_CHAINS chains are advanced together and
+    each step contributes one portfolio per chain.
+    state: the chains' positions returned by the previous call (None starts
+    new chains at the feasible center and burns them in), so a long run can
+    be drawn chunk by chunk. Returns (weights n_samples x n_assets, state).
+    """
+    n_assets = len(constraints['assets'])
+    if constraints['directions'].shape[1] == 0:
+        # Every weight is pinned: the feasible region is a single portfolio
+        return np.tile(constraints['start'], (n_samples, 1)), state
+
+    if state is None:
+        state = np.tile(constraints['start'], (HIT_AND_RUN_CHAINS, 1))
+        for _ in range(HIT_AND_RUN_BURN_IN):
+            state = _hit_and_run_step(rng, constraints, state)
+
+    weights = np.empty((n_samples, n_assets))
+    for start in range(0, n_samples, len(state)):
+        state = _hit_and_run_step(rng, constraints, state)
+        take = min(len(state), n_samples - start)
+        weights[start:start + take] = state[:take]
+    return weights, state
+
+
+def describe_constraints(constraints):
+    # Human-readable lines for the console report
+    lines = []
+    for asset, low, high in zip(constraints['assets'], constraints['lower'], constraints['upper']):
+        if low == high:
+            lines.append(f"{asset} fixed at {low*100:.2f}%")
+        elif low > 0 or high < 1:
+            lines.append(f"{asset} between {low*100:.2f}% and {high*100:.2f}%")
+    for name, low, high in zip(constraints['group_names'], constraints['group_lower'], constraints['group_upper']):
+        lines.append(f"{name} total between {low*100:.2f}% and {high*100:.2f}%")
+    return lines
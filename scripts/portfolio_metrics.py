@@ -0,0 +1,30 @@
+import numpy as np
+
+# Shared by the optimizer and the modules it uses (portfolio_sampler.py,
+# resampled_frontier.py): they import this file instead of the optimizer,
+# so nothing imports the optimizer back.
+
+# --- Configuration ---
+RISK_FREE_RATE = 0.04  # 4% annual risk-free rate (2026 US Treasury)
+RANDOM_SEED = 42
+CHUNK_SIZE = 100000  # Portfolios evaluated per vectorized block (caps peak memory)
+
+
+def calculate_portfolio_metrics_batch(weights_block, expected_returns, cov_matrix):
+    # weights_block = matrix of allocations, one portfolio per row (n_portfolios x n_assets)
+    # expected_returns = vector of expected annual returns (built once, not per portfolio)
+    # cov_matrix = the covariance matrix built earlier
+
+    # Formula: Portfolio Returns = W × returns (one matrix-vector product for the whole block)
+    portfolio_returns = weights_block @ expected_returns
+
+    # Formula: Volatility_i = sqrt(w_i^T × Cov × w_i), evaluated row by row without a Python loop
+    portfolio_variances = np.einsum('ij,ij->i', weights_block @ cov_matrix, weights_block)
+    portfolio_volatilities = np.sqrt(np.maximum(portfolio_variances, 0))
+
+    # Sharpe Ratio = (Return - Risk Free Rate) / Volatility, 0 where volatility is 0
+    sharpe_ratios = np.zeros_like(portfolio_returns)
+    has_risk = portfolio_volatilities > 0
+    sharpe_ratios[has_risk] = (portfolio_returns[has_risk] - RISK_FREE_RATE) / portfolio_volatilities[has_risk]
+
+    return portfolio_returns, portfolio_volatilities, sharpe_ratios
@@ -0,0 +1,297 @@
+import numpy as np
+import os
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import portfolio_metrics
+from portfolio_constraints import hit_and_run
+
+# --- Configuration ---
+WORKERS = os.cpu_count() or 1  # Processes in the pool
+SAMPLING_BLOCK_SIZE = 1000000  # Portfolios per task; each task has its own seed stream
+TOP_K = 100                    # Best portfolios by Sharpe ratio kept in a summary
+
+# Set inside each worker process by _attach_shared_inputs
+_shared_memory = None
+_expected_returns = None
+_cov_matrix = None
+
+
+def block_rng(seed, block_index):
+    """
+    Random generator for one sampling block.
+    The stream depends only on (seed, block_index), never on which worker runs
+    the block, so the merged result is identical for any number of workers.
+    """
+    return np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(block_index,)))
+
+
+def _points(indices, returns, volatilities, sharpes, weights):
+    # A set of portfolios stored column-wise (one array per field)
+    return {
+        'index': indices,
+        'return': returns,
+        'volatility': volatilities,
+        'sharpe_ratio': sharpes,
+        'weights': weights
+    }
+
+
+def _take(points, rows):
+    return {key: values[rows] for key, values in points.items()}
+
+
+def _concat(a, b):
+    return {key: np.concatenate([a[key], b[key]]) for key in a}
+
+
+def pareto_frontier(points):
+    """
+    Upper-left Pareto frontier of return vs. volatility: the portfolios for
+    which no other portfolio has both lower volatility and higher return.
+    Sorted by volatility; ties are broken by the global sample index so the
+    same set of samples always gives the same frontier.
+    """
+    order = np.lexsort((points['index'], -points['return'], points['volatility']))
+    returns = points['return'][order]
+    running_best = np.maximum.accumulate(returns)
+    efficient = np.ones(len(returns), dtype=bool)
+    efficient[1:] = returns[1:] > running_best[:-1]
+    return _take(points, order[efficient])
+
+
+def top_sharpe(points, k=TOP_K):
+    """
+    The k portfolios with the highest Sharpe ratio (lowest index wins ties).
+    """
+    order = np.lexsort((points['index'], -points['sharpe_ratio']))
+    return _take(points, order[:k])
+
+
+def reduce_block(weights, returns, volatilities, sharpes, first_index):
+    """
+    Reduces a block of evaluated portfolios to a small summary:
+    - the minimum volatility portfolio
+    - the maximum Sharpe ratio portfolio
+    - the TOP_K portfolios by Sharpe ratio
+    - the upper-left Pareto frontier of return vs. volatility
+    Its size does not depend on the block size, so memory stays flat however
+    many portfolios are sampled.
+    """
+    points = _points(first_index + np.arange(len(returns)), returns, volatilities, sharpes, weights)
+    top = top_sharpe(points)
+    frontier = pareto_frontier(points)
+
+    return {
+        'count': len(returns),
+        # The frontier starts at the least volatile sample and the top-K list at the best Sharpe
+        'min_vol': {key: values[0] for key, values in frontier.items()},
+        'max_sharpe': {key: values[0] for key, values in top.items()},
+        'top_sharpe': top,
+        'frontier': frontier
+    }
+
+
+def density_edges(expected_returns, cov_matrix, bins):
+    """
+    Fixed (volatility edges, return edges) for the density grid, known before
+    sampling: a long-only portfolio's return lies between the lowest and highest
+    asset return, and its volatility between 0 and the highest asset volatility.
+    bins = (volatility bins, return bins).
+    """
+    expected_returns = np.asarray(expected_returns, dtype=np.float64)
+    max_volatility = np.sqrt(np.max(np.diag(cov_matrix)))
+    low, high = expected_returns.min(), expected_returns.max()
+    if high <= low:
+        high = low + 1e-12
+    return np.linspace(0.0, max_volatility, bins[0] + 1), np.linspace(low, high, bins[1] + 1)
+
+
+def bin_portfolios(returns, volatilities, sharpes, edges):
+    """
+    Bins portfolios into the volatility x return grid given by edges.
+    Returns {'edges', 'count', 'sharpe_sum', 'sharpe_max'} with one cell per bin
+    (sharpe_max is -inf in empty bins). Grids with the same edges merge with
+    merge_density, so any number of samples fits in the same small arrays.
+    """
+    vol_edges, return_edges = edges
+    n_vol, n_return = len(vol_edges) - 1, len(return_edges) - 1
+    vol_bin = np.clip(np.searchsorted(vol_edges, volatilities, side='right') - 1, 0, n_vol - 1)
+    return_bin = np.clip(np.searchsorted(return_edges, returns, side='right') - 1, 0, n_return - 1)
+    cell = return_bin * n_vol + vol_bin
+
+    sharpe_max = np.full(n_vol * n_return, -np.inf)
+    np.maximum.at(sharpe_max, cell, sharpes)
+    return {
+        'edges': edges,
+        'count': np.bincount(cell, minlength=n_vol * n_return).reshape(n_return, n_vol),
+        'sharpe_sum': np.bincount(cell, weights=sharpes, minlength=n_vol * n_return).reshape(n_return, n_vol),
+        'sharpe_max': sharpe_max.reshape(n_return, n_vol)
+    }
+
+
+def merge_density(a, b):
+    if a is None:
+        return b
+    if b is None:
+        return a
+    return {
+        'edges': a['edges'],
+        'count': a['count'] + b['count'],
+        'sharpe_sum': a['sharpe_sum'] + b['sharpe_sum'],
+        'sharpe_max': np.maximum(a['sharpe_max'], b['sharpe_max'])
+    }
+
+
+def merge_summaries(a, b):
+    """
+    Combines two block summaries. The result does not depend on the order of
+    the arguments, so summaries can be merged as workers finish.
+    """
+    if a is None:
+        return b
+    if b is None:
+        return a
+
+    min_vol = min(a['min_vol'], b['min_vol'], key=lambda p: (p['volatility'], p['index']))
+    max_sharpe = min(a['max_sharpe'], b['max_sharpe'], key=lambda p: (-p['sharpe_ratio'], p['index']))
+
+    merged = {
+        'count': a['count'] + b['count'],
+        'min_vol': min_vol,
+        'max_sharpe': max_sharpe,
+        'top_sharpe': top_sharpe(_concat(a['top_sharpe'], b['top_sharpe'])),
+        'frontier': pareto_frontier(_concat(a['frontier'], b['frontier']))
+    }
+    if 'density' in a or 'density' in b:
+        merged['density'] = merge_density(a.get('density'), b.get('density'))
+    return merged
+
+
+def frontier_from_summary(summary):
+    """
+    Returns the reduced frontier as (results 3 x K, weights K x n_assets), in
+    the same layout as generate_random_portfolios.
+    """
+    frontier = summary['frontier']
+    results = np.vstack([frontier['return'], frontier['volatility'], frontier['sharpe_ratio']])
+    return results, frontier['weights']
+
+
+def sample_block(block_index, n_samples, seed, expected_returns, cov_matrix, chunk_size=None, density_bins=None, constraints=None):
+    """
+    Draws and evaluates one block of random portfolios chunk by chunk and
+    returns its summary. Only the summary is kept, never the raw samples.
+    chunk_size defaults to portfolio_metrics.CHUNK_SIZE at call time.
+    density_bins=(volatility bins, return bins) also adds a 'density' grid
+    of every sample to the summary (see bin_portfolios).
+    constraints (see portfolio_constraints.build_constraints): portfolios are
+    drawn inside the feasible region by hit-and-run instead of normalizing
+    uniform draws, so none has to be rejected.
+    """
+    if chunk_size is None:
+        chunk_size = portfolio_metrics.CHUNK_SIZE
+    rng = block_rng(seed, block_index)
+    n_assets = len(expected_returns)
+    summary = None
+    chains = None
+    edges = density_edges(expected_returns, cov_matrix, density_bins) if density_bins else None
+
+    for start in range(0, n_samples, chunk_size):
+        stop = min(start + chunk_size, n_samples)
+        if constraints is not None:
+            normalized_weights, chains = hit_and_run(rng, constraints, stop - start, chains)
+        else:
+            random_weights = rng.random((stop - start, n_assets))
+            normalized_weights = random_weights / np.sum(random_weights, axis=1, keepdims=True)
+
+        p_returns, p_volatilities, p_sharpes = portfolio_metrics.calculate_portfolio_metrics_batch(normalized_weights, expected_returns, cov_matrix)
+
+        first_index = block_index * SAMPLING_BLOCK_SIZE + start
+        chunk_summary = reduce_block(normalized_weights, p_returns, p_volatilities, p_sharpes, first_index)
+        if edges is not None:
+            chunk_summary['density'] = bin_portfolios(p_returns, p_volatilities, p_sharpes, edges)
+        summary = merge_summaries(summary, chunk_summary)
+
+    return summary
+
+
+def _attach_shared_inputs(name, n_assets):
+    # Pool initializer: map the parent's shared block as numpy views (no copies)
+    global _shared_memory, _expected_returns, _cov_matrix
+    _shared_memory = shared_memory.SharedMemory(name=name)
+    buffer = np.ndarray((n_assets + n_assets * n_assets,), dtype=np.float64, buffer=_shared_memory.buf)
+    _expected_returns = buffer[:n_assets]
+    _cov_matrix = buffer[n_assets:].reshape(n_assets, n_assets)
+
+
+def _sample_block_task(task):
+    block_index, n_samples, seed, chunk_size, density_bins, constraints = task
+    return sample_block(block_index, n_samples, seed, _expected_returns, _cov_matrix, chunk_size, density_bins, constraints)
+
+
+def _sampling_tasks(number_of_portfolios, seed, density_bins=None, constraints=None):
+    # (block number, block size, seed, chunk size, density bins, constraints) for every block of the sample budget.
+    # The chunk size is read here, in the parent, so workers use the same one whatever their start method
+    tasks = []
+    for block_index, start in enumerate(range(0, number_of_portfolios, SAMPLING_BLOCK_SIZE)):
+        n_samples = min(SAMPLING_BLOCK_SIZE, number_of_portfolios - start)
+        tasks.append((block_index, n_samples, seed, portfolio_metrics.CHUNK_SIZE, density_bins, constraints))
+    return tasks
+
+
+def sample_portfolios_streaming(expected_returns, cov_matrix, number_of_portfolios, seed=None, density_bins=None, constraints=None):
+    """
+    Samples in this process, folding each chunk into the running summary and
+    dropping it straight away. Memory stays flat, so the sample count is
+    limited by time, not RAM. Gives exactly the same summary as
+    sample_portfolios_parallel with the same seed.
+    """
+    if seed is None:
+        seed = portfolio_metrics.RANDOM_SEED
+
+    summary = None
+    for block_index, n_samples, block_seed, chunk_size, bins, block_constraints in _sampling_tasks(number_of_portfolios, seed, density_bins, constraints):
+        summary = merge_summaries(summary, sample_block(block_index, n_samples, block_seed, expected_returns, cov_matrix,
+                                                        chunk_size, bins, block_constraints))
+        print(f" Sampled {summary['count']:,} / {number_of_portfolios:,} portfolios...")
+
+    return summary
+
+
+def sample_portfolios_parallel(expected_returns, cov_matrix, number_of_portfolios, workers=None, seed=None, density_bins=None, constraints=None):
+    """
+    Splits number_of_portfolios into blocks of SAMPLING_BLOCK_SIZE and samples
+    them across a process pool (workers: default WORKERS at call time). The
+    expected returns and covariance matrix are placed in shared memory once,
+    and each task only sends its block number.
+    Returns the merged summary (see reduce_block).
+    """
+    if workers is None:
+        workers = WORKERS
+    if seed is None:
+        seed = portfolio_metrics.RANDOM_SEED
+
+    # A single worker does not need a pool at all
+    if workers <= 1:
+        return sample_portfolios_streaming(expected_returns, cov_matrix, number_of_portfolios, seed, density_bins, constraints)
+
+    tasks = _sampling_tasks(number_of_portfolios, seed, density_bins, constraints)
+    n_assets = len(expected_returns)
+    shared = shared_memory.SharedMemory(create=True, size=(n_assets + n_assets * n_assets) * 8)
+    try:
+        buffer = np.ndarray((n_assets + n_assets * n_assets,), dtype=np.float64, buffer=shared.buf)
+        buffer[:n_assets] = expected_returns
+        buffer[n_assets:] = np.asarray(cov_matrix, dtype=np.float64).ravel()
+
+        summary = None
+        with ProcessPoolExecutor(max_workers=workers, initializer=_attach_shared_inputs, initargs=(shared.name, n_assets)) as pool:
+            for block_summary in pool.map(_sample_block_task, tasks):
+                summary = merge_summaries(summary, block_summary)
+                print(f" Sampled {summary['count']:,} / {number_of_portfolios:,} portfolios...")
+        del buffer
+    finally:
+        shared.close()
+        shared.unlink()
+
+    return summary
@@ -0,0 +1,221 @@
+import pandas as pd
+import numpy as np
+import json
+import os
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import portoflio_optimization_v1 as optimizer
+from return_moments import load_return_moments, optimizer_inputs
+
+# --- Configuration ---
+OUTPUT_DIR = "data"
+RETURNS_FILE = os.path.join(OUTPUT_DIR, "returns_calculated.csv")
+MOMENTS_FILE = os.path.join(OUTPUT_DIR, "return_moments.npz")
+METRICS_FILE = os.path.join(OUTPUT_DIR, "financial_metrics.csv")
+CORRELATION_FILE = os.path.join(OUTPUT_DIR, "correlation_matrix.csv")
+HOST = "127.0.0.1"            # Local only
+PORT = 8765
+RELOAD_CHECK_SECONDS = 1.0    # At most one look at the data files' timestamps per interval
+MAX_BATCH = 5000000           # Largest number of weight vectors accepted in one query
+
+
+def _file_signature(path):
+    # (modification time, size) of a file, or None if it does not exist
+    if not os.path.exists(path):
+        return None
+    stat = os.stat(path)
+    return stat.st_mtime_ns, stat.st_size
+
+
+def _source_signatures():
+    return {path: _file_signature(path) for path in (RETURNS_FILE, METRICS_FILE, CORRELATION_FILE)}
+
+
+def load_model(assets):
+    """
+    Expected returns, covariance matrix and its Cholesky factor for `assets`,
+    from the same inputs as portoflio_optimization_v1.main: the moments of
+    returns_calculated.csv, or financial_metrics.csv + correlation_matrix.csv.
+    """
+    moments = load_return_moments(RETURNS_FILE, MOMENTS_FILE)
+    if moments is not None:
+        metrics_dict, cov_matrix = optimizer_inputs(moments, assets)
+        source = RETURNS_FILE
+    elif os.path.exists(METRICS_FILE) and os.path.exists(CORRELATION_FILE):
+        metrics_dict = optimizer.metrics_dict_from_frame(pd.read_csv(METRICS_FILE))
+        corr_matrix = pd.read_csv(CORRELATION_FILE, index_col=0)
+        volatilities = np.array([metrics_dict[asset]['volatility'] for asset in assets])
+        cov_matrix = corr_matrix.loc[assets, assets].values * np.outer(volatilities, volatilities)
+        source = METRICS_FILE
+    else:
+        raise FileNotFoundError(f"Neither {RETURNS_FILE} nor {METRICS_FILE} + {CORRELATION_FILE} found")
+
+    # Volatility of w is ||L^T w|| with Cov = L L^T: one product per batch, never negative.
+    # A tiny ridge keeps the factorization defined for a singular matrix.
+    try:
+        cholesky = np.linalg.cholesky(cov_matrix)
+    except np.linalg.LinAlgError:
+        cholesky = np.linalg.cholesky(cov_matrix + 1e-12 * np.trace(cov_matrix) * np.eye(len(assets)))
+
+    return {
+        'assets': list(assets),
+        'expected_returns': np.array([metrics_dict[asset]['return'] for asset in assets]),
+        'cov_matrix': cov_matrix,
+        'cholesky': cholesky,
+        'source': source,
+        'loaded_at': time.time()
+    }
+
+
+def load_evaluator(assets=None):
+    """
+    The resident evaluator: a model loaded once, plus what is needed to notice
+    when its data files change. Pass it to evaluate() for every query.
+    """
+    assets = list(assets or optimizer.ASSETS)
+    return {
+        'assets': assets,
+        'model': load_model(assets),
+        'signatures': _source_signatures(),
+        'checked_at': time.monotonic(),
+        'lock': threading.Lock()
+    }
+
+
+def refresh(evaluator, force=False):
+    """
+    Reloads the model if a data file was rewritten since it was loaded
+    (checked at most every RELOAD_CHECK_SECONDS). The new model replaces the
+    old one in a single assignment, so concurrent queries see one or the other.
+    Returns True if it reloaded.
+    """
+    now = time.monotonic()
+    if not force and now - evaluator['checked_at'] < RELOAD_CHECK_SECONDS:
+        return False
+
+    with evaluator['lock']:
+        evaluator['checked_at'] = now
+        signatures = _source_signatures()
+        if not force and signatures == evaluator['signatures']:
+            return False
+        evaluator['model'] = load_model(evaluator['assets'])
+        evaluator['signatures'] = signatures
+        return True
+
+
+def evaluate(evaluator, weights):
+    """
+    Annual return, volatility and Sharpe ratio of every weight vector (row of
+    weights, columns in the evaluator's asset order), as arrays:
+    {'return', 'volatility', 'sharpe_ratio'}. Two matrix products per batch.
+    """
+    refresh(evaluator)
+    model = evaluator['model']
+
+    weights = np.atleast_2d(np.asarray(weights, dtype=np.float64))
+    if weights.ndim != 2 or weights.shape[1] != len(model['assets']):
+        raise ValueError(f"Expected weight vectors of length {len(model['assets'])} ({', '.join(model['assets'])})")
+    if len(weights) > MAX_BATCH:
+        raise ValueError(f"At most {MAX_BATCH:,} weight vectors per query")
+
+    portfolio_returns = weights @ model['expected_returns']
+    factor = weights @ model['cholesky']
+    portfolio_volatilities = np.sqrt(np.einsum('ij,ij->i', factor, factor))
+
+    sharpe_ratios = np.zeros_like(portfolio_returns)
+    has_risk = portfolio_volatilities > 0
+    sharpe_ratios[has_risk] = (portfolio_returns[has_risk] - optimizer.RISK_FREE_RATE) / portfolio_volatilities[has_risk]
+
+    return {'return': portfolio_returns, 'volatility': portfolio_volatilities, 'sharpe_ratio': sharpe_ratios}
+
+
+def make_handler(evaluator):
+    """
+    HTTP handler bound to an evaluator:
+    - GET  /health    -> assets, data source and load time
+    - POST /evaluate  -> JSON {"weights": [[...], ...]} (optionally "assets": [...] for the column order)
+                         answers {"return": [...], "volatility": [...], "sharpe_ratio": [...]};
+                         or raw little-endian float64 rows (Content-Type: application/octet-stream)
+                         answers the three arrays back to back in the same binary format
+    - POST /reload    -> reload the data files now
+    """
+    class EvaluatorHandler(BaseHTTPRequestHandler):
+        def _send(self, status, body, content_type="application/json"):
+            self.send_response(status)
+            self.send_header("Content-Type", content_type)
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def _send_json(self, status, payload):
+            self._send(status, json.dumps(payload).encode())
+
+        def do_GET(self):
+            if self.path != "/health":
+                return self._send_json(404, {"error": f"Unknown path {self.path}"})
+            refresh(evaluator)
+            model = evaluator['model']
+            self._send_json(200, {"assets": model['assets'], "source": model['source'], "loaded_at": model['loaded_at']})
+
+        def do_POST(self):
+            try:
+                if self.path == "/reload":
+                    refresh(evaluator, force=True)
+                    return self._send_json(200, {"loaded_at": evaluator['model']['loaded_at']})
+                if self.path != "/evaluate":
+                    return self._send_json(404, {"error": f"Unknown path {self.path}"})
+
+                body = self.rfile.read(int(self.headers.get("Content-Length", 0)))
+                if self.headers.get("Content-Type") == "application/octet-stream":
+                    weights = np.frombuffer(body, dtype="<f8").reshape(-1, len(evaluator['assets']))
+                    results = evaluate(evaluator, weights)
+                    answer = np.concatenate([results['return'], results['volatility'], results['sharpe_ratio']])
+                    return self._send(200, answer.astype("<f8").tobytes(), "application/octet-stream")
+
+                query = json.loads(body)
+                weights = np.asarray(query["weights"], dtype=np.float64)
+                if "assets" in query:
+                    # Columns given in another order: rearrange to the evaluator's
+                    position = {asset: i for i, asset in enumerate(query["assets"])}
+                    weights = np.atleast_2d(weights)[:, [position[asset] for asset in evaluator['assets']]]
+                results = evaluate(evaluator, weights)
+                self._send_json(200, {key: values.tolist() for key, values in results.items()})
+            except (ValueError, KeyError, json.JSONDecodeError) as e:
+                self._send_json(400, {"error": str(e)})
+
+        def log_message(self, format, *args):
+            # Keep the console for the startup banner; per-request logs would dominate it
+            pass
+
+    return EvaluatorHandler
+
+
+def serve(host=HOST, port=PORT, assets=None):
+    evaluator = load_evaluator(assets)
+    server = ThreadingHTTPServer((host, port), make_handler(evaluator))
+
+    print("=" * 70)
+    print("🧮 PORTFOLIO EVALUATION SERVICE")
+    print("=" * 70)
+    print(f"   Assets: {', '.join(evaluator['assets'])}")
+    print(f"   Data: {evaluator['model']['source']} (reloaded automatically when it changes)")
+    print(f"   Listening on http://{host}:{port}  (POST /evaluate, GET /health, POST /reload)")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        print("\n👋 Stopped.")
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Resident evaluator: return, volatility and Sharpe of batches of weight vectors.")
+    parser.add_argument("--host", default=HOST)
+    parser.add_argument("--port", type=int, default=PORT)
+    args = parser.parse_args()
+    serve(args.host, args.port)
@@ -2,18 +2,58 @@ import pandas as pd
 import numpy as np
 import os
 from datetime import datetime
-import matplotlib.pyplot as plt
+import efficient_frontier_solver as frontier_solver
+import frontier_store
+from return_moments import load_return_moments, optimizer_inputs
+import portfolio_constraints
+import portfolio_metrics
+import scenario_risk
+from instrumentation import instrumented_stage, step, throughput
+from optimizer_options import add_arguments
+# RISK_FREE_RATE, RANDOM_SEED and CHUNK_SIZE are set in portfolio_metrics.py (shared with the samplers)
+from portfolio_metrics import RISK_FREE_RATE, RANDOM_SEED, CHUNK_SIZE, calculate_portfolio_metrics_batch
 
 # --- Configuration ---
 OUTPUT_DIR = "data"
-RISK_FREE_RATE = 0.04  # 4% annual risk-free rate (2026 US Treasury)
 NUMBER_OF_PORTFOLIOS = 10000
-np.random.seed(42)  # For reproducibility
+OPTIMIZATION_MODE = "exact"  # "exact" = solve from the covariance matrix, "random" = best of random samples,
+                             # "streaming" = random samples reduced on the fly, memory independent of NUMBER_OF_PORTFOLIOS,
+                             # "parallel" = streaming spread over a process pool (see portfolio_sampler.py),
+                             # "resampled" = average of the optima of bootstrap resamples of the returns (see resampled_frontier.py)
+FRONTIER_POINTS = 100  # Points on the exact efficient frontier
+SHOW_RANDOM_CLOUD = True  # Outside "random" mode, still draw a cloud of random portfolios on the plot
+PLOT_CLOUD_PORTFOLIOS = 10000  # Size of that cloud (kept small; it is held in memory)
+PLOT_STYLE = "scatter"  # "scatter" = one dot per portfolio, "density" = cloud binned into a grid (constant render time)
+DENSITY_BINS = (400, 300)  # Density grid size: (volatility bins, return bins)
+DENSITY_AGGREGATE = "max"  # Sharpe ratio shown per bin: "max" or "mean"
+SHOW_PLOT = True  # False = only save the plot, never open a window (batch runs)
+PLOT_RESULTS = True  # False = no plot and no plot-only random cloud; matplotlib is then never imported
+SCENARIO_OBJECTIVES = True  # Also find the min-CVaR and risk parity portfolios from the historical scenarios
+FRONTIER_OUTPUT_FORMATS = ["csv", "npy"]  # Any of "csv", "npy" (memory-mappable), "parquet" (needs pyarrow)
+np.random.seed(RANDOM_SEED)  # For reproducibility
 
 ASSETS = ["Dominus_Empyreus", "Violet_Valkyrie", "Red_Valkyrie", "RBLX", "VWCE_DE"]
 ROBLOX_ITEMS = ["Dominus_Empyreus", "Violet_Valkyrie", "Red_Valkyrie"]
 STOCKS = ["RBLX", "VWCE_DE"]
 
+# Allocation rules on top of fully invested / long-only (all empty = the original problem).
+# Exact mode solves the constrained problem; the sampling modes draw only feasible portfolios.
+WEIGHT_BOUNDS = {}  # {asset: (min, max)}, e.g. {"RBLX": (0.0, 0.30)}
+GROUP_BOUNDS = {}   # {name: (assets, min, max)}, e.g. {"Roblox Items": (ROBLOX_ITEMS, 0.0, 0.40)}
+FIXED_WEIGHTS = {}  # {asset: weight}, e.g. {"VWCE_DE": 0.25}
+
+def metrics_dict_from_frame(metrics_df):
+
+    # Converts a financial metrics table (percent values) into {asset: {'return', 'volatility'}} fractions
+    metrics_dict = {}
+    for _, row in metrics_df.iterrows():
+        assets = row['Asset']
+        metrics_dict[assets] = {
+            'return':row['Annual_Return_%'] / 100,
+            'volatility':row['Annual_Volatility_%'] / 100
+        }
+    return metrics_dict
+
 def load_financial_data():
 
     print("Loading financial data...")
@@ -24,16 +64,10 @@ def load_financial_data():
 
         print("ERROR: Required financial data files not found!")
         print("Please run financial_metrics.py and correlation_analysis.py first")
-        return None,None,None
+        return None,None
     
     metrics_df = pd.read_csv(metrics_path)
-    metrics_dict = {}
-    for _, row in metrics_df.iterrows():
-        assets = row['Asset']
-        metrics_dict[assets] = {
-            'return':row['Annual_Return_%'] / 100,
-            'volatility':row['Annual_Volatility_%'] / 100
-        }
+    metrics_dict = metrics_dict_from_frame(metrics_df)
     
     corr_matrix = pd.read_csv(correlation_path, index_col=0)
     return metrics_dict, corr_matrix
@@ -42,26 +76,31 @@ def build_covariance_matrix(metrics_dict,corr_matrix):
 
     # Formula: Covariance(i,j) = Correlation(i,j) × Volatility(i) × Volatility(j)
 
+    volatilities = np.array([metrics_dict[assets]['volatility'] for assets in ASSETS])
+
+    # Reorder to ASSETS so the correlations line up with the volatilities
+    corr_values =corr_matrix.loc[ASSETS, ASSETS].values
+
+    cov_matrix = corr_values * np.outer(volatilities,volatilities)
+
+    print_covariance_matrix(metrics_dict, cov_matrix)
+
+    return cov_matrix
+
+def print_covariance_matrix(metrics_dict, cov_matrix):
+
     print("\n" + "="*80)
     print ("Building covariance matrix...")
     print("="*80)
 
-    volatilities = np.array([metrics_dict[assets]['volatility'] for assets in ASSETS])
-
     print ("\n Volatilities in order of assets:")
-    for assets, vol in zip(ASSETS, volatilities):
-        print (f" {assets}: {vol*100:.2f}%")
+    for assets in ASSETS:
+        print (f" {assets}: {metrics_dict[assets]['volatility']*100:.2f}%")
 
-    corr_values =corr_matrix.values
-
-    cov_matrix = corr_values * np.outer(volatilities,volatilities)
-
-    print (f"\n Covariance matrix (5x5):")
+    print (f"\n Covariance matrix ({len(ASSETS)}x{len(ASSETS)}):")
     cov_df = pd.DataFrame(cov_matrix, index=ASSETS, columns=ASSETS)
     print(cov_df.round(6))
 
-    return cov_matrix
-
 def calculate_portfolio_metrics (weights, metrics_dict, cov_matrix):
     # weights = array of allocation percentages
     # metrics_dict = dictionary with asset returns and volatilities
@@ -85,43 +124,95 @@ def calculate_portfolio_metrics (weights, metrics_dict, cov_matrix):
     
     return portfolio_return, portfolio_volatility, sharpe_ratio
 
-def generate_random_portfolios (metrics_dict, cov_matrix):
+def get_expected_returns(metrics_dict):
+
+    # Expected annual returns as a vector, in the same order as ASSETS
+    return np.array([metrics_dict[asset]['return'] for asset in ASSETS])
+
+def generate_random_portfolios (metrics_dict, cov_matrix, number_of_portfolios=NUMBER_OF_PORTFOLIOS, chunk_size=None, constraints=None):
+    # constraints: see portfolio_constraints.build_constraints; portfolios are then drawn
+    # inside the feasible region (hit-and-run) instead of normalizing uniform draws
+    # chunk_size: default portfolio_metrics.CHUNK_SIZE (read at call time, see configure)
+    if chunk_size is None:
+        chunk_size = portfolio_metrics.CHUNK_SIZE
 
     print("\n" + "="*80)
     print ("Generating random portfolios...")
     print("="*80)
 
-    results = np.zeros((3, NUMBER_OF_PORTFOLIOS))
+    # Same layout as before: results rows are [return, volatility, sharpe], one column per portfolio
+    results = np.zeros((3, number_of_portfolios))
+    weights_array = np.zeros((number_of_portfolios, len(ASSETS)))
+
+    expected_returns = get_expected_returns(metrics_dict)
 
-    weights_record =[]
+    if constraints is not None:
+        # Seeded from the global generator, so RANDOM_SEED still fixes the result
+        rng = np.random.default_rng(np.random.randint(2**31))
+        chains = None
 
-    for i in range(NUMBER_OF_PORTFOLIOS):
+    # Work through the portfolios in blocks of chunk_size rows, so the temporary
+    # matrices (random draws, W × Cov) never grow beyond one block
+    for start in range(0, number_of_portfolios, chunk_size):
+        stop = min(start + chunk_size, number_of_portfolios)
 
-        random_weights = np.random.random(len(ASSETS))
+        if constraints is not None:
+            normalized_weights, chains = portfolio_constraints.hit_and_run(rng, constraints, stop - start, chains)
+        else:
+            # Draws the same random numbers, in the same order, as one call per portfolio would
+            random_weights = np.random.random((stop - start, len(ASSETS)))
 
-        normalized_weights = random_weights / np.sum(random_weights)
+            normalized_weights = random_weights / np.sum(random_weights, axis=1, keepdims=True)
 
-        weights_record.append(normalized_weights)   
+        weights_array[start:stop] = normalized_weights
 
-        p_return, p_volatility, p_sharpe = calculate_portfolio_metrics(normalized_weights, metrics_dict, cov_matrix)
+        p_returns, p_volatilities, p_sharpes = calculate_portfolio_metrics_batch(normalized_weights, expected_returns, cov_matrix)
 
-        results[0,i] = p_return
-        results[1,i] = p_volatility
-        results[2,i] = p_sharpe
-        
-        if (i + 1) % 1000 == 0:
-            print(f" Generated {i + 1:,} portfolios...")
+        results[0, start:stop] = p_returns
+        results[1, start:stop] = p_volatilities
+        results[2, start:stop] = p_sharpes
+
+        print(f" Generated {stop:,} portfolios...")
 
-    weights_array = np.array(weights_record)
-    
     return results, weights_array
 
-def find_optimal_portfolios(metrics_dict, cov_matrix):
+def describe_portfolio(weights, expected_returns, cov_matrix):
+
+    # Bundle one portfolio's weights with its return, volatility and Sharpe ratio
+    p_returns, p_volatilities, p_sharpes = calculate_portfolio_metrics_batch(weights[None, :], expected_returns, cov_matrix)
+
+    return {
+        'return': p_returns[0],
+        'volatility': p_volatilities[0],
+        'sharpe_ratio': p_sharpes[0],
+        'weights': weights
+    }
+
+def find_optimal_portfolios(metrics_dict, cov_matrix, mode=OPTIMIZATION_MODE, constraints=None, scenarios=None):
+    # constraints: allocation rules from portfolio_constraints.build_constraints (box bounds,
+    # group bounds, fixed weights), or None for plain long-only. Every mode honours them.
+    # scenarios: historical returns (T x n, see scenario_risk.load_scenarios), needed by "resampled"
     print("\n" + "="*80)
     print("Finding optimal portfolios...")
     print("="*80)
+
+    if constraints is not None:
+        print(" Constraints:")
+        for line in portfolio_constraints.describe_constraints(constraints):
+            print(f"   {line}")
+
+    if mode == "exact":
+        return find_exact_optimal_portfolios(metrics_dict, cov_matrix, constraints)
+    if mode in ("streaming", "parallel"):
+        return find_reduced_optimal_portfolios(metrics_dict, cov_matrix, mode, NUMBER_OF_PORTFOLIOS, constraints)
+    if mode == "resampled":
+        if scenarios is None:
+            raise ValueError("The resampled mode needs the returns history (returns_calculated.csv)")
+        return find_resampled_optimal_portfolios(metrics_dict, cov_matrix, scenarios, constraints)
+    if mode != "random":
+        raise ValueError(f"Unknown optimization mode: {mode} (expected 'exact', 'random', 'streaming', 'parallel' or 'resampled')")
     
-    results, weights_array = generate_random_portfolios(metrics_dict, cov_matrix)
+    results, weights_array = generate_random_portfolios(metrics_dict, cov_matrix, NUMBER_OF_PORTFOLIOS, constraints=constraints)
     
     # Find index of portfolio with minimum volatility
     min_vol_idx = np.argmin(results[1])
@@ -156,6 +247,128 @@ def find_optimal_portfolios(metrics_dict, cov_matrix):
         }
     }, results, weights_array
 
+def find_exact_optimal_portfolios(metrics_dict, cov_matrix, constraints=None):
+
+    # Solves the long-only problems directly from the covariance matrix instead of
+    # picking the best of many random samples. Returns the same
+    # (optimal portfolios, results, weights) triple, where results/weights
+    # hold FRONTIER_POINTS portfolios along the exact efficient frontier.
+    # With constraints their rows are added to every QP (max Sharpe stays exact via homogenization).
+
+    print(f" Solving exact {'constrained' if constraints is not None else 'long-only'} efficient frontier ({FRONTIER_POINTS} points)...")
+
+    expected_returns = get_expected_returns(metrics_dict)
+    rows = portfolio_constraints.constraint_rows(constraints) if constraints is not None else None
+
+    min_vol_weights = frontier_solver.min_variance_weights(cov_matrix, rows)
+    frontier_weights = frontier_solver.efficient_frontier_weights(expected_returns, cov_matrix, FRONTIER_POINTS, rows)
+
+    p_returns, p_volatilities, p_sharpes = calculate_portfolio_metrics_batch(frontier_weights, expected_returns, cov_matrix)
+    results = np.vstack([p_returns, p_volatilities, p_sharpes])
+
+    max_sharpe_weights_exact = frontier_solver.max_sharpe_weights(expected_returns, cov_matrix, RISK_FREE_RATE, rows)
+    if max_sharpe_weights_exact is None:
+        # No asset beats the risk-free rate: fall back to the best frontier point
+        max_sharpe_weights_exact = frontier_weights[np.argmax(results[2])]
+
+    return {
+        'min_vol': describe_portfolio(min_vol_weights, expected_returns, cov_matrix),
+        'max_sharpe': describe_portfolio(max_sharpe_weights_exact, expected_returns, cov_matrix)
+    }, results, frontier_weights
+
+def find_reduced_optimal_portfolios(metrics_dict, cov_matrix, mode, number_of_portfolios=NUMBER_OF_PORTFOLIOS, constraints=None):
+
+    # "streaming" samples in this process, "parallel" across a process pool.
+    # Either way only a reduced summary is kept (running optima, top-K by Sharpe
+    # and the Pareto frontier), never the raw samples.
+    # Returns (optimal portfolios, frontier results, frontier weights); the optimal
+    # portfolios also carry the 'top_sharpe' list (and the 'density' grid when PLOT_STYLE is "density").
+    import portfolio_sampler as sampler
+
+    expected_returns = get_expected_returns(metrics_dict)
+
+    # The density plot bins every sample while it streams past
+    density_bins = DENSITY_BINS if PLOT_STYLE == "density" else None
+
+    if mode == "parallel":
+        print(f" Sampling {number_of_portfolios:,} portfolios on {sampler.WORKERS} worker(s)...")
+        summary = sampler.sample_portfolios_parallel(expected_returns, cov_matrix, number_of_portfolios,
+                                                     density_bins=density_bins, constraints=constraints)
+    else:
+        print(f" Streaming {number_of_portfolios:,} portfolios...")
+        summary = sampler.sample_portfolios_streaming(expected_returns, cov_matrix, number_of_portfolios,
+                                                      density_bins=density_bins, constraints=constraints)
+
+    frontier_results, frontier_weights = sampler.frontier_from_summary(summary)
+    print(f" Reduced to {frontier_results.shape[1]:,} frontier portfolios and top {len(summary['top_sharpe']['index'])} by Sharpe")
+
+    optimal = {}
+    for key in ('min_vol', 'max_sharpe'):
+        candidate = summary[key]
+        optimal[key] = {
+            'return': candidate['return'],
+            'volatility': candidate['volatility'],
+            'sharpe_ratio': candidate['sharpe_ratio'],
+            'weights': candidate['weights']
+        }
+    optimal['top_sharpe'] = summary['top_sharpe']
+    if 'density' in summary:
+        optimal['density'] = summary['density']
+
+    return optimal, frontier_results, frontier_weights
+
+def find_resampled_optimal_portfolios(metrics_dict, cov_matrix, scenarios, constraints=None):
+
+    # The optimal weights swing a lot with small changes in the estimated moments.
+    # Bootstrap resamples of the history are re-estimated and re-solved (see
+    # resampled_frontier.py); the reported portfolios are the average weights,
+    # evaluated with the full-history moments, and all_results is the resampled
+    # frontier. The optimal portfolios also carry 'weight_bands' (mean + percentiles per asset).
+    import resampled_frontier as resampler
+
+    print(f" Resampling {resampler.RESAMPLES:,} bootstrap histories on {resampler.WORKERS} worker(s)...")
+
+    expected_returns = get_expected_returns(metrics_dict)
+    rows = portfolio_constraints.constraint_rows(constraints) if constraints is not None else None
+    resampled = resampler.resample_optimal_weights(scenarios, ASSETS, rows, resamples=resampler.RESAMPLES, workers=resampler.WORKERS)
+
+    frontier_weights = resampler.resampled_frontier(resampled['frontier'])
+    p_returns, p_volatilities, p_sharpes = calculate_portfolio_metrics_batch(frontier_weights, expected_returns, cov_matrix)
+    results = np.vstack([p_returns, p_volatilities, p_sharpes])
+
+    optimal = {key: describe_portfolio(resampled[key].mean(axis=0), expected_returns, cov_matrix) for key in ('min_vol', 'max_sharpe')}
+    optimal['weight_bands'] = {key: resampler.weight_bands(resampled[key]) for key in ('min_vol', 'max_sharpe')}
+
+    return optimal, results, frontier_weights
+
+def find_scenario_portfolios(metrics_dict, cov_matrix, scenarios, constraints=None):
+
+    # Alternatives to mean-variance, computed from the historical scenario matrix
+    # (one row per date of returns_calculated.csv, see scenario_risk.py):
+    # - min_cvar: lowest average loss over the worst (1 - CVAR_ALPHA) of the scenarios
+    # - risk_parity: every asset contributes the same share of the scenarios' variance
+    # Both are described with the same annual return / volatility / Sharpe as the others,
+    # plus their historical CVaR. Risk parity also carries 'parity_gap': the largest
+    # distance of an asset's risk share from 1/n (0 = exact parity; with constraints
+    # it is found by a search and may not reach 0). min_cvar needs scipy (skipped without it).
+
+    print(f" Scenario objectives over {len(scenarios):,} historical scenarios...")
+
+    expected_returns = get_expected_returns(metrics_dict)
+    scenario_cov = np.cov(scenarios, rowvar=False)
+    portfolios = {}
+    try:
+        min_cvar_weights, _ = scenario_risk.min_cvar_weights(scenarios, constraints)
+        portfolios['min_cvar'] = describe_portfolio(min_cvar_weights, expected_returns, cov_matrix)
+    except ImportError:
+        print(" ⚠️  scipy not installed, the Minimum CVaR portfolio is skipped")
+
+    risk_parity_weights = scenario_risk.equal_risk_contribution_weights(scenario_cov, constraints)
+    portfolios['risk_parity'] = describe_portfolio(risk_parity_weights, expected_returns, cov_matrix)
+    shares = scenario_risk.risk_contributions(risk_parity_weights, scenario_cov)[0]
+    portfolios['risk_parity']['parity_gap'] = np.max(np.abs(shares - 1.0 / len(shares)))
+    return portfolios
+
 def format_weights(weights):
 
     return {asset: weight for asset, weight in zip(ASSETS, weights)}
@@ -183,26 +396,82 @@ def calculate_portfolio_metrics(weights, metrics_dict, cov_matrix):
         
         return portfolio_return, portfolio_volatility, sharpe_ratio 
 
-def plot_efficient_frontier(all_results, optimal_portfolios):
-    
-    returns = all_results[0] * 100      # Convert to percentage
-    volatilities = all_results[1] * 100  # Convert to percentage
-    sharpe_ratios = all_results[2]
+def build_density_cloud(metrics_dict, cov_matrix, optimal_portfolios, all_results, constraints=None):
+    # Density grid of the random cloud for PLOT_STYLE = "density" (see portfolio_sampler.bin_portfolios), or None.
+    # "random" mode bins the samples it already holds, "streaming"/"parallel" binned all samples while streaming,
+    # and "exact" streams PLOT_CLOUD_PORTFOLIOS fresh samples straight into the grid (never held in memory).
+    import portfolio_sampler as sampler
+
+    expected_returns = get_expected_returns(metrics_dict)
+    if OPTIMIZATION_MODE == "random":
+        edges = sampler.density_edges(expected_returns, cov_matrix, DENSITY_BINS)
+        return sampler.bin_portfolios(all_results[0], all_results[1], all_results[2], edges)
+    if 'density' in optimal_portfolios:
+        return optimal_portfolios['density']
+    if SHOW_RANDOM_CLOUD:
+        return sampler.sample_portfolios_streaming(expected_returns, cov_matrix, PLOT_CLOUD_PORTFOLIOS, density_bins=DENSITY_BINS,
+                                                   constraints=constraints)['density']
+    return None
+
+def plot_efficient_frontier(all_results, optimal_portfolios, frontier_results=None, density=None):
+    # all_results = random portfolio cloud (3 x N), or None to skip the cloud
+    # frontier_results = exact frontier points (3 x K), drawn as a line when given
+    # density = binned cloud (see build_density_cloud), drawn as one image instead of N dots
+    # matplotlib is imported here, not at module level: it is most of the import time of this module
+    import matplotlib
+    if not SHOW_PLOT:
+        matplotlib.use("Agg")
+    import matplotlib.pyplot as plt
     
     plt.figure(figsize=(14, 8))
     
-    scatter = plt.scatter(
-        volatilities,           # X-axis: Risk
-        returns,               # Y-axis: Return
-        c=sharpe_ratios,       # Color by Sharpe ratio
-        cmap='viridis',        # Color scheme (purple to yellow)
-        alpha=0.5,             # Transparency
-        s=10,                  # Point size
-        edgecolors='none'
-    )
-    
-    # Add colorbar to show Sharpe ratio scale
-    cbar = plt.colorbar(scatter, label='Sharpe Ratio')
+    if density is not None:
+        vol_edges, return_edges = density['edges']
+        with np.errstate(invalid='ignore', divide='ignore'):
+            if DENSITY_AGGREGATE == "mean":
+                sharpe_grid = density['sharpe_sum'] / density['count']
+            else:
+                sharpe_grid = np.where(density['count'] > 0, density['sharpe_max'], np.nan)
+
+        # One image layer: its cost depends on DENSITY_BINS, not on how many portfolios were sampled
+        image = plt.imshow(
+            np.ma.masked_invalid(sharpe_grid),
+            extent=(vol_edges[0] * 100, vol_edges[-1] * 100, return_edges[0] * 100, return_edges[-1] * 100),
+            origin='lower',
+            aspect='auto',
+            cmap='viridis',
+            interpolation='nearest'
+        )
+        cbar = plt.colorbar(image, label=f'Sharpe Ratio ({DENSITY_AGGREGATE} per bin)')
+
+    elif all_results is not None:
+        returns = all_results[0] * 100      # Convert to percentage
+        volatilities = all_results[1] * 100  # Convert to percentage
+        sharpe_ratios = all_results[2]
+
+        scatter = plt.scatter(
+            volatilities,           # X-axis: Risk
+            returns,               # Y-axis: Return
+            c=sharpe_ratios,       # Color by Sharpe ratio
+            cmap='viridis',        # Color scheme (purple to yellow)
+            alpha=0.5,             # Transparency
+            s=10,                  # Point size
+            edgecolors='none'
+        )
+
+        # Add colorbar to show Sharpe ratio scale
+        cbar = plt.colorbar(scatter, label='Sharpe Ratio')
+
+    if frontier_results is not None:
+        # Exact efficient frontier (already ordered from min variance to max return)
+        plt.plot(
+            frontier_results[1] * 100,
+            frontier_results[0] * 100,
+            color='black',
+            linewidth=2.5,
+            label={'exact': 'Efficient Frontier (exact)', 'resampled': 'Efficient Frontier (resampled)'}.get(OPTIMIZATION_MODE, 'Efficient Frontier (best samples)'),
+            zorder=4
+        )
     
     min_vol = optimal_portfolios['min_vol']
     max_sharpe = optimal_portfolios['max_sharpe']
@@ -233,9 +502,31 @@ def plot_efficient_frontier(all_results, optimal_portfolios):
         zorder=5
     )
     
+    # Scenario-based alternatives (see find_scenario_portfolios), when they were computed
+    for key, marker, color, label in [('min_cvar', 'D', 'orange', 'Min CVaR'), ('risk_parity', 's', 'magenta', 'Risk Parity')]:
+        if key in optimal_portfolios:
+            portfolio = optimal_portfolios[key]
+            plt.scatter(
+                portfolio['volatility'] * 100,
+                portfolio['return'] * 100,
+                marker=marker,
+                color=color,
+                s=200,
+                edgecolors='black',
+                linewidths=1.5,
+                label=f"{label}\n(Return: {portfolio['return']*100:.2f}%, Risk: {portfolio['volatility']*100:.2f}%)",
+                zorder=5
+            )
+    
     plt.xlabel('Annual Volatility (Risk) %', fontsize=12, fontweight='bold')
     plt.ylabel('Expected Annual Return %', fontsize=12, fontweight='bold')
-    plt.title('Efficient Frontier: Portfolio Optimization Analysis\n(10,000 Random Portfolios)', 
+    if density is not None:
+        subtitle = f"({int(density['count'].sum()):,} Random Portfolios, binned {DENSITY_BINS[0]}x{DENSITY_BINS[1]})"
+    elif all_results is not None:
+        subtitle = f"({all_results.shape[1]:,} Random Portfolios)"
+    else:
+        subtitle = f"({frontier_results.shape[1]} Frontier Points)"
+    plt.title(f'Efficient Frontier: Portfolio Optimization Analysis\n{subtitle}', 
               fontsize=14, fontweight='bold')
     
     plt.legend(loc='upper left', fontsize=11, framealpha=0.95)
@@ -246,65 +537,136 @@ def plot_efficient_frontier(all_results, optimal_portfolios):
     plt.savefig(output_path, dpi=300, bbox_inches='tight')
     print(f"\n✅ Efficient frontier plot saved to: {output_path}")
     
-    # Show the plot
-    plt.show()
-
-def main():
+    # Show the plot (unless running non-interactively)
+    if SHOW_PLOT:
+        plt.show()
+    plt.close()
+
+@instrumented_stage("portfolio_optimization")
+def main(metrics_df=None, corr_matrix=None, moments=None, returns_df=None):
+    # moments: return_moments.py statistics of the returns (see run_pipeline.py --in-memory);
+    # the covariance matrix then comes straight from them at full precision.
+    # metrics_df / corr_matrix: older in-memory inputs, rebuilt into a covariance matrix.
+    # By default the moments of returns_calculated.csv are used (cached in return_moments.npz),
+    # falling back to financial_metrics.csv and correlation_matrix.csv without it.
+    # returns_df: in-memory returns for the scenario objectives (else returns_calculated.csv).
+    # Returns the optimal portfolios (dict by type), or None if the inputs are missing.
 
     print("="*80)
     print("PORTFOLIO OPTIMIZATION - EFFICIENT FRONTIER & OPTIMAL ALLOCATIONS")
     print("="*80)
 
-    metrics_dict, corr_matrix = load_financial_data()
+    step("load_inputs")
+    if moments is None and (metrics_df is None or corr_matrix is None):
+        print("Loading return moments...")
+        moments = load_return_moments(os.path.join(OUTPUT_DIR, "returns_calculated.csv"),
+                                      os.path.join(OUTPUT_DIR, "return_moments.npz"))
 
-    if metrics_dict is None or corr_matrix is None:
-        return print("Failed to load financial data. Exiting.")
-    
-    print("Financial data loaded successfully.")
+    if moments is not None:
+        step("covariance_matrix")
+        metrics_dict, cov_matrix = optimizer_inputs(moments, ASSETS)
+        print_covariance_matrix(metrics_dict, cov_matrix)
+    else:
+        if metrics_df is None or corr_matrix is None:
+            metrics_dict, corr_matrix = load_financial_data()
+        else:
+            metrics_dict = metrics_dict_from_frame(metrics_df)
+
+        if metrics_dict is None or corr_matrix is None:
+            return print("Failed to load financial data. Exiting.")
+
+        print("Financial data loaded successfully.")
 
-    cov_matrix = build_covariance_matrix(metrics_dict, corr_matrix)
-    optimal_portfolios, all_results, all_weights = find_optimal_portfolios(metrics_dict, cov_matrix)
+        step("covariance_matrix")
+        cov_matrix = build_covariance_matrix(metrics_dict, corr_matrix)
+
+    constraints = portfolio_constraints.build_constraints(ASSETS, WEIGHT_BOUNDS, GROUP_BOUNDS, FIXED_WEIGHTS)
+
+    # Historical scenarios, for the scenario objectives and the resampled mode
+    scenarios = None
+    returns_path = os.path.join(OUTPUT_DIR, "returns_calculated.csv")
+    if (SCENARIO_OBJECTIVES or OPTIMIZATION_MODE == "resampled") and (returns_df is not None or os.path.exists(returns_path)):
+        scenarios = scenario_risk.load_scenarios(ASSETS, returns_df, returns_path)
+
+    step(f"optimize_{OPTIMIZATION_MODE}")
+    optimal_portfolios, all_results, all_weights = find_optimal_portfolios(metrics_dict, cov_matrix, OPTIMIZATION_MODE, constraints, scenarios)
+    # Exact mode solves one QP per frontier point, resampled mode one optimization per resample;
+    # the sampling modes evaluate NUMBER_OF_PORTFOLIOS portfolios
+    if OPTIMIZATION_MODE == "resampled":
+        import resampled_frontier as resampler
+        throughput(resampler.RESAMPLES, "resamples")
+    else:
+        throughput(all_results.shape[1] if OPTIMIZATION_MODE == "exact" else NUMBER_OF_PORTFOLIOS, "portfolios")
+
+    # Portfolio types written to optimal_portfolios.csv, in order
+    portfolio_labels = {'min_vol': 'Minimum Variance', 'max_sharpe': 'Maximum Sharpe'}
+    if SCENARIO_OBJECTIVES and scenarios is not None:
+        step("scenario_objectives")
+        scenario_portfolios = find_scenario_portfolios(metrics_dict, cov_matrix, scenarios, constraints)
+        optimal_portfolios.update(scenario_portfolios)
+        portfolio_labels.update({key: label for key, label in (('min_cvar', 'Minimum CVaR'), ('risk_parity', 'Risk Parity'))
+                                 if key in scenario_portfolios})
+
+    # Except in "random" mode all_results is the (exact or reduced) frontier; the random cloud is only for the plot
+    # (nothing of it is built when PLOT_RESULTS is off)
+    density = None
+    frontier_results = cloud_results = None
+    if PLOT_RESULTS:
+        step("plot_cloud")
+        if PLOT_STYLE == "density":
+            frontier_results = all_results if OPTIMIZATION_MODE != "random" else None
+            density = build_density_cloud(metrics_dict, cov_matrix, optimal_portfolios, all_results, constraints)
+        elif OPTIMIZATION_MODE != "random":
+            frontier_results = all_results
+            cloud_results = generate_random_portfolios(metrics_dict, cov_matrix, PLOT_CLOUD_PORTFOLIOS, constraints=constraints)[0] if SHOW_RANDOM_CLOUD else None
+        else:
+            cloud_results = all_results
 
     min_vol = optimal_portfolios['min_vol']
     max_sharpe = optimal_portfolios['max_sharpe']   
 
+    # Historical CVaR of every reported portfolio (scenario_risk.portfolio_cvar)
+    cvar_column = f"CVaR_{round(scenario_risk.CVAR_ALPHA * 100)}_%"
+    if scenarios is not None:
+        cvars = scenario_risk.portfolio_cvar(np.array([optimal_portfolios[key]['weights'] for key in portfolio_labels]), scenarios)
+        for key, cvar in zip(portfolio_labels, cvars):
+            optimal_portfolios[key]['cvar'] = cvar
+
     print("\n" + "="*80)
     print("Optimal Portfolios Found:")
     print("="*80)
 
-    print("\n Minimum Variance Portfolio:")
-    print("-"*80)
-    min_vol_weights_dict = format_weights(min_vol['weights'])
+    weights_dicts = {}
+    for key, label in portfolio_labels.items():
+        portfolio = optimal_portfolios[key]
+        print(f"\n {label} Portfolio:")
+        print("-"*80)
+        weights_dicts[key] = format_weights(portfolio['weights'])
 
-    print(f"  Expected Annual Return: {min_vol['return']*100:.2f}%")
-    print(f"  Annualized Volatility: {min_vol['volatility']*100:.2f}%")
-    print(f"  Sharpe Ratio: {min_vol['sharpe_ratio']:.4f}")
-    print(f"\n Asset Allocation:")
+        print(f"  Expected Annual Return: {portfolio['return']*100:.2f}%")
+        print(f"  Annualized Volatility: {portfolio['volatility']*100:.2f}%")
+        print(f"  Sharpe Ratio: {portfolio['sharpe_ratio']:.4f}")
+        if 'cvar' in portfolio:
+            print(f"  Historical CVaR ({scenario_risk.CVAR_ALPHA:.0%}, per period): {portfolio['cvar']*100:.2f}%")
+        if 'parity_gap' in portfolio:
+            print(f"  Risk parity gap: largest risk share {portfolio['parity_gap']*100:.2f} pp away from 1/{len(ASSETS)}")
+        print(f"\n Asset Allocation:")
 
-    for asset, weight in min_vol_weights_dict.items():
-        allocation_pct = weight * 100
+        for asset, weight in weights_dicts[key].items():
+            allocation_pct = weight * 100
 
-        if allocation_pct > 0.01:
-            bar = '█' * int(allocation_pct // 2)
-            print(f"   {asset:25s}: {allocation_pct:6.2f}% | {bar}")
+            if allocation_pct > 0.01:
+                bar = '█' * int(allocation_pct // 2)
+                print(f"   {asset:25s}: {allocation_pct:6.2f}% | {bar}")
 
-    print("\n Maximum Sharpe Ratio Portfolio:")
-    print("-"*80)
-    max_sharpe_weights_dict = format_weights(max_sharpe['weights'])
+    min_vol_weights_dict = weights_dicts['min_vol']
+    max_sharpe_weights_dict = weights_dicts['max_sharpe']
 
-    print(f"  Expected Annual Return: {max_sharpe['return']*100:.2f}%")
-    print(f"  Annualized Volatility: {max_sharpe['volatility']*100:.2f}%")
-    print(f"  Sharpe Ratio: {max_sharpe['sharpe_ratio']:.4f}")
-    print(f"\n Asset Allocation:")
+    if PLOT_RESULTS:
+        step("plot")
+        plot_efficient_frontier(cloud_results, optimal_portfolios, frontier_results, density)
 
-    for asset, weight in max_sharpe_weights_dict.items():
-        allocation_pct = weight * 100
-
-        if allocation_pct > 0.01:
-            bar = '█' * int(allocation_pct // 2)
-            print(f"   {asset:25s}: {allocation_pct:6.2f}% | {bar}")
-
-    plot_efficient_frontier(all_results, optimal_portfolios)
+    step("report_and_save")
     
     print("\n" + "="*80)
     print("ROBLOX ITEMS vs TRADITIONAL STOCKS")
@@ -328,60 +690,119 @@ def main():
     print("💾SAVING RESULTS TO CSV")
     print("="*80)
     
-    optimal_summary = pd.DataFrame([
-        {
-            'Portfolio_Type': 'Minimum Variance',
-            'Expected_Return_%': min_vol['return'] * 100,
-            'Volatility_%': min_vol['volatility'] * 100,
-            'Sharpe_Ratio': min_vol['sharpe_ratio'],
-            'Dominus_Empyreus_%': min_vol_weights_dict.get('Dominus_Empyreus', 0) * 100,
-            'Violet_Valkyrie_%': min_vol_weights_dict.get('Violet_Valkyrie', 0) * 100,
-            'Red_Valkyrie_%': min_vol_weights_dict.get('Red_Valkyrie', 0) * 100,
-            'RBLX_%': min_vol_weights_dict.get('RBLX', 0) * 100,
-            'VWCE_DE_%': min_vol_weights_dict.get('VWCE_DE', 0) * 100,
-            'Roblox_Total_%': roblox_weight_min,
-            'Stocks_Total_%': stocks_weight_min
-        },
-        {
-            'Portfolio_Type': 'Maximum Sharpe',
-            'Expected_Return_%': max_sharpe['return'] * 100,
-            'Volatility_%': max_sharpe['volatility'] * 100,
-            'Sharpe_Ratio': max_sharpe['sharpe_ratio'],
-            'Dominus_Empyreus_%': max_sharpe_weights_dict.get('Dominus_Empyreus', 0) * 100,
-            'Violet_Valkyrie_%': max_sharpe_weights_dict.get('Violet_Valkyrie', 0) * 100,
-            'Red_Valkyrie_%': max_sharpe_weights_dict.get('Red_Valkyrie', 0) * 100,
-            'RBLX_%': max_sharpe_weights_dict.get('RBLX', 0) * 100,
-            'VWCE_DE_%': max_sharpe_weights_dict.get('VWCE_DE', 0) * 100,
-            'Roblox_Total_%': roblox_weight_max,
-            'Stocks_Total_%': stocks_weight_max
+    summary_rows = []
+    for key, label in portfolio_labels.items():
+        portfolio = optimal_portfolios[key]
+        weights_dict = weights_dicts[key]
+        row = {
+            'Portfolio_Type': label,
+            'Expected_Return_%': portfolio['return'] * 100,
+            'Volatility_%': portfolio['volatility'] * 100,
+            'Sharpe_Ratio': portfolio['sharpe_ratio']
         }
-    ])
+        for asset in ASSETS:
+            row[f'{asset}_%'] = weights_dict.get(asset, 0) * 100
+        row['Roblox_Total_%'] = sum([weights_dict[item] for item in ROBLOX_ITEMS if item in weights_dict]) * 100
+        row['Stocks_Total_%'] = sum([weights_dict[ticker] for ticker in STOCKS if ticker in weights_dict]) * 100
+        if 'cvar' in portfolio:
+            row[cvar_column] = portfolio['cvar'] * 100
+        summary_rows.append(row)
+    optimal_summary = pd.DataFrame(summary_rows)
     
     output_path = os.path.join(OUTPUT_DIR, "optimal_portfolios.csv")
     optimal_summary.to_csv(output_path, index=False)
     print(f"\n✅ Optimal portfolios saved to: {output_path}")
     
-    efficient_frontier = pd.DataFrame({
-        'Expected_Return_%': all_results[0] * 100,
-        'Volatility_%': all_results[1] * 100,
-        'Sharpe_Ratio': all_results[2]
-    })
-    
-    ef_output_path = os.path.join(OUTPUT_DIR, "efficient_frontier.csv")
-    efficient_frontier.to_csv(ef_output_path, index=False)
-    print(f"✅ Efficient frontier data saved to: {ef_output_path}")
+    if "csv" in FRONTIER_OUTPUT_FORMATS:
+        efficient_frontier = pd.DataFrame({
+            'Expected_Return_%': all_results[0] * 100,
+            'Volatility_%': all_results[1] * 100,
+            'Sharpe_Ratio': all_results[2]
+        })
+
+        ef_output_path = os.path.join(OUTPUT_DIR, "efficient_frontier.csv")
+        efficient_frontier.to_csv(ef_output_path, index=False)
+        print(f"✅ Efficient frontier data saved to: {ef_output_path}")
+
+    # Binary formats also keep the full weight matrix (see frontier_store.py for the loaders)
+    if "npy" in FRONTIER_OUTPUT_FORMATS:
+        npy_output_dir = os.path.join(OUTPUT_DIR, "efficient_frontier_npy")
+        frontier_store.save_frontier_npy(npy_output_dir, all_results, all_weights, ASSETS)
+        print(f"✅ Efficient frontier + weights saved to: {npy_output_dir}/")
+
+    if "parquet" in FRONTIER_OUTPUT_FORMATS:
+        parquet_output_path = os.path.join(OUTPUT_DIR, "efficient_frontier.parquet")
+        frontier_store.save_frontier_parquet(parquet_output_path, all_results, all_weights, ASSETS)
+        print(f"✅ Efficient frontier + weights saved to: {parquet_output_path}")
+
+    # Resampled mode: how much each weight moved across the bootstrap resamples
+    if 'weight_bands' in optimal_portfolios:
+        import resampled_frontier as resampler
+        bands = optimal_portfolios['weight_bands']
+        bands_path = resampler.save_weight_bands(bands, ASSETS, portfolio_labels, os.path.join(OUTPUT_DIR, "resampled_weights.csv"))
+        low, high = min(resampler.PERCENTILES), max(resampler.PERCENTILES)
+        for key, band in bands.items():
+            print(f"\n {portfolio_labels[key]} - resampled weights (mean, P{low}-P{high}):")
+            for i, asset in enumerate(ASSETS):
+                print(f"   {asset:25s}: {band['mean'][i]*100:6.2f}%  [{band['percentiles'][low][i]*100:6.2f}% - {band['percentiles'][high][i]*100:6.2f}%]")
+        print(f"✅ Resampled weight bands saved to: {bands_path}")
+
+    # Streaming/parallel modes also keep the best portfolios by Sharpe ratio
+    if 'top_sharpe' in optimal_portfolios:
+        top = optimal_portfolios['top_sharpe']
+        top_sharpe_df = pd.DataFrame({
+            'Sample_Index': top['index'],
+            'Expected_Return_%': top['return'] * 100,
+            'Volatility_%': top['volatility'] * 100,
+            'Sharpe_Ratio': top['sharpe_ratio']
+        })
+        for i, asset in enumerate(ASSETS):
+            top_sharpe_df[f'{asset}_%'] = top['weights'][:, i] * 100
+
+        top_output_path = os.path.join(OUTPUT_DIR, "top_sharpe_portfolios.csv")
+        top_sharpe_df.to_csv(top_output_path, index=False)
+        print(f"✅ Top {len(top_sharpe_df)} portfolios by Sharpe saved to: {top_output_path}")
     
     print("\n" + "="*80)
     print("✅ ANALYSIS COMPLETE!")
     print("="*80 + "\n")
+    return optimal_portfolios
+
+def configure(mode=None, resamples=None, plot_style=None, show_plot=None, plot=None, max_roblox=None, max_weight=None, chunk_size=None):
+    # Overrides the configuration constants for this run (command line of this script and of cli.py); None keeps a setting
+    global OPTIMIZATION_MODE, PLOT_STYLE, SHOW_PLOT, PLOT_RESULTS, GROUP_BOUNDS, WEIGHT_BOUNDS, CHUNK_SIZE
+
+    if max_roblox is not None:
+        GROUP_BOUNDS = dict(GROUP_BOUNDS, **{"Roblox Items": (ROBLOX_ITEMS, 0.0, max_roblox)})
+    if max_weight is not None:
+        WEIGHT_BOUNDS = {asset: (WEIGHT_BOUNDS.get(asset, (0.0, 1.0))[0], min(WEIGHT_BOUNDS.get(asset, (0.0, 1.0))[1], max_weight))
+                         for asset in ASSETS}
+
+    if mode:
+        OPTIMIZATION_MODE = mode
+    if resamples:
+        import resampled_frontier
+        resampled_frontier.RESAMPLES = resamples
+    if plot_style:
+        PLOT_STYLE = plot_style
+    if show_plot is not None:
+        SHOW_PLOT = show_plot
+    if plot is not None:
+        PLOT_RESULTS = plot
+    if chunk_size:
+        # The samplers read it from portfolio_metrics when they run
+        CHUNK_SIZE = portfolio_metrics.CHUNK_SIZE = chunk_size
+
+def configure_from_args(args):
+    # args: parsed with the options of optimizer_options.add_arguments (shared with cli.py optimize)
+    configure(mode=args.mode, resamples=args.resamples, plot_style=args.plot_style,
+              show_plot=False if args.no_show else None, plot=False if args.no_plot else None,
+              max_roblox=args.max_roblox, max_weight=args.max_weight)
 
 if __name__ == "__main__":
-    main()
-
+    import argparse
 
-
-
-
-
-
-    
\ No newline at end of file
+    parser = argparse.ArgumentParser(description="Find the minimum variance and maximum Sharpe portfolios.")
+    add_arguments(parser)
+    configure_from_args(parser.parse_args())
+    main()
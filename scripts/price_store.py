@@ -0,0 +1,195 @@
+import pandas as pd
+import numpy as np
+import json
+import os
+
+from fetch_stock_data import read_price_csv
+
+# --- Configuration ---
+OUTPUT_DIR = "data"
+STORE_DIR = os.path.join(OUTPUT_DIR, "price_store")
+PRICE_DTYPE = np.float64  # Same values as parsing the CSVs. np.float32 halves the files, but is only exact for
+                          # whole-Robux values up to ~16.7M (a close of 91.65 comes back as 91.6500015...)
+DATE_DTYPE = np.int32     # Days since 1970-01-01
+
+# Store layout (raw binary, readable with np.memmap):
+#   manifest.json   assets in column order, row count, price dtype and the source CSV each asset was imported from
+#   dates           DATE_DTYPE, one sorted date per row, shared by every asset
+#   <asset>         PRICE_DTYPE, one price per row (NaN = no price that day)
+# New dates after the last one are appended to every file; a new asset only adds
+# its own file. Only a date earlier than the last one forces a rewrite (rare: backfills).
+
+
+def _path(store_dir, name):
+    return os.path.join(store_dir, name)
+
+
+def load_manifest(store_dir=STORE_DIR):
+    # {'assets': [...], 'rows': N, 'dtype': name, 'sources': {asset: {'file', 'signature'}}}; empty for a new store
+    manifest_path = _path(store_dir, "manifest.json")
+    if not os.path.exists(manifest_path):
+        return {"assets": [], "rows": 0, "dtype": np.dtype(PRICE_DTYPE).name, "sources": {}}
+    with open(manifest_path) as f:
+        manifest = json.load(f)
+    # Stores written before the dtype was recorded are float32
+    manifest.setdefault("dtype", "float32")
+    return manifest
+
+
+def save_manifest(manifest, store_dir=STORE_DIR):
+    with open(_path(store_dir, "manifest.json"), "w") as f:
+        json.dump(manifest, f, indent=2, sort_keys=True)
+
+
+def _read(store_dir, name, dtype, rows, mode="r"):
+    # The whole column as a memory map (nothing is read until it is used)
+    if rows == 0:
+        return np.zeros(0, dtype=dtype)
+    return np.memmap(_path(store_dir, name), dtype=dtype, mode=mode, shape=(rows,))
+
+
+def _append(store_dir, name, values, dtype):
+    with open(_path(store_dir, name), "ab") as f:
+        f.write(np.ascontiguousarray(values, dtype=dtype).tobytes())
+
+
+def _to_days(dates):
+    return pd.DatetimeIndex(dates).values.astype("datetime64[D]").astype(DATE_DTYPE)
+
+
+def _rewrite(store_dir, manifest, days):
+    # Puts every column on a new (larger) sorted date index; only used for backfills
+    old_days = np.array(_read(store_dir, "dates", DATE_DTYPE, manifest["rows"]))
+    positions = np.searchsorted(days, old_days)
+    for asset in manifest["assets"]:
+        column = np.full(len(days), np.nan, dtype=PRICE_DTYPE)
+        column[positions] = _read(store_dir, asset, PRICE_DTYPE, manifest["rows"])
+        column.tofile(_path(store_dir, asset))
+    days.astype(DATE_DTYPE).tofile(_path(store_dir, "dates"))
+    manifest["rows"] = len(days)
+
+
+def append_prices(asset, dates, prices, store_dir=STORE_DIR, manifest=None, replace=False):
+    """
+    Writes one asset's prices into the store. Dates already in the store are
+    updated in place, dates after the last one are appended to every column
+    (NaN for the other assets), so a daily update writes a few bytes per asset.
+    replace=True first clears the asset's column, so dates missing from
+    `dates` end up NaN instead of keeping an older import's prices.
+    Pass manifest to batch several assets; it is saved by the caller then.
+    Returns the number of new rows.
+    """
+    os.makedirs(store_dir, exist_ok=True)
+    save = manifest is None
+    if manifest is None:
+        manifest = load_manifest(store_dir)
+
+    days = _to_days(dates)
+    prices = np.asarray(prices, dtype=PRICE_DTYPE)
+    order = np.argsort(days, kind="stable")
+    days, prices = days[order], prices[order]
+
+    rows_before = manifest["rows"]
+    if asset not in manifest["assets"]:
+        np.full(manifest["rows"], np.nan, dtype=PRICE_DTYPE).tofile(_path(store_dir, asset))
+        manifest["assets"].append(asset)
+
+    stored_days = _read(store_dir, "dates", DATE_DTYPE, manifest["rows"])
+    last_day = stored_days[-1] if manifest["rows"] else np.iinfo(DATE_DTYPE).min
+    new_days = np.setdiff1d(days, stored_days)
+
+    if len(new_days) and new_days[0] <= last_day:
+        # A date before the end of the history: rebuild the index once
+        _rewrite(store_dir, manifest, np.union1d(stored_days, days))
+    elif len(new_days):
+        _append(store_dir, "dates", new_days, DATE_DTYPE)
+        for other in manifest["assets"]:
+            _append(store_dir, other, np.full(len(new_days), np.nan), PRICE_DTYPE)
+        manifest["rows"] += len(new_days)
+
+    # Every date of this asset now has a row: write its prices there
+    stored_days = _read(store_dir, "dates", DATE_DTYPE, manifest["rows"])
+    column = _read(store_dir, asset, PRICE_DTYPE, manifest["rows"], mode="r+")
+    if replace:
+        column[:] = np.nan
+    column[np.searchsorted(stored_days, days)] = prices
+    column.flush()
+
+    if save:
+        save_manifest(manifest, store_dir)
+    return manifest["rows"] - rows_before
+
+
+def _file_signature(path):
+    stat = os.stat(path)
+    return [stat.st_mtime_ns, stat.st_size]
+
+
+def sync_price_store(sources, store_dir=STORE_DIR):
+    """
+    Brings the store up to date with the per-asset CSVs.
+    sources: {asset: (csv path, price column)}, e.g. {"RBLX": ("data/rblx_prices.csv", "Close")}.
+    Only files whose modification time or size changed since they were last
+    imported are parsed again; such a file replaces the asset's whole column
+    (a re-exported CSV may have dropped dates). Assets imported from a file
+    that no longer exists, or no longer listed in sources, are removed from
+    the store. Returns the list of assets that were imported.
+    """
+    manifest = load_manifest(store_dir)
+    if manifest["dtype"] != np.dtype(PRICE_DTYPE).name:
+        # PRICE_DTYPE changed: the columns can not be reused, import everything again
+        for name in manifest["assets"] + ["dates", "manifest.json"]:
+            if os.path.exists(_path(store_dir, name)):
+                os.remove(_path(store_dir, name))
+        manifest = load_manifest(store_dir)
+
+    # An asset whose CSV was deleted (or is no longer a source) must not keep merging its old prices.
+    # Its dates stay in the shared index; rows no stock has are dropped by the merge anyway
+    removed = [asset for asset in manifest["sources"]
+               if asset not in sources or not os.path.exists(sources[asset][0])]
+    for asset in removed:
+        if os.path.exists(_path(store_dir, asset)):
+            os.remove(_path(store_dir, asset))
+        manifest["assets"].remove(asset)
+        del manifest["sources"][asset]
+
+    imported = []
+    for asset, (filepath, column) in sources.items():
+        if not os.path.exists(filepath):
+            continue
+        source = {"file": filepath, "signature": _file_signature(filepath)}
+        if manifest["sources"].get(asset) == source:
+            continue
+        # read_price_csv handles the flat, yfinance and Date,RAP layouts alike
+        df = read_price_csv(filepath)
+        append_prices(asset, df.index, df[column].to_numpy(), store_dir, manifest, replace=True)
+        manifest["sources"][asset] = source
+        imported.append(asset)
+
+    if imported or removed:
+        save_manifest(manifest, store_dir)
+    return imported
+
+
+def load_prices(assets=None, start=None, end=None, store_dir=STORE_DIR):
+    """
+    Prices of `assets` (default: all) between start and end (inclusive, any
+    date pandas can parse), as {'dates': DatetimeIndex, 'columns': {asset: array}}.
+    The columns are read-only slices of the memory-mapped files: no parsing and
+    no copy, pages are only read when the values are used.
+    Raises KeyError for an asset that is not in the store.
+    """
+    manifest = load_manifest(store_dir)
+    dtype = np.dtype(manifest["dtype"])
+    days = _read(store_dir, "dates", DATE_DTYPE, manifest["rows"])
+    first = 0 if start is None else int(np.searchsorted(days, _to_days([start])[0], side="left"))
+    last = len(days) if end is None else int(np.searchsorted(days, _to_days([end])[0], side="right"))
+
+    columns = {}
+    for asset in (manifest["assets"] if assets is None else assets):
+        if asset not in manifest["assets"]:
+            raise KeyError(f"{asset} is not in the price store ({store_dir})")
+        columns[asset] = _read(store_dir, asset, dtype, manifest["rows"])[first:last]
+
+    dates = pd.DatetimeIndex(days[first:last].astype("datetime64[D]"), name="Date")
+    return {"dates": dates, "columns": columns}
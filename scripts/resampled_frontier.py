@@ -0,0 +1,156 @@
+import pandas as pd
+import numpy as np
+import os
+from concurrent.futures import ProcessPoolExecutor
+
+import efficient_frontier_solver as frontier_solver
+import portfolio_metrics
+from rolling_metrics import annualize_moments
+
+# --- Configuration ---
+OUTPUT_DIR = "data"
+RESAMPLES = 1000               # Bootstrap resamples of the returns history
+BLOCK_LENGTH = 20              # Consecutive rows per bootstrap block (keeps short-term autocorrelation)
+RESAMPLE_BATCH = 50            # Resamples per pool task; their moments are estimated in one batch
+WORKERS = os.cpu_count() or 1  # Processes in the pool
+RESAMPLED_FRONTIER_POINTS = 50 # Points on each resample's frontier (averaged rank by rank)
+PERCENTILES = [5, 50, 95]      # Bands reported for every asset weight
+BANDS_FILE = os.path.join(OUTPUT_DIR, "resampled_weights.csv")
+
+# Set inside each worker process by _attach_inputs
+_scenarios = None
+_assets = None
+_constraint_rows = None
+
+
+def block_rng(seed, batch_index):
+    # Random stream of one batch; depends only on (seed, batch index), never on the worker
+    return np.random.default_rng(np.random.SeedSequence(seed, spawn_key=(batch_index,)))
+
+
+def bootstrap_indices(rng, n_resamples, n_rows, block_length=BLOCK_LENGTH):
+    """
+    Row indices of n_resamples circular block-bootstrap resamples (n_resamples x n_rows):
+    each resample glues together blocks of block_length consecutive rows
+    starting at random dates, wrapping around the end of the history.
+    """
+    n_blocks = int(np.ceil(n_rows / block_length))
+    starts = rng.integers(0, n_rows, size=(n_resamples, n_blocks))
+    indices = (starts[:, :, None] + np.arange(block_length)) % n_rows
+    return indices.reshape(n_resamples, -1)[:, :n_rows]
+
+
+def resampled_moments(scenarios, indices, assets):
+    """
+    Annual expected returns (R x n) and covariance matrices (R x n x n) of a
+    batch of resamples, estimated together with batched array operations.
+    """
+    samples = scenarios[indices]
+    means = samples.mean(axis=1)
+    centered = samples - means[:, None, :]
+    covariances = np.einsum('rti,rtj->rij', centered, centered) / (indices.shape[1] - 1)
+    annual_returns, _, _, annual_covariances = annualize_moments(means, covariances, assets)
+    return annual_returns, annual_covariances
+
+
+def solve_resample(expected_returns, cov_matrix, constraint_rows=None, frontier_points=RESAMPLED_FRONTIER_POINTS):
+    # Minimum variance, maximum Sharpe and frontier weights for one set of estimated moments
+    min_vol = frontier_solver.min_variance_weights(cov_matrix, constraint_rows)
+    frontier = frontier_solver.efficient_frontier_weights(expected_returns, cov_matrix, frontier_points, constraint_rows)
+    max_sharpe = frontier_solver.max_sharpe_weights(expected_returns, cov_matrix, portfolio_metrics.RISK_FREE_RATE, constraint_rows)
+    if max_sharpe is None:
+        # No asset beats the risk-free rate in this resample: take the best frontier point
+        _, _, sharpes = portfolio_metrics.calculate_portfolio_metrics_batch(frontier, expected_returns, cov_matrix)
+        max_sharpe = frontier[np.argmax(sharpes)]
+    return min_vol, max_sharpe, frontier
+
+
+def resample_batch(batch_index, n_resamples, seed, scenarios, assets, constraint_rows=None):
+    """
+    Draws n_resamples bootstrap resamples, re-estimates their moments in one
+    batch and re-solves the optimal portfolios of each.
+    Returns {'min_vol': R x n, 'max_sharpe': R x n, 'frontier': R x points x n}.
+    """
+    rng = block_rng(seed, batch_index)
+    indices = bootstrap_indices(rng, n_resamples, len(scenarios))
+    annual_returns, annual_covariances = resampled_moments(scenarios, indices, assets)
+
+    solutions = [solve_resample(annual_returns[r], annual_covariances[r], constraint_rows) for r in range(n_resamples)]
+    return {
+        'min_vol': np.array([solution[0] for solution in solutions]),
+        'max_sharpe': np.array([solution[1] for solution in solutions]),
+        'frontier': np.array([solution[2] for solution in solutions])
+    }
+
+
+def _attach_inputs(scenarios, assets, constraint_rows):
+    # Pool initializer: the scenario matrix is sent once per worker, not once per task
+    global _scenarios, _assets, _constraint_rows
+    _scenarios, _assets, _constraint_rows = scenarios, assets, constraint_rows
+
+
+def _resample_batch_task(task):
+    batch_index, n_resamples, seed = task
+    return resample_batch(batch_index, n_resamples, seed, _scenarios, _assets, _constraint_rows)
+
+
+def resample_optimal_weights(scenarios, assets, constraint_rows=None, resamples=None, workers=None, seed=None):
+    """
+    Runs `resamples` bootstrap resamples in batches of RESAMPLE_BATCH across a
+    process pool and stacks the re-solved weights of every resample.
+    resamples / workers default to RESAMPLES / WORKERS as they are at call time
+    (so the optimizer's --resamples applies). The result does not depend on the
+    number of workers.
+    """
+    if resamples is None:
+        resamples = RESAMPLES
+    if workers is None:
+        workers = WORKERS
+    if seed is None:
+        seed = portfolio_metrics.RANDOM_SEED
+
+    tasks = []
+    for batch_index, start in enumerate(range(0, resamples, RESAMPLE_BATCH)):
+        tasks.append((batch_index, min(RESAMPLE_BATCH, resamples - start), seed))
+
+    if workers <= 1:
+        batches = [resample_batch(batch_index, n, batch_seed, scenarios, assets, constraint_rows) for batch_index, n, batch_seed in tasks]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_attach_inputs, initargs=(scenarios, assets, constraint_rows)) as pool:
+            batches = list(pool.map(_resample_batch_task, tasks))
+
+    return {key: np.concatenate([batch[key] for batch in batches]) for key in ('min_vol', 'max_sharpe', 'frontier')}
+
+
+def weight_bands(weights, percentiles=PERCENTILES):
+    # Mean weight of every asset across resamples, plus the requested percentiles
+    return {
+        'mean': weights.mean(axis=0),
+        'percentiles': {p: np.percentile(weights, p, axis=0) for p in percentiles}
+    }
+
+
+def resampled_frontier(frontier_weights):
+    """
+    The resampled efficient frontier: the k-th point of every resample's
+    frontier averaged together (rank by rank), renormalized to sum to 1.
+    Averages of feasible portfolios stay feasible.
+    """
+    weights = frontier_weights.mean(axis=0)
+    return weights / np.sum(weights, axis=1, keepdims=True)
+
+
+def save_weight_bands(bands, assets, labels, path=BANDS_FILE):
+    """
+    One row per (portfolio type, asset): mean weight and percentile band in %.
+    bands: {key: weight_bands(...)}, labels: {key: 'Portfolio_Type' shown}.
+    """
+    rows = []
+    for key, band in bands.items():
+        for i, asset in enumerate(assets):
+            row = {'Portfolio_Type': labels[key], 'Asset': asset, 'Mean_Weight_%': band['mean'][i] * 100}
+            for p, values in band['percentiles'].items():
+                row[f'P{p}_Weight_%'] = values[i] * 100
+            rows.append(row)
+    pd.DataFrame(rows).to_csv(path, index=False)
+    return path
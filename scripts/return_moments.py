@@ -0,0 +1,219 @@
+import pandas as pd
+import numpy as np
+import hashlib
+import os
+
+from rolling_metrics import annualize_moments
+
+# --- Configuration ---
+OUTPUT_DIR = "data"
+RETURNS_FILE = os.path.join(OUTPUT_DIR, "returns_calculated.csv")
+# One pass over RETURNS_FILE is saved here, so metrics, correlation and the optimizer share it
+MOMENTS_FILE = os.path.join(OUTPUT_DIR, "return_moments.npz")
+CHUNK_ROWS = 100000  # Rows of returns read and folded in at a time
+
+
+# --- Accumulator ---
+# State, all (n, n) and kept per pair of assets so missing values drop only
+# from the pairs they belong to (like pandas' per-column mean/std and
+# pairwise-complete corr):
+# - 'count': rows where both assets have a return (diagonal: rows of that asset)
+# - 'mean':  mean of asset i over those rows
+# - 'm2':    sum of centered cross-products over those rows
+# - 'sq':    sum of squared deviations of asset i over those rows
+# States merge exactly (Chan et al., pair by pair), so chunks can be folded in
+# one by one or summarized separately (e.g. by workers) and merged in any order.
+
+def empty_moments(n_assets):
+    return {key: np.zeros((n_assets, n_assets)) for key in ('count', 'mean', 'm2', 'sq')}
+
+
+def chunk_moments(values):
+    """
+    State of one chunk of returns (rows x assets), NaN = missing. Centering on
+    the chunk mean before the cross-product keeps it accurate even when
+    returns are tiny compared to their mean.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    n_rows, n_assets = values.shape
+    observed = ~np.isnan(values)
+
+    if observed.all():
+        # Every pair sees every row: one cross-product, as without missing values
+        if n_rows == 0:
+            return empty_moments(n_assets)
+        mean = values.mean(axis=0)
+        centered = values - mean
+        m2 = centered.T @ centered
+        return {'count': np.full((n_assets, n_assets), float(n_rows)),
+                'mean': np.repeat(mean[:, None], n_assets, axis=1),
+                'm2': m2,
+                'sq': np.repeat(np.diag(m2)[:, None], n_assets, axis=1)}
+
+    weights = observed.astype(np.float64)
+    column_count = weights.sum(axis=0)
+    with np.errstate(invalid='ignore', divide='ignore'):
+        center = np.where(column_count > 0, np.nansum(values, axis=0) / column_count, 0.0)
+    centered = np.where(observed, values - center, 0.0)
+
+    count = weights.T @ weights
+    with np.errstate(invalid='ignore', divide='ignore'):
+        # Offset of asset i's mean over the rows shared with j from its chunk mean
+        offset = np.where(count > 0, (centered.T @ weights) / count, 0.0)
+    return {'count': count,
+            'mean': np.where(count > 0, center[:, None] + offset, 0.0),
+            'm2': centered.T @ centered - count * offset * offset.T,
+            'sq': (centered ** 2).T @ weights - count * offset ** 2}
+
+
+def merge_moments(a, b):
+    """
+    Combines two states as if their rows had been seen in one pass, for each
+    pair (delta = mean_b - mean_a, delta.T the other asset's delta):
+    mean = mean_a + delta * n_b / n
+    m2   = m2_a + m2_b + delta delta.T * n_a * n_b / n
+    sq   = sq_a + sq_b + delta^2 * n_a * n_b / n
+    """
+    if not a['count'].any():
+        return b
+    if not b['count'].any():
+        return a
+    count = a['count'] + b['count']
+    delta = b['mean'] - a['mean']
+    with np.errstate(invalid='ignore', divide='ignore'):
+        share = np.where(count > 0, b['count'] / count, 0.0)
+        spread = np.where(count > 0, a['count'] * b['count'] / count, 0.0)
+    return {
+        'count': count,
+        'mean': a['mean'] + delta * share,
+        'm2': a['m2'] + b['m2'] + delta * delta.T * spread,
+        'sq': a['sq'] + b['sq'] + delta ** 2 * spread
+    }
+
+
+def update_moments(state, values):
+    # Folds one more chunk of rows into the running state
+    return merge_moments(state, chunk_moments(values))
+
+
+def finalize_moments(state, assets):
+    """
+    Per-period statistics from a state (sample statistics, ddof=1):
+    {'assets', 'count', 'mean', 'variance', 'std', 'covariance', 'correlation'}
+    count, mean, variance and std use every return of each asset; correlation
+    uses the rows both assets have (pandas' corr). covariance is correlation x
+    std_i x std_j, as the optimizer has always built it, and equals the
+    sample covariance when no value is missing.
+    Correlation is NaN for an asset whose returns never change, as in pandas.
+    """
+    count = np.diag(state['count']).copy()
+    with np.errstate(invalid='ignore', divide='ignore'):
+        variance = np.where(count > 1, np.diag(state['m2']) / (count - 1), np.nan)
+        correlation = np.where(state['count'] > 1, state['m2'] / np.sqrt(state['sq'] * state['sq'].T), np.nan)
+    std = np.sqrt(np.maximum(variance, 0))
+    correlation = np.clip(correlation, -1, 1)
+    np.fill_diagonal(correlation, np.where(std > 0, 1.0, np.nan))
+    # An asset that never changes has std 0, so its (NaN) correlations add nothing
+    covariance = np.nan_to_num(correlation, nan=0.0) * np.outer(std, std)
+    return {
+        'assets': list(assets),
+        'count': count,
+        'mean': np.diag(state['mean']).copy(),
+        'variance': variance,
+        'std': std,
+        'covariance': covariance,
+        'correlation': correlation
+    }
+
+
+# --- Sources ---
+
+def return_columns(columns):
+    # Return columns of a returns table and their plain asset names
+    return_cols = [col for col in columns if col != 'Date']
+    return return_cols, [col.replace('_Return', '') for col in return_cols]
+
+
+def moments_from_frame(returns_df, chunk_rows=CHUNK_ROWS):
+    """
+    Moments of an in-memory returns DataFrame (Date + <asset>_Return columns).
+    """
+    return_cols, assets = return_columns(returns_df.columns)
+    values = returns_df[return_cols].to_numpy(dtype=np.float64)
+    state = empty_moments(len(assets))
+    for start in range(0, len(values), chunk_rows):
+        state = update_moments(state, values[start:start + chunk_rows])
+    return finalize_moments(state, assets)
+
+
+def moments_from_csv(filepath=RETURNS_FILE, chunk_rows=CHUNK_ROWS):
+    """
+    Moments of a returns CSV in one streaming pass: CHUNK_ROWS rows are
+    parsed, folded in and dropped at a time, so the file never has to fit in memory.
+    """
+    state = None
+    assets = None
+    for chunk in pd.read_csv(filepath, chunksize=chunk_rows):
+        if state is None:
+            return_cols, assets = return_columns(chunk.columns)
+            state = empty_moments(len(assets))
+        state = update_moments(state, chunk[return_cols].to_numpy(dtype=np.float64))
+    return finalize_moments(state, assets)
+
+
+def _file_hash(path):
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+SAVED_STATISTICS = ('count', 'mean', 'variance', 'std', 'covariance', 'correlation')
+
+
+def save_moments(moments, path=MOMENTS_FILE, source_hash=""):
+    np.savez(path, source_hash=source_hash, assets=np.array(moments['assets']),
+             **{key: moments[key] for key in SAVED_STATISTICS})
+
+
+def load_return_moments(filepath=RETURNS_FILE, cache_path=MOMENTS_FILE):
+    """
+    Moments of the returns file, parsed at most once: the result is saved to
+    cache_path together with a hash of the returns file and reused while that
+    file is unchanged. Returns None if the returns file does not exist.
+    """
+    if not os.path.exists(filepath):
+        return None
+
+    source_hash = _file_hash(filepath)
+    if os.path.exists(cache_path):
+        cached = np.load(cache_path)
+        # Caches written before per-asset counts lack some statistics and are recomputed
+        if str(cached['source_hash']) == source_hash and all(key in cached.files for key in SAVED_STATISTICS):
+            moments = {key: cached[key] for key in SAVED_STATISTICS}
+            moments['assets'] = [str(asset) for asset in cached['assets']]
+            return moments
+
+    moments = moments_from_csv(filepath)
+    save_moments(moments, cache_path, source_hash)
+    return moments
+
+
+def optimizer_inputs(moments, assets):
+    """
+    (metrics_dict, cov_matrix) for portoflio_optimization_v1.py at full
+    precision, with the matrix in the order of `assets`. Annualized like
+    rolling_metrics.annualize_moments: (1 + mean)^periods - 1 for returns and
+    cov x sqrt(periods_i x periods_j) for the covariance.
+    """
+    order = [moments['assets'].index(asset) for asset in assets]
+    means = moments['mean'][order]
+    covariance = moments['covariance'][np.ix_(order, order)]
+
+    annual_returns, annual_volatilities, _, annual_covariances = annualize_moments(means[None], covariance[None], assets)
+    metrics_dict = {
+        asset: {'return': annual_returns[0, i], 'volatility': annual_volatilities[0, i]}
+        for i, asset in enumerate(assets)
+    }
+    return metrics_dict, annual_covariances[0]
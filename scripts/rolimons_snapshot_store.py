@@ -0,0 +1,248 @@
+import pandas as pd
+import numpy as np
+import glob
+import json
+import os
+import re
+from datetime import datetime, timezone
+
+# --- Configuration ---
+URL = "https://www.rolimons.com/itemapi/itemdetails"
+OUTPUT_DIR = "data"
+STORE_DIR = os.path.join(OUTPUT_DIR, "rolimons_store")
+RAW_DIR = os.path.join(OUTPUT_DIR, "rolimons_raw")  # Saved itemdetails JSON, one file per pull
+
+# Positions inside each item's list in the itemdetails response:
+# [name, acronym, rap, value, default_value, demand, trend, projected, hyped, rare]
+NAME_FIELD = 0
+RAP_FIELD = 2
+VALUE_FIELD = 3
+
+# Store layout (all files are append-only raw binary, readable with np.memmap):
+#   items.json    item ids and names, in column order
+#   timestamps    int64 seconds since 1970, one per snapshot
+#   offsets       int64 (start, width) of each snapshot's row in the value files
+#   rap, value    int32, one row of `width` values per snapshot (-1 = no value)
+# New items get the next column, so older (shorter) rows never have to be rewritten.
+FIELDS = {"rap": np.int32, "value": np.int32}
+
+
+def _path(store_dir, name):
+    return os.path.join(store_dir, name)
+
+
+def load_items(store_dir=STORE_DIR):
+    # (ids, names) in column order; empty lists for a new store
+    items_path = _path(store_dir, "items.json")
+    if not os.path.exists(items_path):
+        return [], []
+    with open(items_path) as f:
+        items = json.load(f)
+    return items["ids"], items["names"]
+
+
+def _read(store_dir, name, dtype, shape=None):
+    path = _path(store_dir, name)
+    if not os.path.exists(path) or os.path.getsize(path) == 0:
+        return np.zeros(0 if shape is None else (0,) + shape, dtype=dtype)
+    values = np.memmap(path, dtype=dtype, mode="r")
+    return values if shape is None else values.reshape((-1,) + shape)
+
+
+def parse_itemdetails(data):
+    """
+    Turns an itemdetails response into (ids, names, rap, value) with the
+    numbers as int32 arrays. Missing values stay -1, as Rolimons sends them.
+    """
+    items = data["items"]
+    ids = list(items.keys())
+    names = [items[item_id][NAME_FIELD] for item_id in ids]
+    rap = np.array([items[item_id][RAP_FIELD] for item_id in ids], dtype=np.int64)
+    value = np.array([items[item_id][VALUE_FIELD] for item_id in ids], dtype=np.int64)
+    return ids, names, rap.astype(np.int32), value.astype(np.int32)
+
+
+def append_snapshot(data, timestamp, store_dir=STORE_DIR):
+    """
+    Adds one catalog pull to the store. Only this snapshot's row is written
+    (plus items.json when new items appeared), so appends stay cheap however
+    long the history gets. timestamp: datetime or anything pandas can parse.
+    """
+    os.makedirs(store_dir, exist_ok=True)
+    ids, names = load_items(store_dir)
+    column_of = {item_id: i for i, item_id in enumerate(ids)}
+
+    snapshot_ids, snapshot_names, rap, value = parse_itemdetails(data)
+
+    # Give items we have never seen the next free columns
+    new_items = [(item_id, name) for item_id, name in zip(snapshot_ids, snapshot_names) if item_id not in column_of]
+    if new_items:
+        for item_id, name in new_items:
+            column_of[item_id] = len(ids)
+            ids.append(item_id)
+            names.append(name)
+        with open(_path(store_dir, "items.json"), "w") as f:
+            json.dump({"ids": ids, "names": names}, f)
+
+    # Scatter this snapshot's values into a full-width row (-1 for items not in this pull)
+    columns = np.array([column_of[item_id] for item_id in snapshot_ids], dtype=np.int64)
+    width = len(ids)
+    rows = {}
+    for field, values in (("rap", rap), ("value", value)):
+        row = np.full(width, -1, dtype=FIELDS[field])
+        row[columns] = values
+        rows[field] = row
+
+    start = os.path.getsize(_path(store_dir, "rap")) // 4 if os.path.exists(_path(store_dir, "rap")) else 0
+    for field, row in rows.items():
+        with open(_path(store_dir, field), "ab") as f:
+            f.write(row.tobytes())
+    with open(_path(store_dir, "offsets"), "ab") as f:
+        f.write(np.array([start, width], dtype=np.int64).tobytes())
+
+    seconds = int(pd.Timestamp(timestamp).timestamp())
+    with open(_path(store_dir, "timestamps"), "ab") as f:
+        f.write(np.array([seconds], dtype=np.int64).tobytes())
+
+
+def load_timestamps(store_dir=STORE_DIR):
+    return pd.to_datetime(_read(store_dir, "timestamps", np.int64), unit="s")
+
+
+def load_item_history(item_id, store_dir=STORE_DIR):
+    """
+    Full history of one item: DataFrame with Date, RAP and Value, one row per
+    snapshot taken since the item was first seen. Gathers one value per
+    snapshot straight from the memory-mapped files. RAP and Value are NaN
+    where a snapshot has no value for the item (-1 in the store).
+    """
+    ids, _ = load_items(store_dir)
+    if str(item_id) not in ids:
+        raise ValueError(f"Item {item_id} is not in the snapshot store")
+    column = ids.index(str(item_id))
+
+    offsets = _read(store_dir, "offsets", np.int64, (2,))
+    present = offsets[:, 1] > column
+    positions = offsets[present, 0] + column
+
+    history = pd.DataFrame({
+        "Date": load_timestamps(store_dir)[present],
+        "RAP": _read(store_dir, "rap", np.int32)[positions],
+        "Value": _read(store_dir, "value", np.int32)[positions]
+    })
+    # -1 means "no value" in the Rolimons data (or the item was missing from that pull)
+    for field in ("RAP", "Value"):
+        history[field] = history[field].where(history[field] >= 0)
+    return history
+
+
+def load_snapshot(date, store_dir=STORE_DIR):
+    """
+    All items as of the last snapshot taken on or before `date`:
+    DataFrame with Item_ID, Name, RAP and Value (one contiguous row read).
+    """
+    timestamps = load_timestamps(store_dir)
+    position = timestamps.searchsorted(pd.Timestamp(date), side="right") - 1
+    if position < 0:
+        raise ValueError(f"No snapshot on or before {date}")
+
+    ids, names = load_items(store_dir)
+    start, width = _read(store_dir, "offsets", np.int64, (2,))[position]
+
+    snapshot = pd.DataFrame({
+        "Item_ID": ids[:width],
+        "Name": names[:width],
+        "RAP": np.asarray(_read(store_dir, "rap", np.int32)[start:start + width]),
+        "Value": np.asarray(_read(store_dir, "value", np.int32)[start:start + width])
+    })
+    snapshot.attrs["snapshot_time"] = timestamps[position]
+    # Items added after this snapshot are not in it; items missing from this pull are -1
+    return snapshot[snapshot["RAP"] >= 0].reset_index(drop=True)
+
+
+def timestamp_from_filename(filepath):
+    # itemdetails_2026-01-19.json or itemdetails_2026-01-19T120000.json -> that date/time, else file time
+    match = re.search(r"(\d{4}-\d{2}-\d{2}(T\d{6})?)", os.path.basename(filepath))
+    if match:
+        return pd.Timestamp(datetime.strptime(match.group(1), "%Y-%m-%dT%H%M%S" if match.group(2) else "%Y-%m-%d"))
+    return pd.Timestamp(os.path.getmtime(filepath), unit="s")
+
+
+def import_json_snapshots(pattern=os.path.join(RAW_DIR, "*.json"), store_dir=STORE_DIR):
+    """
+    Builds or extends the store from saved itemdetails JSON files (works
+    offline). Files are added in time order; ones older than the newest
+    snapshot already stored are skipped. Returns how many were added.
+    """
+    timestamps = load_timestamps(store_dir)
+    latest = timestamps.max() if len(timestamps) else None
+
+    added = 0
+    for filepath in sorted(glob.glob(pattern), key=timestamp_from_filename):
+        timestamp = timestamp_from_filename(filepath)
+        if latest is not None and timestamp <= latest:
+            continue
+        with open(filepath) as f:
+            append_snapshot(json.load(f), timestamp, store_dir)
+        added += 1
+    return added
+
+
+def export_item_prices(item_id, item_name, store_dir=STORE_DIR):
+    """
+    Writes an item's stored RAP history as data/<item>_prices.csv (Date,RAP),
+    the format merge_datasets.py reads, so real history can replace the
+    simulated one from generate_Roblox_historical_prices.py.
+    """
+    # Snapshots without a RAP for the item are left out (merge_datasets forward-fills the gaps)
+    history = load_item_history(item_id, store_dir).dropna(subset=["RAP"])
+    history["Date"] = history["Date"].dt.normalize()
+    output_path = os.path.join(OUTPUT_DIR, f"{item_name.lower()}_prices.csv")
+    history[["Date", "RAP"]].drop_duplicates("Date", keep="last").to_csv(output_path, index=False)
+    return output_path
+
+
+def snapshot_catalog():
+    """
+    Pulls the live catalog once, keeps the raw JSON in RAW_DIR and appends it
+    to the store. Run it on a schedule (e.g. daily) to build price history.
+    """
+    import requests
+
+    print("=" * 70)
+    print("🗄️  ROLIMONS SNAPSHOT STORE")
+    print("=" * 70)
+
+    print(f"\n📥 Downloading catalog from {URL}...")
+    response = requests.get(URL)
+    if response.status_code != 200:
+        print(f"❌ ERROR: Rolimons answered with status code {response.status_code}")
+        return
+    data = response.json()
+
+    now = datetime.now(timezone.utc).replace(tzinfo=None)
+    os.makedirs(RAW_DIR, exist_ok=True)
+    raw_path = os.path.join(RAW_DIR, f"itemdetails_{now:%Y-%m-%dT%H%M%S}.json")
+    with open(raw_path, "w") as f:
+        json.dump(data, f)
+
+    append_snapshot(data, now)
+
+    ids, _ = load_items()
+    print(f"   ✅ {len(data['items'])} items saved (raw JSON: {raw_path})")
+    print(f"   📊 Store now has {len(load_timestamps())} snapshots of {len(ids)} items")
+    print(f"\n{'=' * 70}\n")
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Pull the Rolimons catalog into the snapshot store.")
+    parser.add_argument("--import-json", metavar="PATTERN", help="Load saved itemdetails JSON files instead of downloading (e.g. 'data/rolimons_raw/*.json')")
+    args = parser.parse_args()
+
+    if args.import_json:
+        added = import_json_snapshots(args.import_json)
+        print(f"✅ Imported {added} snapshot(s) into {STORE_DIR}")
+    else:
+        snapshot_catalog()
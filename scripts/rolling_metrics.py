@@ -0,0 +1,192 @@
+import pandas as pd
+import numpy as np
+import os
+from instrumentation import instrumented_stage, step, throughput
+
+# --- Configuration ---
+OUTPUT_DIR = "data"
+RISK_FREE_RATE = 0.04  # 4% annual risk-free rate (2026 US Treasury)
+TRADING_DAYS_YEAR = 252
+WEEKS_YEAR = 52
+ROLLING_WINDOWS = [63, 126, 252]  # ~3, 6 and 12 months of trading days
+RESYNC_INTERVAL = 1000  # Recompute the running sums from scratch every N steps to cancel float drift
+
+ROBLOX_ITEMS = ["Dominus_Empyreus", "Violet_Valkyrie", "Red_Valkyrie"]
+STOCK_TICKERS = ["RBLX", "VWCE_DE"]
+
+
+def annualization_factors(assets):
+    """
+    Periods per year for each asset, same convention as financial_metrics.py:
+    Roblox items are annualized with 52 weeks, stocks with 252 trading days.
+    """
+    return np.array([WEEKS_YEAR if asset in ROBLOX_ITEMS else TRADING_DAYS_YEAR for asset in assets], dtype=float)
+
+
+def rolling_moments(returns, window):
+    """
+    Mean vector and sample covariance matrix of every `window`-row window of
+    `returns` (T x n array), ending at rows window-1 ... T-1.
+
+    Instead of recomputing each window, the running sum and the running
+    cross-product matrix are updated as the window slides: add the row that
+    enters, subtract the row that leaves. That is O(n^2) work per date,
+    whatever the window length. Returns are centered first and the sums are
+    rebuilt every RESYNC_INTERVAL steps, so rounding errors cannot pile up.
+    """
+    n_rows, n_assets = returns.shape
+    n_windows = n_rows - window + 1
+    if n_windows <= 0:
+        return np.zeros((0, n_assets)), np.zeros((0, n_assets, n_assets))
+
+    shift = returns.mean(axis=0)
+    x = returns - shift
+
+    means = np.empty((n_windows, n_assets))
+    covariances = np.empty((n_windows, n_assets, n_assets))
+
+    for t in range(n_windows):
+        if t % RESYNC_INTERVAL == 0:
+            block = x[t:t + window]
+            running_sum = block.sum(axis=0)
+            running_cross = block.T @ block
+        else:
+            leaving = x[t - 1]
+            entering = x[t + window - 1]
+            running_sum += entering - leaving
+            running_cross += np.outer(entering, entering) - np.outer(leaving, leaving)
+
+        window_mean = running_sum / window
+        means[t] = window_mean + shift
+        covariances[t] = (running_cross - window * np.outer(window_mean, window_mean)) / (window - 1)
+
+    return means, covariances
+
+
+def annualize_moments(means, covariances, assets):
+    """
+    Turns per-period moments into annual metrics:
+    - Annual return: (1 + mean)^periods - 1
+    - Annual volatility: std * sqrt(periods)
+    - Annual covariance: correlation x annual vol_i x annual vol_j
+      (the same construction as build_covariance_matrix in the optimizer)
+    - Sharpe ratio: (annual return - risk free) / annual volatility
+    """
+    periods = annualization_factors(assets)
+    annual_returns = (1 + means) ** periods - 1
+    annual_volatilities = np.sqrt(np.maximum(np.diagonal(covariances, axis1=1, axis2=2), 0) * periods)
+    annual_covariances = covariances * np.sqrt(np.outer(periods, periods))
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        sharpe_ratios = np.where(annual_volatilities > 0, (annual_returns - RISK_FREE_RATE) / annual_volatilities, 0)
+
+    return annual_returns, annual_volatilities, sharpe_ratios, annual_covariances
+
+
+def rolling_output_paths(window):
+    return (os.path.join(OUTPUT_DIR, f"rolling_metrics_{window}d.csv"),
+            os.path.join(OUTPUT_DIR, f"rolling_covariance_{window}d.npz"))
+
+
+def load_rolling_covariance(window):
+    """
+    Loads the dated covariance series written by calculate_rolling_metrics.
+    Returns (dates, assets, annual_returns, annual_covariances) where the
+    arrays are indexed [date, asset] and [date, asset, asset].
+    """
+    _, npz_path = rolling_output_paths(window)
+    data = np.load(npz_path)
+    return pd.to_datetime(data['dates']), list(data['assets']), data['annual_returns'], data['annual_covariances']
+
+
+def optimizer_inputs_for_date(date, window):
+    """
+    (metrics_dict, cov_matrix) for one date, in the format used by
+    portoflio_optimization_v1.py, so the optimizer can be run per date.
+    Uses the last window ending on or before `date`.
+    """
+    dates, assets, annual_returns, annual_covariances = load_rolling_covariance(window)
+    position = dates.searchsorted(pd.Timestamp(date), side='right') - 1
+    if position < 0:
+        raise ValueError(f"No {window}-day window ends on or before {date}")
+
+    cov_matrix = annual_covariances[position]
+    metrics_dict = {
+        asset: {'return': annual_returns[position, i], 'volatility': np.sqrt(cov_matrix[i, i])}
+        for i, asset in enumerate(assets)
+    }
+    return metrics_dict, cov_matrix
+
+
+@instrumented_stage("rolling_metrics")
+def calculate_rolling_metrics():
+    """
+    Rolling annual return, volatility, Sharpe ratio and covariance matrix
+    for every date and every window in ROLLING_WINDOWS.
+    Returns {window: (csv path, npz path)} of the files written, or None
+    without returns_calculated.csv.
+    """
+    print("=" * 70)
+    print("📆 ROLLING METRICS CALCULATOR")
+    print("=" * 70)
+
+    # Load returns data
+    filepath = os.path.join(OUTPUT_DIR, "returns_calculated.csv")
+    if not os.path.exists(filepath):
+        print(f"❌ ERROR: {filepath} not found!")
+        print("   Please run calculate_returns.py first.")
+        return
+
+    step("load_csv")
+    print(f"\n📥 Loading returns from {filepath}...")
+    returns_df = pd.read_csv(filepath, parse_dates=['Date'])
+
+    return_cols = [col for col in returns_df.columns if col != 'Date']
+    assets = [col.replace('_Return', '') for col in return_cols]
+    returns = returns_df[return_cols].to_numpy(dtype=float)
+    dates = returns_df['Date'].to_numpy()
+
+    written = {}
+    for window in ROLLING_WINDOWS:
+        if len(returns) < window:
+            print(f"\n⚠️  {window}-day window: only {len(returns)} rows of data. Skipping.")
+            continue
+
+        step(f"window_{window}d")
+        throughput(returns.size, "values")
+        print(f"\n🧮 {window}-day window...")
+        means, covariances = rolling_moments(returns, window)
+        annual_returns, annual_volatilities, sharpe_ratios, annual_covariances = annualize_moments(means, covariances, assets)
+        window_dates = dates[window - 1:]
+
+        # Long format: one row per (date, asset)
+        metrics_df = pd.DataFrame({
+            'Date': np.repeat(window_dates, len(assets)),
+            'Asset': np.tile(assets, len(window_dates)),
+            'Annual_Return_%': (annual_returns * 100).ravel(),
+            'Annual_Volatility_%': (annual_volatilities * 100).ravel(),
+            'Sharpe_Ratio': sharpe_ratios.ravel()
+        })
+
+        csv_path, npz_path = rolling_output_paths(window)
+        metrics_df.to_csv(csv_path, index=False)
+        np.savez(npz_path,
+                 dates=window_dates.astype('datetime64[D]').astype(str),
+                 assets=np.array(assets),
+                 annual_returns=annual_returns,
+                 annual_covariances=annual_covariances)
+
+        print(f"   ✅ {len(window_dates)} dates ({pd.Timestamp(window_dates[0]).date()} to {pd.Timestamp(window_dates[-1]).date()})")
+        print(f"   📄 Metrics: {csv_path}")
+        print(f"   📄 Covariance matrices: {npz_path}")
+        written[window] = (csv_path, npz_path)
+        print(f"   📊 Latest window:")
+        for i, asset in enumerate(assets):
+            print(f"      {asset:20s} Return: {annual_returns[-1, i]*100:7.2f}% | Volatility: {annual_volatilities[-1, i]*100:6.2f}% | Sharpe: {sharpe_ratios[-1, i]:.3f}")
+
+    print(f"\n{'=' * 70}\n")
+    return written
+
+
+if __name__ == "__main__":
+    calculate_rolling_metrics()
@@ -0,0 +1,283 @@
+import argparse
+import ast
+import hashlib
+import json
+import os
+import subprocess
+import sys
+
+# --- Configuration ---
+SCRIPTS_DIR = os.path.dirname(os.path.abspath(__file__))
+PROJECT_ROOT = os.path.dirname(SCRIPTS_DIR)
+OUTPUT_DIR = "data"
+STATE_FILE = os.path.join(OUTPUT_DIR, ".pipeline_state.json")
+
+# The pipeline, in run order. For each stage:
+# - script:       the file that runs it (paths relative to scripts/)
+# - config_files: files whose UPPER_CASE constants count as its configuration
+# - inputs:       files in data/ it reads
+# - outputs:      files in data/ it always writes
+# - optional_outputs: files in data/ it writes only with some configs or enough data
+#                  (e.g. plots, blocked-mode matrices, long rolling windows)
+STAGES = [
+    {
+        "name": "fetch_stock_data",
+        "script": "fetch_stock_data.py",
+        "config_files": ["fetch_stock_data.py"],
+        "inputs": [],
+        "outputs": ["rblx_prices.csv", "vwce_de_prices.csv"]
+    },
+    {
+        "name": "merge_datasets",
+        "script": "merge_datasets.py",
+        "config_files": ["merge_datasets.py", "price_store.py"],
+        "inputs": ["rblx_prices.csv", "vwce_de_prices.csv", "dominus_empyreus_prices.csv",
+                   "violet_valkyrie_prices.csv", "red_valkyrie_prices.csv"],
+        "outputs": ["merged_master.csv", "price_store/manifest.json"]
+    },
+    {
+        "name": "calculate_returns",
+        "script": "calculate_returns.py",
+        "config_files": ["calculate_returns.py", "merge_datasets.py", "price_store.py"],
+        "inputs": ["merged_master.csv", "price_store/manifest.json"],
+        "outputs": ["returns_calculated.csv"]
+    },
+    {
+        "name": "financial_metrics",
+        "script": "financial_metrics.py",
+        "config_files": ["financial_metrics.py", "return_moments.py"],
+        "inputs": ["returns_calculated.csv"],
+        "outputs": ["financial_metrics.csv"]
+    },
+    {
+        "name": "correlation_analysis",
+        "script": "correlation_analysis.py",
+        "config_files": ["correlation_analysis.py", "blocked_correlation.py", "correlation_heatmap.py", "return_moments.py"],
+        "inputs": ["returns_calculated.csv"],
+        "outputs": [],
+        # CSV for small universes, .npy + asset list in blocked mode; heatmap only with PLOT_HEATMAP
+        "optional_outputs": ["correlation_matrix.csv", "correlation_matrix.npy", "correlation_matrix_assets.json",
+                             "correlation_top_pairs.csv", "correlation_heatmap.png"]
+    },
+    {
+        "name": "rolling_metrics",
+        "script": "rolling_metrics.py",
+        "config_files": ["rolling_metrics.py"],
+        "inputs": ["returns_calculated.csv"],
+        "outputs": [],
+        # A window longer than the return history is skipped
+        "optional_outputs": ["rolling_metrics_63d.csv", "rolling_covariance_63d.npz",
+                             "rolling_metrics_126d.csv", "rolling_covariance_126d.npz",
+                             "rolling_metrics_252d.csv", "rolling_covariance_252d.npz"]
+    },
+    {
+        "name": "portfolio_optimization",
+        "script": "portoflio_optimization_v1.py",
+        "config_files": ["portoflio_optimization_v1.py", "portfolio_metrics.py", "efficient_frontier_solver.py",
+                         "portfolio_sampler.py", "frontier_store.py", "return_moments.py", "portfolio_constraints.py",
+                         "scenario_risk.py", "resampled_frontier.py"],
+        "inputs": ["returns_calculated.csv", "financial_metrics.csv", "correlation_matrix.csv"],
+        "outputs": ["optimal_portfolios.csv"],
+        # Plot only with PLOT_RESULTS; the rest depend on FRONTIER_OUTPUT_FORMATS and OPTIMIZATION_MODE
+        "optional_outputs": ["efficient_frontier_plot.png", "efficient_frontier.csv", "efficient_frontier.parquet",
+                             "resampled_weights.csv", "top_sharpe_portfolios.csv"]
+    },
+    {
+        "name": "stress_testing",
+        "script": "stress_testing.py",
+        "config_files": ["stress_testing.py", "portfolio_metrics.py", "return_moments.py", "portoflio_optimization_v1.py"],
+        "inputs": ["optimal_portfolios.csv", "returns_calculated.csv", "financial_metrics.csv", "correlation_matrix.csv"],
+        "outputs": ["stress_test_results.csv"]
+    }
+]
+
+
+def file_hash(path):
+    """
+    SHA-256 of a file's content, read in 1 MB blocks. None if it does not exist.
+    """
+    if not os.path.exists(path):
+        return None
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def config_constants(script_path):
+    """
+    The module-level UPPER_CASE assignments of a script, as source text,
+    e.g. {"RISK_FREE_RATE": "0.04"}. Comments and function bodies are
+    ignored, so editing them does not make a stage rerun.
+    """
+    with open(script_path) as f:
+        tree = ast.parse(f.read())
+
+    constants = {}
+    for node in tree.body:
+        if isinstance(node, ast.Assign):
+            for target in node.targets:
+                if isinstance(target, ast.Name) and target.id.isupper():
+                    constants[target.id] = ast.unparse(node.value)
+    return constants
+
+
+def stage_fingerprint(stage):
+    """
+    One hash over everything a stage depends on: the content of its input
+    files and the config constants of its scripts.
+    """
+    parts = {
+        "inputs": {name: file_hash(os.path.join(OUTPUT_DIR, name)) for name in stage["inputs"]},
+        "config": {name: config_constants(os.path.join(SCRIPTS_DIR, name)) for name in stage["config_files"]}
+    }
+    return hashlib.sha256(json.dumps(parts, sort_keys=True).encode()).hexdigest()
+
+
+def load_state():
+    if not os.path.exists(STATE_FILE):
+        return {}
+    with open(STATE_FILE) as f:
+        return json.load(f)
+
+
+def save_state(state):
+    with open(STATE_FILE, "w") as f:
+        json.dump(state, f, indent=2, sort_keys=True)
+
+
+def stage_outputs(stage):
+    return stage["outputs"] + stage.get("optional_outputs", [])
+
+
+def is_up_to_date(stage, state):
+    # Same fingerprint as last run, and the outputs are still exactly what it wrote
+    previous = state.get(stage["name"])
+    if previous is None or previous["fingerprint"] != stage_fingerprint(stage):
+        return False
+    return all(file_hash(os.path.join(OUTPUT_DIR, name)) == digest for name, digest in previous["outputs"].items())
+
+
+def run_stage(stage):
+    # Optional outputs left by an earlier run (e.g. a plot from before PLOT_RESULTS was turned off)
+    # would otherwise look like fresh results of this run
+    for name in stage.get("optional_outputs", []):
+        path = os.path.join(OUTPUT_DIR, name)
+        if os.path.exists(path):
+            os.remove(path)
+
+    # Each stage runs as its own process from the project root (scripts use data/ as a relative path).
+    # The Agg backend keeps matplotlib from opening windows during unattended runs.
+    env = dict(os.environ, MPLBACKEND="Agg")
+    completed = subprocess.run([sys.executable, os.path.join(SCRIPTS_DIR, stage["script"])], cwd=PROJECT_ROOT, env=env)
+    missing = [name for name in stage["outputs"] if not os.path.exists(os.path.join(OUTPUT_DIR, name))]
+    return completed.returncode == 0 and not missing
+
+
+def run_pipeline(only=None, force=False):
+    """
+    Runs the stages in order, skipping every stage whose inputs and config
+    constants have not changed since its last successful run.
+    - only: optional list of stage names to consider (the others are left alone)
+    - force: rerun the selected stages even if they look up to date
+    """
+    os.chdir(PROJECT_ROOT)
+
+    print("=" * 70)
+    print("🚦 PIPELINE RUNNER - Incremental Rebuild")
+    print("=" * 70)
+
+    state = load_state()
+
+    for stage in STAGES:
+        name = stage["name"]
+        if only and name not in only:
+            continue
+
+        if not force and is_up_to_date(stage, state):
+            print(f"\n⏭️  {name}: up to date, skipping")
+            continue
+
+        print(f"\n▶️  {name}: running {stage['script']}...")
+        # The fingerprint is taken before running, so it describes the inputs the stage actually used
+        fingerprint = stage_fingerprint(stage)
+
+        if not run_stage(stage):
+            print(f"\n❌ ERROR: {name} failed. Stopping here; later stages were not run.")
+            state.pop(name, None)
+            save_state(state)
+            return False
+
+        state[name] = {
+            "fingerprint": fingerprint,
+            "outputs": {output: file_hash(os.path.join(OUTPUT_DIR, output)) for output in stage_outputs(stage)}
+        }
+        save_state(state)
+        print(f"✅ {name}: done")
+
+    print(f"\n{'=' * 70}")
+    print("✅ PIPELINE COMPLETE")
+    print(f"{'=' * 70}\n")
+    return True
+
+
+def run_in_memory(write_csv=False, plot=True):
+    """
+    Runs merge -> returns -> metrics + correlation -> optimizer -> stress tests in this
+    process, passing DataFrames from stage to stage instead of writing and
+    re-parsing CSVs. The returns are scanned once (return_moments.py) and the
+    means, variances and covariance matrix are shared by metrics, correlation
+    and the optimizer at full precision (no 2-decimal rounding).
+    write_csv=True also writes the intermediate CSVs, as the scripts do.
+    The optimizer's own result files are always written.
+    plot=False skips the heatmap and the frontier plot (matplotlib is never imported).
+    """
+    os.chdir(PROJECT_ROOT)
+    os.environ.setdefault("MPLBACKEND", "Agg")
+
+    import merge_datasets
+    import calculate_returns
+    import financial_metrics
+    import correlation_analysis
+    import portoflio_optimization_v1
+    import return_moments
+    import stress_testing
+
+    if not plot:
+        correlation_analysis.PLOT_HEATMAP = False
+        portoflio_optimization_v1.configure(plot=False)
+
+    master_df = merge_datasets.merge_datasets(save_csv=write_csv)
+    if master_df is None:
+        return False
+
+    returns_df = calculate_returns.calculate_returns(master_df, save_csv=write_csv)
+    moments = return_moments.moments_from_frame(returns_df)
+    financial_metrics.calculate_financial_metrics(returns_df, save_csv=write_csv, round_values=False, moments=moments)
+    correlation_analysis.analyze_correlations(returns_df, save_csv=write_csv, moments=moments)
+
+    if portoflio_optimization_v1.main(moments=moments, returns_df=returns_df) is None:
+        return False
+    return stress_testing.run_stress_tests(moments=moments) is not None
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run the analysis pipeline, skipping stages whose inputs have not changed.")
+    parser.add_argument("--only", nargs="+", choices=[stage["name"] for stage in STAGES], help="Only consider these stages")
+    parser.add_argument("--force", action="store_true", help="Rerun stages even if they are up to date")
+    parser.add_argument("--in-memory", action="store_true", help="Chain the stages in one process without CSV round-trips")
+    parser.add_argument("--write-csv", action="store_true", help="With --in-memory, still write the intermediate CSVs")
+    parser.add_argument("--no-plot", action="store_true", help="With --in-memory, skip the heatmap and frontier plot")
+    parser.add_argument("--quiet", action="store_true", help="Only print one timing line per stage (timings still go to data/stage_metrics.jsonl)")
+    args = parser.parse_args()
+
+    if args.quiet:
+        # Read by instrumentation.py, in this process and in the stage processes it starts
+        os.environ["PIPELINE_VERBOSITY"] = "quiet"
+
+    if args.in_memory:
+        success = run_in_memory(write_csv=args.write_csv, plot=not args.no_plot)
+    else:
+        success = run_pipeline(only=args.only, force=args.force)
+    sys.exit(0 if success else 1)
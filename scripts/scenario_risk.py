@@ -0,0 +1,191 @@
+import pandas as pd
+import numpy as np
+import os
+
+import efficient_frontier_solver as frontier_solver
+from portfolio_constraints import constraint_rows, hit_and_run
+
+# --- Configuration ---
+OUTPUT_DIR = "data"
+RETURNS_FILE = os.path.join(OUTPUT_DIR, "returns_calculated.csv")
+CVAR_ALPHA = 0.95               # CVaR = average loss over the worst (1 - alpha) of the scenarios
+SEARCH_CANDIDATES = 5000        # Candidate portfolios evaluated per search round (one vectorized batch)
+SEARCH_ROUNDS = 40              # Rounds of the shrinking search around the best candidate
+SEARCH_SHRINK = 0.75            # Each round draws candidates this much closer to the best one
+SEARCH_SEED = 42
+EVALUATION_BLOCK = 5000000      # Candidates x scenarios evaluated at once (caps peak memory)
+ERC_MAX_ITERATIONS = 100        # Newton steps for the equal-risk-contribution portfolio
+ERC_TOLERANCE = 1e-12
+
+
+def load_scenarios(assets, returns_df=None, filepath=RETURNS_FILE):
+    """
+    The historical scenario matrix (T scenarios x n assets, columns in the
+    order of `assets`): every row of returns_calculated.csv is one joint
+    outcome of all assets. Pass returns_df to use in-memory returns.
+    """
+    if returns_df is None:
+        returns_df = pd.read_csv(filepath)
+    scenarios = returns_df[[f"{asset}_Return" for asset in assets]].to_numpy(dtype=np.float64)
+    return scenarios[~np.isnan(scenarios).any(axis=1)]
+
+
+def portfolio_cvar(weights_block, scenarios, alpha=CVAR_ALPHA):
+    """
+    Historical CVaR of every portfolio (row of weights_block): the mean loss
+    over its worst ceil((1 - alpha) T) scenarios, as a positive fraction.
+    All candidates x scenarios are evaluated as matrix products, in blocks of
+    at most EVALUATION_BLOCK values.
+    """
+    weights_block = np.atleast_2d(weights_block)
+    n_scenarios = len(scenarios)
+    n_tail = max(1, int(np.ceil((1 - alpha) * n_scenarios)))
+    rows_per_block = max(1, EVALUATION_BLOCK // n_scenarios)
+
+    cvar = np.empty(len(weights_block))
+    for start in range(0, len(weights_block), rows_per_block):
+        losses = -(weights_block[start:start + rows_per_block] @ scenarios.T)
+        # The n_tail largest losses of each row, in no particular order
+        tail = np.partition(losses, n_scenarios - n_tail, axis=1)[:, n_scenarios - n_tail:]
+        cvar[start:start + rows_per_block] = tail.mean(axis=1)
+    return cvar
+
+
+def risk_contributions(weights_block, cov_matrix):
+    """
+    Share of portfolio variance contributed by each asset, w_i (Cov w)_i / w^T Cov w,
+    for every row of weights_block (rows sum to 1).
+    """
+    weights_block = np.atleast_2d(weights_block)
+    marginal = weights_block @ cov_matrix
+    contributions = weights_block * marginal
+    return contributions / np.sum(contributions, axis=1, keepdims=True)
+
+
+def risk_parity_gap(weights_block, cov_matrix):
+    # How far each portfolio is from equal risk contributions (sum of squared deviations from 1/n)
+    shares = risk_contributions(weights_block, cov_matrix)
+    return np.sum((shares - 1.0 / shares.shape[1]) ** 2, axis=1)
+
+
+def _draw_candidates(rng, n_candidates, n_assets, constraints, chains):
+    # Random portfolios spread over the feasible region (uniform on the simplex without constraints)
+    if constraints is not None:
+        return hit_and_run(rng, constraints, n_candidates, chains)
+    return rng.dirichlet(np.ones(n_assets), n_candidates), chains
+
+
+def candidate_search(objective, n_assets, constraints=None, seed=SEARCH_SEED,
+                     n_candidates=SEARCH_CANDIDATES, rounds=SEARCH_ROUNDS, initial=None):
+    """
+    Minimizes objective(weights_block) -> one value per row over the feasible
+    portfolios: evaluates a batch of random candidates, then repeatedly draws
+    new ones between the best so far and fresh random portfolios, each round
+    SEARCH_SHRINK times closer. Candidates are convex combinations of feasible
+    portfolios, so they always satisfy the constraints.
+    initial: optional feasible portfolios (rows) to include in the first batch.
+    Returns (best weights, best value).
+    """
+    rng = np.random.default_rng(seed)
+    candidates, chains = _draw_candidates(rng, n_candidates, n_assets, constraints, None)
+    if constraints is None:
+        # Single-asset and equal-weight portfolios are natural candidates too
+        candidates = np.vstack([candidates, np.eye(n_assets), np.full(n_assets, 1.0 / n_assets)])
+    if initial is not None:
+        candidates = np.vstack([candidates, initial])
+
+    values = objective(candidates)
+    best = candidates[np.argmin(values)]
+    best_value = np.min(values)
+
+    radius = 1.0
+    for _ in range(rounds):
+        radius *= SEARCH_SHRINK
+        fresh, chains = _draw_candidates(rng, n_candidates, n_assets, constraints, chains)
+        candidates = best + radius * (fresh - best)
+        values = objective(candidates)
+        if np.min(values) < best_value:
+            best = candidates[np.argmin(values)]
+            best_value = np.min(values)
+
+    return best, best_value
+
+
+def min_cvar_weights(scenarios, constraints=None, alpha=CVAR_ALPHA):
+    """
+    Portfolio with the lowest historical CVaR over the scenario matrix, solved
+    exactly as the Rockafellar-Uryasev linear program (scipy.optimize.linprog):
+        minimize  zeta + 1/k sum(u_t)
+        subject to u_t >= -r_t w - zeta,  u_t >= 0,  sum(w) = 1,  constraint rows
+    with k = ceil((1 - alpha) T), so the objective at the optimum is exactly
+    the mean of the k worst losses (portfolio_cvar).
+    Returns (weights, CVaR). Raises ImportError without scipy and
+    ValueError if the solver fails.
+    """
+    from scipy import sparse
+    from scipy.optimize import linprog
+
+    n_scenarios, n_assets = scenarios.shape
+    n_tail = max(1, int(np.ceil((1 - alpha) * n_scenarios)))
+
+    # Variables: [w (n_assets), zeta, u (n_scenarios)]
+    cost = np.concatenate([np.zeros(n_assets), [1.0], np.full(n_scenarios, 1.0 / n_tail)])
+    # Loss of every scenario minus zeta, at most u_t:  -r_t w - zeta - u_t <= 0
+    tail_rows = sparse.hstack([sparse.csr_matrix(-scenarios), -np.ones((n_scenarios, 1)), -sparse.identity(n_scenarios)])
+    A_ub, b_ub = [tail_rows], [np.zeros(n_scenarios)]
+    weight_bounds = [(0.0, 1.0)] * n_assets
+
+    if constraints is not None:
+        weight_bounds = list(zip(constraints['lower'], constraints['upper']))
+        if len(constraints['group_names']):
+            # lower <= G w <= upper as two one-sided rows per group
+            groups = np.hstack([constraints['groups'], np.zeros((len(constraints['group_names']), 1 + n_scenarios))])
+            A_ub += [sparse.csr_matrix(groups), sparse.csr_matrix(-groups)]
+            b_ub += [constraints['group_upper'], -constraints['group_lower']]
+
+    budget = np.concatenate([np.ones(n_assets), np.zeros(1 + n_scenarios)])[None, :]
+    result = linprog(cost, A_ub=sparse.vstack(A_ub).tocsr(), b_ub=np.concatenate(b_ub), A_eq=budget, b_eq=[1.0],
+                     bounds=weight_bounds + [(None, None)] + [(0.0, None)] * n_scenarios, method="highs")
+    if not result.success:
+        raise ValueError(f"Minimum CVaR linear program failed: {result.message}")
+
+    # The solver keeps the variable bounds, so the weights need no clean-up
+    weights = result.x[:n_assets]
+    return weights, portfolio_cvar(weights, scenarios, alpha)[0]
+
+
+def equal_risk_contribution_weights(cov_matrix, constraints=None):
+    """
+    Risk parity portfolio: every asset contributes the same share of variance.
+    Without constraints it is exact: Newton's method on
+        minimize 1/2 y^T Cov y - (1/n) sum(log y_i),   w = y / sum(y)
+    whose optimum has y_i (Cov y)_i = 1/n for every asset.
+    With constraints, exact parity is usually not allowed. A feasible
+    portfolio close to it (small risk_parity_gap) is then searched for with
+    candidate_search, starting from the unconstrained answer projected onto
+    the constraints. That is a heuristic, not a proven optimum: check
+    risk_contributions of the result to see how far it is from parity.
+    """
+    n_assets = cov_matrix.shape[0]
+    if constraints is not None:
+        unconstrained = equal_risk_contribution_weights(cov_matrix)
+        A, lower, upper = constraint_rows(constraints)
+        projected = frontier_solver.solve_qp(np.eye(n_assets), -unconstrained, A, lower, upper)
+        weights, _ = candidate_search(lambda weights_block: risk_parity_gap(weights_block, cov_matrix), n_assets,
+                                      constraints, initial=projected[None, :])
+        return weights
+
+    budget = np.full(n_assets, 1.0 / n_assets)
+    y = budget / np.sqrt(np.diag(cov_matrix))
+    for _ in range(ERC_MAX_ITERATIONS):
+        gradient = cov_matrix @ y - budget / y
+        hessian = cov_matrix + np.diag(budget / y ** 2)
+        newton_step = np.linalg.solve(hessian, gradient)
+        # Halve the step until y stays positive
+        step_size = 1.0
+        while np.any(y - step_size * newton_step <= 0):
+            step_size /= 2
+        y = y - step_size * newton_step
+        if np.max(np.abs(gradient)) < ERC_TOLERANCE:
+            break
+    return y / np.sum(y)
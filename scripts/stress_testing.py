@@ -0,0 +1,307 @@
+import pandas as pd
+import numpy as np
+import os
+
+import portoflio_optimization_v1 as optimizer
+from return_moments import load_return_moments, optimizer_inputs
+from instrumentation import instrumented_stage, step, throughput
+
+# --- Configuration ---
+OUTPUT_DIR = "data"
+PORTFOLIOS_FILE = os.path.join(OUTPUT_DIR, "optimal_portfolios.csv")
+RESULTS_FILE = os.path.join(OUTPUT_DIR, "stress_test_results.csv")
+WORST_CASES = 5                # Worst scenarios reported per portfolio
+LOSS_Z = 1.645                 # Stressed 1-year loss at 95% confidence: -(return - 1.645 x volatility)
+EVALUATION_BLOCK = 5000000     # Covariance values (scenarios x n x n) built at once (caps peak memory)
+
+# Generated scenarios, drawn on top of the named ones (0 = named only)
+GENERATED_SCENARIOS = 10000
+STRESS_SEED = 42
+ASSET_SHOCK_PROBABILITY = 0.2  # Chance that a generated scenario hits each single asset...
+MAX_ASSET_SHOCK = 0.60         # ...with a one-off loss of up to 60%
+ROBLOX_CRASH_PROBABILITY = 0.5 # Chance of a crash hitting all Roblox items together...
+MAX_ROBLOX_CRASH = 0.70        # ...of up to 70%
+MAX_VOLATILITY_SCALE = 2.5     # Volatilities are multiplied by a factor drawn in [1, this]
+CORRELATION_SPIKE = (0.5, 0.95)  # Correlations are pulled toward a target drawn in this range
+
+# Named scenarios. Every key is optional:
+# - shocks:             {asset: one-off return}, e.g. {"RBLX": -0.40} = RBLX loses 40% now
+# - volatility_scale:   multiplier for every volatility, or {asset: multiplier}
+# - correlation:        (target, weight) = every correlation moves `weight` of the way to `target`
+# - correlation_assets: only spike the correlations between these assets (default: all)
+# The Roblox items are the optimizer's, so both scripts always cover the same assets
+STRESS_SCENARIOS = {
+    "RBLX drawdown -40%": {"shocks": {"RBLX": -0.40}},
+    "Roblox economy crash": {"shocks": {item: -0.50 for item in optimizer.ROBLOX_ITEMS},
+                             "volatility_scale": {item: 2.0 for item in optimizer.ROBLOX_ITEMS}},
+    "Roblox crash + RBLX -40%": {"shocks": dict({item: -0.50 for item in optimizer.ROBLOX_ITEMS}, RBLX=-0.40),
+                                 "volatility_scale": 1.5},
+    "Correlation spike": {"correlation": (0.8, 1.0)},
+    "Roblox items move together": {"correlation": (0.95, 1.0), "correlation_assets": optimizer.ROBLOX_ITEMS},
+    "Market crisis": {"shocks": {"RBLX": -0.40, "VWCE_DE": -0.25}, "volatility_scale": 2.0, "correlation": (0.9, 0.7)}
+}
+
+
+def scenario_arrays(named_scenarios, assets):
+    """
+    Turns named scenario definitions into arrays with one row per scenario,
+    the layout every function below works on:
+    {'names', 'shocks' S x n, 'volatility_scale' S x n, 'correlation_target' S,
+     'correlation_weight' S, 'correlation_members' S x n (bool)}.
+    A "Baseline" scenario without any shock comes first.
+    Raises ValueError for an asset that is not in `assets`.
+    """
+    position = {asset: i for i, asset in enumerate(assets)}
+
+    def index_of(asset):
+        if asset not in position:
+            raise ValueError(f"Unknown asset in stress scenario: {asset}")
+        return position[asset]
+
+    names = ["Baseline"] + list(named_scenarios)
+    n_scenarios, n_assets = len(names), len(assets)
+    scenarios = {
+        'names': names,
+        'shocks': np.zeros((n_scenarios, n_assets)),
+        'volatility_scale': np.ones((n_scenarios, n_assets)),
+        'correlation_target': np.zeros(n_scenarios),
+        'correlation_weight': np.zeros(n_scenarios),
+        'correlation_members': np.ones((n_scenarios, n_assets), dtype=bool)
+    }
+
+    for s, definition in enumerate(named_scenarios.values(), start=1):
+        for asset, shock in definition.get("shocks", {}).items():
+            scenarios['shocks'][s, index_of(asset)] = shock
+        scale = definition.get("volatility_scale", 1.0)
+        if isinstance(scale, dict):
+            for asset, factor in scale.items():
+                scenarios['volatility_scale'][s, index_of(asset)] = factor
+        else:
+            scenarios['volatility_scale'][s] = scale
+        if "correlation" in definition:
+            scenarios['correlation_target'][s], scenarios['correlation_weight'][s] = definition["correlation"]
+        if "correlation_assets" in definition:
+            scenarios['correlation_members'][s] = False
+            scenarios['correlation_members'][s, [index_of(asset) for asset in definition["correlation_assets"]]] = True
+    return scenarios
+
+
+def generate_scenarios(n_scenarios, assets, roblox_items=None, seed=STRESS_SEED):
+    """
+    n_scenarios random shock scenarios, drawn as whole arrays: single-asset
+    losses, Roblox-wide crashes, higher volatilities and correlation spikes,
+    in random combinations. Same layout as scenario_arrays.
+    roblox_items: the assets a Roblox-wide crash hits (default: the optimizer's ROBLOX_ITEMS).
+    """
+    if roblox_items is None:
+        roblox_items = optimizer.ROBLOX_ITEMS
+    rng = np.random.default_rng(seed)
+    n_assets = len(assets)
+    is_roblox = np.isin(assets, roblox_items)
+
+    hit = rng.random((n_scenarios, n_assets)) < ASSET_SHOCK_PROBABILITY
+    shocks = np.where(hit, -rng.uniform(0, MAX_ASSET_SHOCK, (n_scenarios, n_assets)), 0.0)
+    crash = (rng.random(n_scenarios) < ROBLOX_CRASH_PROBABILITY) * rng.uniform(0, MAX_ROBLOX_CRASH, n_scenarios)
+    # A Roblox-wide crash replaces smaller single-item losses (it does not add to them)
+    shocks = np.where(is_roblox, np.minimum(shocks, -crash[:, None]), shocks)
+
+    return {
+        'names': [f"Generated #{k}" for k in range(n_scenarios)],
+        'shocks': shocks,
+        'volatility_scale': rng.uniform(1.0, MAX_VOLATILITY_SCALE, (n_scenarios, 1)) * np.ones(n_assets),
+        'correlation_target': rng.uniform(*CORRELATION_SPIKE, n_scenarios),
+        'correlation_weight': rng.random(n_scenarios),
+        'correlation_members': np.ones((n_scenarios, n_assets), dtype=bool)
+    }
+
+
+def combine_scenarios(*scenario_sets):
+    # Stacks scenario sets (same layout) into one
+    combined = {'names': [name for scenarios in scenario_sets for name in scenarios['names']]}
+    for key in ('shocks', 'volatility_scale', 'correlation_target', 'correlation_weight', 'correlation_members'):
+        combined[key] = np.concatenate([scenarios[key] for scenarios in scenario_sets])
+    return combined
+
+
+def stressed_moments(expected_returns, cov_matrix, scenarios, rows=slice(None)):
+    """
+    Expected returns (S x n) and covariance matrices (S x n x n) of the
+    scenarios in `rows`, built together:
+    - returns: expected annual return plus the one-off shock
+    - volatilities: scaled by volatility_scale
+    - correlations: pairs within correlation_members move correlation_weight
+      of the way to correlation_target
+    A spike on only some pairs can leave a matrix that no real returns could
+    have; its negative eigenvalues are clipped to 0 (nearest valid matrix).
+    """
+    volatilities = np.sqrt(np.diag(cov_matrix))
+    with np.errstate(divide='ignore', invalid='ignore'):
+        corr = np.nan_to_num(cov_matrix / np.outer(volatilities, volatilities))
+    np.fill_diagonal(corr, 1.0)
+
+    members = scenarios['correlation_members'][rows]
+    pairs = members[:, :, None] & members[:, None, :] & ~np.eye(len(volatilities), dtype=bool)
+    target = scenarios['correlation_target'][rows][:, None, None]
+    weight = scenarios['correlation_weight'][rows][:, None, None]
+    stressed_corr = np.where(pairs, corr + weight * (target - corr), corr)
+
+    eigenvalues, eigenvectors = np.linalg.eigh(stressed_corr)
+    invalid = eigenvalues[:, 0] < -1e-12
+    if np.any(invalid):
+        clipped = np.maximum(eigenvalues[invalid], 0)
+        repaired = np.einsum('sij,sj,skj->sik', eigenvectors[invalid], clipped, eigenvectors[invalid])
+        scale = np.sqrt(np.einsum('sii->si', repaired))
+        stressed_corr[invalid] = repaired / (scale[:, :, None] * scale[:, None, :])
+
+    stressed_volatilities = volatilities * scenarios['volatility_scale'][rows]
+    stressed_cov = stressed_corr * stressed_volatilities[:, :, None] * stressed_volatilities[:, None, :]
+    stressed_returns = expected_returns + scenarios['shocks'][rows]
+    return stressed_returns, stressed_cov
+
+
+def evaluate_stress(weights_block, expected_returns, cov_matrix, scenarios):
+    """
+    Every portfolio (row of weights_block) under every scenario, as P x S arrays:
+    {'impact': one-off loss/gain of the shock, 'return', 'volatility',
+     'sharpe_ratio', 'loss_95': stressed 1-year loss at 95% confidence}.
+    All portfolios x scenarios are matrix products over blocks of scenarios
+    (at most EVALUATION_BLOCK covariance values each); there is no loop over portfolios.
+    """
+    n_scenarios = len(scenarios['names'])
+    scenarios_per_block = max(1, EVALUATION_BLOCK // cov_matrix.size)
+    n_portfolios = len(weights_block)
+    results = {key: np.empty((n_portfolios, n_scenarios)) for key in ('impact', 'return', 'volatility', 'sharpe_ratio', 'loss_95')}
+
+    for start in range(0, n_scenarios, scenarios_per_block):
+        rows = slice(start, min(start + scenarios_per_block, n_scenarios))
+        stressed_returns, stressed_cov = stressed_moments(expected_returns, cov_matrix, scenarios, rows)
+
+        portfolio_returns = weights_block @ stressed_returns.T
+        variances = np.einsum('pi,sij,pj->ps', weights_block, stressed_cov, weights_block)
+        portfolio_volatilities = np.sqrt(np.maximum(variances, 0))
+
+        results['impact'][:, rows] = weights_block @ scenarios['shocks'][rows].T
+        results['return'][:, rows] = portfolio_returns
+        results['volatility'][:, rows] = portfolio_volatilities
+        with np.errstate(divide='ignore', invalid='ignore'):
+            results['sharpe_ratio'][:, rows] = np.where(portfolio_volatilities > 0,
+                                                        (portfolio_returns - optimizer.RISK_FREE_RATE) / portfolio_volatilities, 0.0)
+        results['loss_95'][:, rows] = -(portfolio_returns - LOSS_Z * portfolio_volatilities)
+    return results
+
+
+def describe_scenario(scenarios, s, assets):
+    # One line for a (generated) scenario: its shocks, volatility scale and correlation spike
+    parts = [f"{asset} {shock*100:+.0f}%" for asset, shock in zip(assets, scenarios['shocks'][s]) if shock != 0]
+    scale = scenarios['volatility_scale'][s]
+    if np.all(scale == scale[0]):
+        if scale[0] != 1:
+            parts.append(f"vol x{scale[0]:.2f}")
+    else:
+        parts += [f"{asset} vol x{factor:.2f}" for asset, factor in zip(assets, scale) if factor != 1]
+    if scenarios['correlation_weight'][s] > 0:
+        parts.append(f"corr {scenarios['correlation_weight'][s]:.0%} to {scenarios['correlation_target'][s]:.2f}")
+    return ", ".join(parts) or "no shock"
+
+
+def load_saved_portfolios(assets, filepath=PORTFOLIOS_FILE):
+    # (portfolio names, weights P x n) from optimal_portfolios.csv (weights stored as <asset>_%)
+    portfolios_df = pd.read_csv(filepath)
+    weights = portfolios_df[[f"{asset}_%" for asset in assets]].to_numpy(dtype=np.float64) / 100
+    return list(portfolios_df['Portfolio_Type']), weights
+
+
+@instrumented_stage("stress_testing")
+def run_stress_tests(moments=None, n_generated=None, save_csv=True):
+    """
+    Applies the named STRESS_SCENARIOS plus n_generated (default
+    GENERATED_SCENARIOS) random ones to every portfolio in
+    optimal_portfolios.csv and reports each portfolio's worst cases.
+    The inputs are those of the optimizer: return moments (cached from
+    returns_calculated.csv), else the metrics and correlation CSVs through
+    build_covariance_matrix. Returns a DataFrame of all results.
+    """
+    print("=" * 70)
+    print("🌪️  STRESS TESTS - Optimal Portfolios Under Shock Scenarios")
+    print("=" * 70)
+
+    if not os.path.exists(PORTFOLIOS_FILE):
+        print(f"❌ ERROR: {PORTFOLIOS_FILE} not found!")
+        print("   Please run portoflio_optimization_v1.py first.")
+        return
+
+    step("load_inputs")
+    assets = optimizer.ASSETS
+    if moments is None:
+        moments = load_return_moments(os.path.join(OUTPUT_DIR, "returns_calculated.csv"),
+                                      os.path.join(OUTPUT_DIR, "return_moments.npz"))
+    if moments is not None:
+        metrics_dict, cov_matrix = optimizer_inputs(moments, assets)
+    else:
+        metrics_dict, corr_matrix = optimizer.load_financial_data()
+        if metrics_dict is None:
+            return
+        cov_matrix = optimizer.build_covariance_matrix(metrics_dict, corr_matrix)
+    expected_returns = optimizer.get_expected_returns(metrics_dict)
+    portfolio_names, weights = load_saved_portfolios(assets)
+
+    step("build_scenarios")
+    n_generated = GENERATED_SCENARIOS if n_generated is None else n_generated
+    scenarios = scenario_arrays(STRESS_SCENARIOS, assets)
+    if n_generated > 0:
+        scenarios = combine_scenarios(scenarios, generate_scenarios(n_generated, assets))
+    print(f"\n📋 {len(STRESS_SCENARIOS)} named + {n_generated:,} generated scenarios, {len(portfolio_names)} portfolios")
+
+    step("evaluate")
+    results = evaluate_stress(weights, expected_returns, cov_matrix, scenarios)
+    throughput(len(portfolio_names) * len(scenarios['names']), "portfolio scenarios")
+
+    step("report")
+    n_named = len(STRESS_SCENARIOS) + 1
+    rows = []
+    for p, portfolio in enumerate(portfolio_names):
+        print(f"\n {portfolio} Portfolio:")
+        print("-" * 70)
+        print(f"  Baseline: return {results['return'][p, 0]*100:6.2f}%, volatility {results['volatility'][p, 0]*100:6.2f}%, "
+              f"Sharpe {results['sharpe_ratio'][p, 0]:.3f}, 95% 1-year loss {results['loss_95'][p, 0]*100:6.2f}%")
+
+        worst = np.argsort(-results['loss_95'][p])[:WORST_CASES]
+        print(f"\n  Named scenarios:")
+        for s in range(1, n_named):
+            print(f"   {scenarios['names'][s]:28s}: shock {results['impact'][p, s]*100:7.2f}% | return {results['return'][p, s]*100:7.2f}% | "
+                  f"vol {results['volatility'][p, s]*100:6.2f}% | 95% loss {results['loss_95'][p, s]*100:6.2f}%")
+        print(f"\n  Worst {len(worst)} of all {len(scenarios['names']):,} scenarios (by 95% 1-year loss):")
+        for rank, s in enumerate(worst, start=1):
+            label = scenarios['names'][s] if s < n_named else describe_scenario(scenarios, s, assets)
+            print(f"   {rank}. 95% loss {results['loss_95'][p, s]*100:6.2f}% | shock {results['impact'][p, s]*100:7.2f}% | {label}")
+
+        # Named scenarios and the worst cases go to the CSV; the other generated ones are only counted
+        worst_rank = {s: rank for rank, s in enumerate(worst, start=1)}
+        for s in sorted(set(range(n_named)) | set(worst)):
+            rows.append({
+                'Portfolio_Type': portfolio,
+                'Scenario': scenarios['names'][s],
+                'Description': describe_scenario(scenarios, s, assets),
+                'Worst_Case_Rank': worst_rank.get(s),
+                'Shock_Impact_%': results['impact'][p, s] * 100,
+                'Stressed_Return_%': results['return'][p, s] * 100,
+                'Stressed_Volatility_%': results['volatility'][p, s] * 100,
+                'Stressed_Sharpe': results['sharpe_ratio'][p, s],
+                'Loss_95_%': results['loss_95'][p, s] * 100
+            })
+
+    results_df = pd.DataFrame(rows)
+    if save_csv:
+        results_df.to_csv(RESULTS_FILE, index=False)
+        print(f"\n✅ Stress test results saved to: {RESULTS_FILE}")
+    print("\n" + "=" * 70)
+    return results_df
+
+
+if __name__ == "__main__":
+    import argparse
+
+    parser = argparse.ArgumentParser(description="Stress-test the saved optimal portfolios under shock scenarios.")
+    parser.add_argument("--scenarios", type=int, help="Generated scenarios on top of the named ones (GENERATED_SCENARIOS)")
+    args = parser.parse_args()
+    run_stress_tests(n_generated=args.scenarios)
@@ -0,0 +1,15 @@
+import os
+import sys
+
+import pytest
+
+# The scripts are flat modules in scripts/ (run from the project root), not a package
+SCRIPTS_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "scripts")
+sys.path.insert(0, SCRIPTS_DIR)
+
+
+@pytest.fixture(autouse=True)
+def no_stage_metrics(monkeypatch):
+    # Stages append their timings to data/stage_metrics.jsonl; tests must not touch data/
+    import instrumentation
+    monkeypatch.setattr(instrumentation, "METRICS_FILE", None)
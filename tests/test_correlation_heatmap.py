@@ -0,0 +1,34 @@
+import numpy as np
+import pandas as pd
+
+import correlation_heatmap
+import return_moments
+
+
+def returns_with_constant_asset(n_assets=40, constant=7, seed=0):
+    rng = np.random.default_rng(seed)
+    values = rng.normal(0, 0.02, size=(200, n_assets)) + rng.normal(0, 0.02, size=(200, 1))
+    # An asset whose price never changes has zero returns and NaN correlations
+    values[:, constant] = 0.0
+    return pd.DataFrame(values, columns=[f"Asset{i}_Return" for i in range(n_assets)])
+
+
+def test_cluster_order_with_a_constant_asset():
+    correlation = return_moments.moments_from_frame(returns_with_constant_asset())['correlation']
+    assert np.isnan(correlation[7]).all()
+
+    order = correlation_heatmap.cluster_order(correlation)
+    assert sorted(order) == list(range(40))
+
+
+def test_landmark_order_with_a_constant_asset():
+    correlation = return_moments.moments_from_frame(returns_with_constant_asset())['correlation']
+    order = correlation_heatmap.landmark_order(correlation, n_landmarks=10)
+    assert sorted(order) == list(range(40))
+
+
+def test_large_heatmap_with_a_constant_asset(tmp_path):
+    moments = return_moments.moments_from_frame(returns_with_constant_asset())
+    matrix = pd.DataFrame(moments['correlation'], index=moments['assets'], columns=moments['assets'])
+    output_path = correlation_heatmap.plot_correlation_heatmap(matrix, str(tmp_path / "heatmap.png"))
+    assert (tmp_path / "heatmap.png").exists() and output_path.endswith("heatmap.png")
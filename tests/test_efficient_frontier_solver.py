@@ -0,0 +1,135 @@
+import warnings
+
+import numpy as np
+import pytest
+from scipy.optimize import linprog, minimize
+
+import efficient_frontier_solver as solver
+
+
+def random_problem(seed, n_assets=5):
+    rng = np.random.default_rng(seed)
+    returns = rng.normal(0.0005, 0.02, size=(200, n_assets)) + rng.normal(0, 0.01, size=(200, 1))
+    return returns.mean(axis=0) * 252, np.cov(returns, rowvar=False) * 252
+
+
+def exact_min_variance(cov_matrix, A, lower, upper):
+    # Reference answer from scipy's SLSQP with tight tolerances
+    n_assets = len(cov_matrix)
+    constraints = [{'type': 'ineq', 'fun': lambda w, i=i: A[i] @ w - lower[i]} for i in range(len(A))]
+    constraints += [{'type': 'ineq', 'fun': lambda w, i=i: upper[i] - A[i] @ w} for i in range(len(A))]
+    result = minimize(lambda w: w @ cov_matrix @ w, np.full(n_assets, 1 / n_assets), jac=lambda w: 2 * cov_matrix @ w,
+                      constraints=constraints, method='SLSQP', options={'ftol': 1e-15, 'maxiter': 1000})
+    assert result.success
+    return result.x
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_min_variance_matches_exact_solver(seed):
+    _, cov_matrix = random_problem(seed)
+    A, lower, upper = solver.long_only_constraints(len(cov_matrix))
+    weights, converged = solver.solve_qp(cov_matrix, np.zeros(len(cov_matrix)), A, lower, upper, return_status=True)
+    assert converged
+    reference = exact_min_variance(cov_matrix, A, lower, upper)
+    np.testing.assert_allclose(weights @ cov_matrix @ weights, reference @ cov_matrix @ reference, rtol=1e-8)
+    np.testing.assert_allclose(weights, reference, atol=1e-5)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_constrained_min_variance_matches_exact_solver(seed):
+    # Long-only plus a 30% cap per asset and a 40% cap on the first two assets together
+    _, cov_matrix = random_problem(seed)
+    n_assets = len(cov_matrix)
+    A, lower, upper = solver.long_only_constraints(n_assets)
+    group = np.zeros(n_assets)
+    group[:2] = 1
+    A = np.vstack([A, group])
+    lower = np.concatenate([lower, [0.0]])
+    upper = np.concatenate([[1.0], np.full(n_assets, 0.3), [0.4]])
+
+    weights = solver.min_variance_weights(cov_matrix, (A, lower, upper))
+    reference = exact_min_variance(cov_matrix, A, lower, upper)
+    assert np.all(A @ weights >= lower - 1e-9) and np.all(A @ weights <= upper + 1e-9)
+    np.testing.assert_allclose(weights @ cov_matrix @ weights, reference @ cov_matrix @ reference, rtol=1e-8)
+
+
+def test_frontier_batch_matches_one_problem_at_a_time():
+    expected_returns, cov_matrix = random_problem(0)
+    frontier = solver.efficient_frontier_weights(expected_returns, cov_matrix, 20)
+    A, lower, upper = solver.long_only_constraints(len(cov_matrix))
+    for weights in frontier[1:-1]:
+        target = weights @ expected_returns
+        A_target = np.vstack([A, expected_returns])
+        reference = exact_min_variance(cov_matrix, A_target, np.append(lower, target), np.append(upper, target))
+        np.testing.assert_allclose(weights @ cov_matrix @ weights, reference @ cov_matrix @ reference, rtol=1e-7)
+
+
+def test_unsolvable_problem_is_reported():
+    # Two weights of at least 60% each cannot add up to 100%
+    _, cov_matrix = random_problem(1)
+    A, lower, upper = solver.long_only_constraints(len(cov_matrix))
+    lower[1:3] = 0.6
+
+    _, converged = solver.solve_qp(cov_matrix, np.zeros(len(cov_matrix)), A, lower, upper, return_status=True)
+    assert not converged
+    with pytest.warns(RuntimeWarning, match="did not converge"):
+        solver.solve_qp(cov_matrix, np.zeros(len(cov_matrix)), A, lower, upper)
+
+
+def test_polish_certifies_before_admm_converges(monkeypatch):
+    # The polish only needs the right active set, which ADMM finds long before its residuals are small
+    _, cov_matrix = random_problem(1)
+    A, lower, upper = solver.long_only_constraints(len(cov_matrix))
+    monkeypatch.setattr(solver, "ADMM_MAX_ITERATIONS", 10)
+
+    weights, converged = solver.solve_qp(cov_matrix, np.zeros(len(cov_matrix)), A, lower, upper, return_status=True)
+    assert converged
+    reference = exact_min_variance(cov_matrix, A, lower, upper)
+    np.testing.assert_allclose(weights @ cov_matrix @ weights, reference @ cov_matrix @ reference, rtol=1e-8)
+
+
+def test_single_point_frontier_end_is_certified():
+    # At the maximum return target only one portfolio is feasible: 100% in the best asset.
+    # More rows are active than there are weights, so the active set is degenerate
+    expected_returns, cov_matrix = random_problem(3)
+    n_assets = len(cov_matrix)
+    A, lower, upper = solver.long_only_constraints(n_assets)
+    best = np.argmax(expected_returns)
+    A = np.vstack([A, expected_returns])
+    lower = np.append(lower, expected_returns[best])
+    upper = np.append(upper, expected_returns[best])
+
+    weights, converged = solver.solve_qp(cov_matrix, np.zeros(n_assets), A, lower, upper, return_status=True)
+    assert converged
+    np.testing.assert_allclose(weights, np.eye(n_assets)[best], atol=1e-9)
+
+
+@pytest.mark.parametrize("seed", range(10))
+def test_constrained_frontier_end_is_certified(seed):
+    # The maximum return target under a 30% cap and a 40% group cap sits on a vertex where
+    # ADMM's active-set guess usually has a row too many
+    expected_returns, cov_matrix = random_problem(seed)
+    n_assets = len(cov_matrix)
+    A, lower, upper = solver.long_only_constraints(n_assets)
+    upper[4] = 0.3
+    A = np.vstack([A, [1, 1, 1, 0, 0]])
+    lower = np.append(lower, 0.0)
+    upper = np.append(upper, 0.4)
+    best = linprog(-expected_returns, A_ub=np.vstack([A[1:], -A[1:]]), b_ub=np.concatenate([upper[1:], -lower[1:]]),
+                   A_eq=A[:1], b_eq=[1.0], bounds=(None, None))
+    target = best.x @ expected_returns
+
+    A_target = np.vstack([A, expected_returns])
+    lower_target, upper_target = np.append(lower, target), np.append(upper, target)
+    weights, converged = solver.solve_qp(cov_matrix, np.zeros(n_assets), A_target, lower_target, upper_target, return_status=True)
+    assert converged
+    reference = exact_min_variance(cov_matrix, A_target, lower_target, upper_target)
+    np.testing.assert_allclose(weights @ cov_matrix @ weights, reference @ cov_matrix @ reference, rtol=1e-7)
+
+
+def test_converged_problem_does_not_warn():
+    _, cov_matrix = random_problem(2)
+    A, lower, upper = solver.long_only_constraints(len(cov_matrix))
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        solver.solve_qp(cov_matrix, np.zeros(len(cov_matrix)), A, lower, upper)
@@ -0,0 +1,99 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import fetch_stock_data as fetcher
+
+
+def write_fixture(directory, ticker, dates):
+    prices = pd.DataFrame({column: np.arange(len(dates), dtype=float) + 10 for column in fetcher.PRICE_COLUMNS},
+                          index=pd.DatetimeIndex(dates, name="Date"))
+    os.makedirs(directory, exist_ok=True)
+    prices.to_csv(os.path.join(directory, fetcher.price_filename(ticker)))
+
+
+@pytest.fixture
+def offline(tmp_path, monkeypatch):
+    # Outputs and cache in a temporary data dir, prices served from saved fixtures
+    output_dir = tmp_path / "data"
+    fixture_dir = tmp_path / "fixtures"
+    output_dir.mkdir()
+    monkeypatch.setattr(fetcher, "OUTPUT_DIR", str(output_dir))
+    monkeypatch.setattr(fetcher, "CACHE_FILE", str(output_dir / ".fetch_cache.json"))
+    monkeypatch.setattr(fetcher, "TICKERS", ["RBLX", "VWCE.DE"])
+    monkeypatch.setattr(fetcher, "START_DATE", "2024-01-01")
+    monkeypatch.setattr(fetcher, "END_DATE", "2024-01-11")
+    for ticker in fetcher.TICKERS:
+        write_fixture(fixture_dir, ticker, pd.date_range("2024-01-01", "2024-01-20"))
+    return output_dir, fetcher.make_fixture_provider(str(fixture_dir))
+
+
+def test_fetch_from_fixtures_writes_every_ticker(offline):
+    output_dir, provider = offline
+    assert fetcher.fetch_stock_data(provider) is True
+
+    saved = fetcher.read_price_csv(output_dir / "vwce_de_prices.csv")
+    # The end date is not included
+    assert list(saved.index) == list(pd.date_range("2024-01-01", "2024-01-10"))
+    assert list(saved.columns) == fetcher.PRICE_COLUMNS
+
+
+def test_second_fetch_only_downloads_the_new_tail(offline, monkeypatch):
+    output_dir, provider = offline
+    fetcher.fetch_stock_data(provider)
+
+    requested = []
+    def recording_provider(ticker, start, end):
+        requested.append((ticker, start, end))
+        return provider(ticker, start, end)
+
+    monkeypatch.setattr(fetcher, "END_DATE", "2024-01-16")
+    assert fetcher.fetch_stock_data(recording_provider) is True
+    assert sorted(requested) == [("RBLX", "2024-01-11", "2024-01-16"), ("VWCE.DE", "2024-01-11", "2024-01-16")]
+    assert len(fetcher.read_price_csv(output_dir / "rblx_prices.csv")) == 15
+
+
+def test_failed_ticker_fails_the_stage(offline):
+    output_dir, provider = offline
+
+    def flaky_provider(ticker, start, end):
+        if ticker == "VWCE.DE":
+            raise ConnectionError("offline")
+        return provider(ticker, start, end)
+
+    assert fetcher.fetch_stock_data(flaky_provider) is False
+    # The ticker that worked is still saved and cached; the failed one is not
+    assert os.path.exists(output_dir / "rblx_prices.csv")
+    assert "VWCE.DE" not in fetcher.load_cache()
+
+
+def test_no_data_fails_the_stage(offline):
+    empty_provider = lambda ticker, start, end: pd.DataFrame(columns=fetcher.PRICE_COLUMNS)
+    assert fetcher.fetch_stock_data(empty_provider) is False
+
+
+def offline_provider(ticker, start, end):
+    raise ConnectionError(f"no network for {ticker} {start} to {end}")
+
+
+def test_saved_files_without_a_cache_need_no_download(tmp_path, monkeypatch):
+    # A fresh checkout: price files are there, the cache is not. The range starts on a Sunday
+    # before a holiday Monday and ends on a Sunday, so nothing is missing.
+    monkeypatch.setattr(fetcher, "OUTPUT_DIR", str(tmp_path))
+    monkeypatch.setattr(fetcher, "CACHE_FILE", str(tmp_path / ".fetch_cache.json"))
+    monkeypatch.setattr(fetcher, "TICKERS", ["RBLX"])
+    monkeypatch.setattr(fetcher, "START_DATE", "2023-01-01")
+    monkeypatch.setattr(fetcher, "END_DATE", "2023-01-22")
+    write_fixture(tmp_path, "RBLX", pd.bdate_range("2023-01-03", "2023-01-20"))
+
+    assert fetcher.fetch_stock_data(offline_provider) is True
+    assert fetcher.load_cache()["RBLX"]["start"] == "2023-01-01"
+    assert fetcher.load_cache()["RBLX"]["end"] == "2023-01-22"
+
+
+def test_missing_business_days_are_still_downloaded():
+    assert fetcher.missing_ranges(("2023-01-03", "2023-01-21"), "2023-01-01", "2023-01-22") == [("2023-01-01", "2023-01-03")]
+    assert fetcher.missing_ranges(("2023-01-03", "2023-01-17"), "2023-01-03", "2023-01-22") == [("2023-01-17", "2023-01-22")]
+    assert fetcher.missing_ranges(("2023-01-02", "2023-01-21"), "2023-01-02", "2023-01-23") == []
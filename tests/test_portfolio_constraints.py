@@ -0,0 +1,41 @@
+import warnings
+
+import numpy as np
+import pytest
+
+import portfolio_constraints
+import portoflio_optimization_v1 as optimizer
+
+# The examples given next to WEIGHT_BOUNDS / GROUP_BOUNDS / FIXED_WEIGHTS in the optimizer config
+EXAMPLES = {
+    "max roblox": dict(group_bounds={"Roblox Items": (optimizer.ROBLOX_ITEMS, 0.0, 0.40)}),
+    "rblx cap": dict(weight_bounds={"RBLX": (0.0, 0.30)}),
+    "all three": dict(weight_bounds={"RBLX": (0.0, 0.45)}, group_bounds={"Roblox Items": (optimizer.ROBLOX_ITEMS, 0.0, 0.40)},
+                      fixed_weights={"VWCE_DE": 0.25}),
+}
+
+
+@pytest.mark.parametrize("example", EXAMPLES)
+def test_documented_examples_build_without_warnings(example):
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        constraints = portfolio_constraints.build_constraints(optimizer.ASSETS, **EXAMPLES[example])
+
+    # The hit-and-run start point is strictly inside every bound that is not pinned
+    start = constraints['start']
+    values = constraints['rows'] @ start
+    free = constraints['rows_lower'] < constraints['rows_upper']
+    assert portfolio_constraints.satisfies(start, constraints)
+    assert np.all(values[free] > constraints['rows_lower'][free]) and np.all(values[free] < constraints['rows_upper'][free])
+
+
+def test_samples_stay_feasible():
+    constraints = portfolio_constraints.build_constraints(optimizer.ASSETS, **EXAMPLES["all three"])
+    weights, _ = portfolio_constraints.hit_and_run(np.random.default_rng(0), constraints, 5000)
+    assert portfolio_constraints.satisfies(weights, constraints).all()
+
+
+def test_infeasible_rules_are_rejected():
+    with pytest.raises(ValueError):
+        portfolio_constraints.build_constraints(optimizer.ASSETS, weight_bounds={"RBLX": (0.0, 0.2)}, fixed_weights={"VWCE_DE": 0.25},
+                                                group_bounds={"Roblox Items": (optimizer.ROBLOX_ITEMS, 0.0, 0.40)})
@@ -0,0 +1,45 @@
+import numpy as np
+import pytest
+
+import portfolio_metrics
+import portfolio_sampler as sampler
+
+
+def moments(n_assets=4, seed=0):
+    rng = np.random.default_rng(seed)
+    returns = rng.normal(0.0005, 0.02, size=(300, n_assets))
+    return returns.mean(axis=0) * 252, np.cov(returns, rowvar=False) * 252
+
+
+def assert_same_summary(a, b):
+    assert a['count'] == b['count']
+    for key in ('min_vol', 'max_sharpe', 'top_sharpe', 'frontier'):
+        for field, values in a[key].items():
+            np.testing.assert_array_equal(values, b[key][field])
+    if 'density' in a:
+        for field, values in a['density'].items():
+            np.testing.assert_array_equal(values, b['density'][field])
+
+
+@pytest.fixture
+def small_blocks(monkeypatch):
+    # Several blocks and several chunks per block, so merging order is exercised
+    monkeypatch.setattr(sampler, "SAMPLING_BLOCK_SIZE", 2500)
+    monkeypatch.setattr(portfolio_metrics, "CHUNK_SIZE", 700)
+
+
+@pytest.mark.parametrize("workers", [1, 2, 3])
+def test_parallel_matches_streaming(small_blocks, workers):
+    expected_returns, cov_matrix = moments()
+    streaming = sampler.sample_portfolios_streaming(expected_returns, cov_matrix, 10000, seed=7, density_bins=(8, 8))
+    parallel = sampler.sample_portfolios_parallel(expected_returns, cov_matrix, 10000, workers=workers, seed=7, density_bins=(8, 8))
+    assert_same_summary(streaming, parallel)
+
+
+def test_chunk_size_does_not_change_the_samples(small_blocks, monkeypatch):
+    # Chunks only split each block's random stream into smaller draws, so the summary is the same
+    expected_returns, cov_matrix = moments()
+    chunked = sampler.sample_portfolios_streaming(expected_returns, cov_matrix, 5000, seed=3)
+    monkeypatch.setattr(portfolio_metrics, "CHUNK_SIZE", 5000)
+    whole_blocks = sampler.sample_portfolios_streaming(expected_returns, cov_matrix, 5000, seed=3)
+    assert_same_summary(chunked, whole_blocks)
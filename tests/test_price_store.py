@@ -0,0 +1,107 @@
+import os
+
+import numpy as np
+import pandas as pd
+import pytest
+
+import price_store
+
+
+def write_prices(path, dates, closes):
+    pd.DataFrame({"Close": closes}, index=pd.DatetimeIndex(dates, name="Date")).to_csv(path)
+
+
+def store_bytes(store_dir):
+    return {name: open(os.path.join(store_dir, name), "rb").read() for name in sorted(os.listdir(store_dir))
+            if name != "manifest.json"}
+
+
+@pytest.fixture
+def sources(tmp_path):
+    dates = pd.bdate_range("2024-01-01", periods=30)
+    write_prices(tmp_path / "rblx.csv", dates, np.round(40 + np.arange(30) * 1.37, 2))
+    write_prices(tmp_path / "item.csv", dates[::3], np.arange(10) * 1000 + 25_000_001)
+    return {"RBLX": (str(tmp_path / "rblx.csv"), "Close"), "Item": (str(tmp_path / "item.csv"), "Close")}
+
+
+def test_sync_is_idempotent(tmp_path, sources):
+    store_dir = str(tmp_path / "store")
+    assert price_store.sync_price_store(sources, store_dir) == ["RBLX", "Item"]
+    first = store_bytes(store_dir)
+
+    # Unchanged files are not imported again
+    assert price_store.sync_price_store(sources, store_dir) == []
+    # A re-export with the same content is imported again and leaves the same store
+    for filepath, _ in sources.values():
+        os.utime(filepath, ns=(0, 0))
+    assert price_store.sync_price_store(sources, store_dir) == ["RBLX", "Item"]
+    assert store_bytes(store_dir) == first
+
+
+def test_prices_match_the_csvs_exactly(tmp_path, sources):
+    store_dir = str(tmp_path / "store")
+    price_store.sync_price_store(sources, store_dir)
+    loaded = price_store.load_prices(store_dir=store_dir)
+
+    for asset, (filepath, column) in sources.items():
+        expected = pd.read_csv(filepath, index_col=0, parse_dates=True)[column]
+        stored = pd.Series(loaded["columns"][asset], index=loaded["dates"]).dropna()
+        assert list(stored.index) == list(expected.index)
+        # float64 gives back exactly what parsing the CSV gives (no float32 rounding)
+        np.testing.assert_array_equal(stored.to_numpy(), expected.to_numpy())
+
+
+def test_shorter_reimport_drops_the_removed_dates(tmp_path, sources):
+    store_dir = str(tmp_path / "store")
+    price_store.sync_price_store(sources, store_dir)
+
+    filepath = sources["RBLX"][0]
+    kept = pd.read_csv(filepath, index_col=0, parse_dates=True).iloc[:20]
+    kept.to_csv(filepath)
+    os.utime(filepath, ns=(0, 0))
+    assert price_store.sync_price_store(sources, store_dir) == ["RBLX"]
+
+    loaded = price_store.load_prices(["RBLX"], start=kept.index[-1], store_dir=store_dir)
+    assert loaded["columns"]["RBLX"][0] == kept["Close"].iloc[-1]
+    assert np.isnan(loaded["columns"]["RBLX"][1:]).all()
+
+
+def test_float32_store_is_rebuilt(tmp_path, sources, monkeypatch):
+    store_dir = str(tmp_path / "store")
+    monkeypatch.setattr(price_store, "PRICE_DTYPE", np.float32)
+    price_store.sync_price_store(sources, store_dir)
+    assert price_store.load_manifest(store_dir)["dtype"] == "float32"
+
+    monkeypatch.setattr(price_store, "PRICE_DTYPE", np.float64)
+    assert price_store.sync_price_store(sources, store_dir) == ["RBLX", "Item"]
+    loaded = price_store.load_prices(["RBLX"], store_dir=store_dir)
+    assert loaded["columns"]["RBLX"].dtype == np.float64
+    assert price_store.load_manifest(store_dir)["dtype"] == "float64"
+
+
+def test_deleted_source_is_dropped_from_the_store(tmp_path, sources):
+    store_dir = str(tmp_path / "store")
+    price_store.sync_price_store(sources, store_dir)
+
+    os.remove(sources["Item"][0])
+    assert price_store.sync_price_store(sources, store_dir) == []
+    manifest = price_store.load_manifest(store_dir)
+    assert manifest["assets"] == ["RBLX"]
+    assert "Item" not in manifest["sources"]
+    assert not os.path.exists(os.path.join(store_dir, "Item"))
+    with pytest.raises(KeyError):
+        price_store.load_prices(["Item"], store_dir=store_dir)
+
+    # The remaining asset reads back unchanged
+    expected = pd.read_csv(sources["RBLX"][0], index_col=0, parse_dates=True)["Close"]
+    loaded = price_store.load_prices(["RBLX"], store_dir=store_dir)
+    np.testing.assert_array_equal(loaded["columns"]["RBLX"], expected.to_numpy())
+
+
+def test_asset_no_longer_listed_is_dropped_from_the_store(tmp_path, sources):
+    store_dir = str(tmp_path / "store")
+    price_store.sync_price_store(sources, store_dir)
+
+    del sources["RBLX"]
+    assert price_store.sync_price_store(sources, store_dir) == []
+    assert price_store.load_manifest(store_dir)["assets"] == ["Item"]
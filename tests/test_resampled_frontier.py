@@ -0,0 +1,35 @@
+import numpy as np
+import pytest
+
+import resampled_frontier as resampler
+
+ASSETS = ["RBLX", "VWCE.DE", "Dominus_Empyreus"]
+
+
+@pytest.fixture
+def scenarios():
+    rng = np.random.default_rng(0)
+    return rng.normal([0.001, 0.0004, 0.0008], [0.03, 0.01, 0.02], size=(250, len(ASSETS)))
+
+
+def test_results_do_not_depend_on_the_worker_count(scenarios):
+    # 70 resamples: one full batch and one partial batch
+    single = resampler.resample_optimal_weights(scenarios, ASSETS, resamples=70, workers=1, seed=5)
+    pooled = resampler.resample_optimal_weights(scenarios, ASSETS, resamples=70, workers=3, seed=5)
+    for key in ('min_vol', 'max_sharpe', 'frontier'):
+        np.testing.assert_array_equal(single[key], pooled[key])
+    assert single['min_vol'].shape == (70, len(ASSETS))
+    np.testing.assert_allclose(single['frontier'].sum(axis=2), 1)
+
+
+def test_resample_count_is_read_at_call_time(scenarios, monkeypatch):
+    # What the optimizer's --resamples does: change RESAMPLES after import
+    monkeypatch.setattr(resampler, "RESAMPLES", 12)
+    resampled = resampler.resample_optimal_weights(scenarios, ASSETS, workers=1)
+    assert len(resampled['max_sharpe']) == 12
+
+
+def test_seed_changes_the_resamples(scenarios):
+    a = resampler.resample_optimal_weights(scenarios, ASSETS, resamples=5, workers=1, seed=1)
+    b = resampler.resample_optimal_weights(scenarios, ASSETS, resamples=5, workers=1, seed=2)
+    assert not np.array_equal(a['min_vol'], b['min_vol'])
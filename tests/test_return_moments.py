@@ -0,0 +1,90 @@
+import numpy as np
+import pandas as pd
+import pytest
+
+import return_moments
+
+
+def returns_frame(n_rows=1000, n_assets=4, seed=0):
+    rng = np.random.default_rng(seed)
+    # A large mean next to small moves is where a naive sum-of-squares loses precision
+    values = 0.5 + rng.normal(0, 1e-4, size=(n_rows, n_assets))
+    columns = [f"Asset{i}_Return" for i in range(n_assets)]
+    df = pd.DataFrame(values, columns=columns)
+    df.insert(0, "Date", pd.date_range("2020-01-01", periods=n_rows))
+    return df
+
+
+def assert_matches_pandas(moments, df):
+    # Per-column mean/std and pairwise-complete correlation, as pandas computes them
+    values = df.drop(columns="Date")
+    np.testing.assert_allclose(moments['mean'], values.mean(), rtol=1e-12)
+    np.testing.assert_allclose(moments['std'], values.std(), rtol=1e-9)
+    np.testing.assert_allclose(moments['correlation'], values.corr(), rtol=1e-9, atol=1e-12)
+    np.testing.assert_allclose(moments['covariance'], values.corr() * np.outer(values.std(), values.std()), rtol=1e-9, atol=1e-20)
+    np.testing.assert_array_equal(moments['count'], values.count())
+
+
+def ragged_frame(seed=0):
+    # Assets that start late, pause and stop early, like weekly items next to daily stocks
+    df = returns_frame(n_rows=300, seed=seed)
+    df.loc[:49, "Asset1_Return"] = np.nan
+    df.loc[120:139, "Asset2_Return"] = np.nan
+    df.loc[250:, "Asset3_Return"] = np.nan
+    df.loc[::7, "Asset0_Return"] = np.nan
+    return df
+
+
+@pytest.mark.parametrize("chunk_rows", [1, 7, 100, 1000, 5000])
+def test_chunked_moments_match_one_pass(chunk_rows):
+    df = returns_frame()
+    moments = return_moments.moments_from_frame(df, chunk_rows=chunk_rows)
+    assert_matches_pandas(moments, df)
+    # Without missing values this is the plain sample covariance
+    np.testing.assert_allclose(moments['covariance'], df.drop(columns="Date").cov(), rtol=1e-9)
+
+
+@pytest.mark.parametrize("chunk_rows", [1, 13, 60, 1000])
+def test_missing_values_drop_only_from_their_own_asset(chunk_rows):
+    df = ragged_frame()
+    assert_matches_pandas(return_moments.moments_from_frame(df, chunk_rows=chunk_rows), df)
+
+
+def test_merge_order_does_not_matter():
+    values = ragged_frame().drop(columns="Date").to_numpy()
+    parts = [return_moments.chunk_moments(part) for part in np.array_split(values, [10, 125, 126, 260])]
+    one_shot = return_moments.chunk_moments(values)
+
+    forward = return_moments.empty_moments(values.shape[1])
+    for part in parts:
+        forward = return_moments.merge_moments(forward, part)
+    # Tree-shaped merge, as when workers summarize chunks separately
+    tree = return_moments.merge_moments(return_moments.merge_moments(parts[3], parts[4]),
+                                        return_moments.merge_moments(parts[0], return_moments.merge_moments(parts[2], parts[1])))
+
+    for merged in (forward, tree):
+        np.testing.assert_array_equal(merged['count'], one_shot['count'])
+        np.testing.assert_allclose(merged['mean'], one_shot['mean'], rtol=1e-14)
+        np.testing.assert_allclose(merged['m2'], one_shot['m2'], rtol=1e-9)
+        np.testing.assert_allclose(merged['sq'], one_shot['sq'], rtol=1e-9)
+
+
+def test_csv_stream_matches_frame(tmp_path):
+    df = ragged_frame()
+    path = tmp_path / "returns.csv"
+    df.to_csv(path, index=False)
+
+    from_csv = return_moments.moments_from_csv(str(path), chunk_rows=60)
+    assert_matches_pandas(from_csv, pd.read_csv(path))
+
+
+def test_cached_moments_are_reused(tmp_path, monkeypatch):
+    path, cache_path = tmp_path / "returns.csv", tmp_path / "moments.npz"
+    ragged_frame().to_csv(path, index=False)
+
+    first = return_moments.load_return_moments(str(path), str(cache_path))
+    monkeypatch.setattr(return_moments, "moments_from_csv", lambda *args, **kwargs: pytest.fail("returns parsed again"))
+    cached = return_moments.load_return_moments(str(path), str(cache_path))
+    assert cached['assets'] == first['assets']
+    for key in return_moments.SAVED_STATISTICS:
+        np.testing.assert_array_equal(cached[key], first[key])
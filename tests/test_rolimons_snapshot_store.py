@@ -0,0 +1,36 @@
+import numpy as np
+import pandas as pd
+
+import rolimons_snapshot_store as store
+
+
+def itemdetails(items):
+    # {item_id: (name, rap, value)} -> the itemdetails response layout
+    return {"items": {item_id: [name, "", rap, value, -1, 0, 0, -1, -1, -1] for item_id, (name, rap, value) in items.items()}}
+
+
+def test_item_missing_from_a_snapshot_has_no_rap(tmp_path, monkeypatch):
+    store_dir = str(tmp_path / "store")
+    store.append_snapshot(itemdetails({"1": ("Dominus", 100, -1), "2": ("Valk", 50, 60)}), "2026-01-01", store_dir)
+    store.append_snapshot(itemdetails({"2": ("Valk", 55, 60)}), "2026-01-02", store_dir)
+    store.append_snapshot(itemdetails({"1": ("Dominus", 110, 120), "2": ("Valk", 56, 60)}), "2026-01-03", store_dir)
+
+    history = store.load_item_history(1, store_dir)
+    assert list(history["Date"]) == list(pd.date_range("2026-01-01", "2026-01-03"))
+    np.testing.assert_array_equal(history["RAP"], [100, np.nan, 110])
+    np.testing.assert_array_equal(history["Value"], [np.nan, np.nan, 120])
+
+    # The exported price file has no -1 prices and no gaps to forward-fill wrongly
+    monkeypatch.setattr(store, "OUTPUT_DIR", str(tmp_path))
+    exported = pd.read_csv(store.export_item_prices(1, "Dominus", store_dir))
+    assert list(exported["Date"]) == ["2026-01-01", "2026-01-03"]
+    assert list(exported["RAP"]) == [100, 110]
+
+
+def test_snapshot_skips_items_missing_from_that_pull(tmp_path):
+    store_dir = str(tmp_path / "store")
+    store.append_snapshot(itemdetails({"1": ("Dominus", 100, -1)}), "2026-01-01", store_dir)
+    store.append_snapshot(itemdetails({"2": ("Valk", 55, 60)}), "2026-01-02", store_dir)
+
+    snapshot = store.load_snapshot("2026-01-02", store_dir)
+    assert list(snapshot["Item_ID"]) == ["2"]
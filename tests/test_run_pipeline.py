@@ -0,0 +1,59 @@
+import os
+
+import pytest
+
+import run_pipeline
+
+STAGE_SCRIPT = '''import os
+PLOT = {plot}
+with open(os.path.join("data", "result.csv"), "w") as f:
+    f.write("value\\n{plot}\\n")
+if PLOT:
+    with open(os.path.join("data", "plot.png"), "w") as f:
+        f.write("plot")
+'''
+
+
+@pytest.fixture
+def project(tmp_path, monkeypatch):
+    scripts_dir = tmp_path / "scripts"
+    scripts_dir.mkdir()
+    (tmp_path / "data").mkdir()
+    monkeypatch.chdir(tmp_path)
+    monkeypatch.setattr(run_pipeline, "SCRIPTS_DIR", str(scripts_dir))
+    monkeypatch.setattr(run_pipeline, "PROJECT_ROOT", str(tmp_path))
+    monkeypatch.setattr(run_pipeline, "STATE_FILE", os.path.join("data", ".pipeline_state.json"))
+    monkeypatch.setattr(run_pipeline, "STAGES", [{
+        "name": "stage", "script": "stage.py", "config_files": ["stage.py"], "inputs": [],
+        "outputs": ["result.csv"], "optional_outputs": ["plot.png"]
+    }])
+    return tmp_path
+
+
+def write_stage(project, plot):
+    (project / "scripts" / "stage.py").write_text(STAGE_SCRIPT.format(plot=plot))
+
+
+def test_skipped_optional_output_is_not_a_failure(project):
+    write_stage(project, plot=False)
+    assert run_pipeline.run_pipeline()
+    assert not (project / "data" / "plot.png").exists()
+    assert run_pipeline.is_up_to_date(run_pipeline.STAGES[0], run_pipeline.load_state())
+
+
+def test_stale_optional_output_is_removed_on_rerun(project):
+    write_stage(project, plot=True)
+    assert run_pipeline.run_pipeline()
+    assert (project / "data" / "plot.png").exists()
+
+    # Turning the plot off reruns the stage, and the old plot does not survive it
+    write_stage(project, plot=False)
+    assert run_pipeline.run_pipeline()
+    assert not (project / "data" / "plot.png").exists()
+    assert run_pipeline.is_up_to_date(run_pipeline.STAGES[0], run_pipeline.load_state())
+
+
+def test_missing_required_output_fails_the_stage(project):
+    (project / "scripts" / "stage.py").write_text("PLOT = False\n")
+    assert not run_pipeline.run_pipeline()
+    assert "stage" not in run_pipeline.load_state()
@@ -0,0 +1,62 @@
+import numpy as np
+import pytest
+
+import stress_testing
+
+ASSETS = ["RBLX", "VWCE_DE", "Dominus_Empyreus", "Violet_Valkyrie", "Red_Valkyrie"]
+
+
+def base_moments(correlation):
+    volatilities = np.array([0.5, 0.15, 0.4, 0.35, 0.3])
+    return np.array([0.1, 0.07, 0.2, 0.15, 0.12]), correlation * np.outer(volatilities, volatilities)
+
+
+def mixed_correlation():
+    # Dominus follows RBLX and Violet moves against it, so pulling only the items'
+    # correlations together leaves a matrix no real returns could have
+    corr = np.eye(5)
+    corr[0, 1] = corr[1, 0] = 0.3
+    corr[0, 2] = corr[2, 0] = 0.6
+    corr[0, 3] = corr[3, 0] = -0.6
+    assert np.linalg.eigvalsh(corr).min() > 0
+    return corr
+
+
+def assert_valid_covariances(stressed_cov, volatility_scale, volatilities):
+    # Symmetric, positive semi-definite, and the stressed volatilities are kept on the diagonal
+    np.testing.assert_allclose(stressed_cov, np.swapaxes(stressed_cov, 1, 2), atol=1e-14)
+    assert np.linalg.eigvalsh(stressed_cov).min() >= -1e-10
+    np.testing.assert_allclose(np.sqrt(np.einsum('sii->si', stressed_cov)), volatility_scale * volatilities, rtol=1e-10)
+
+
+@pytest.mark.parametrize("correlation", [np.eye(5), mixed_correlation()])
+def test_named_scenarios_are_psd(correlation):
+    expected_returns, cov_matrix = base_moments(correlation)
+    scenarios = stress_testing.scenario_arrays(stress_testing.STRESS_SCENARIOS, ASSETS)
+    stressed_returns, stressed_cov = stress_testing.stressed_moments(expected_returns, cov_matrix, scenarios)
+
+    assert_valid_covariances(stressed_cov, scenarios['volatility_scale'], np.sqrt(np.diag(cov_matrix)))
+    # The baseline is the unstressed input
+    np.testing.assert_allclose(stressed_cov[0], cov_matrix, atol=1e-15)
+    np.testing.assert_array_equal(stressed_returns[0], expected_returns)
+
+
+def test_partial_spike_is_repaired():
+    expected_returns, cov_matrix = base_moments(mixed_correlation())
+    spike = {"Items together": {"correlation": (0.95, 1.0), "correlation_assets": ["Dominus_Empyreus", "Violet_Valkyrie"]}}
+    scenarios = stress_testing.scenario_arrays(spike, ASSETS)
+
+    # Without the repair this scenario's correlation matrix has a negative eigenvalue
+    corr = mixed_correlation()
+    corr[2, 3] = corr[3, 2] = 0.95
+    assert np.linalg.eigvalsh(corr).min() < 0
+
+    _, stressed_cov = stress_testing.stressed_moments(expected_returns, cov_matrix, scenarios)
+    assert_valid_covariances(stressed_cov, scenarios['volatility_scale'], np.sqrt(np.diag(cov_matrix)))
+
+
+def test_generated_scenarios_are_psd():
+    expected_returns, cov_matrix = base_moments(mixed_correlation())
+    scenarios = stress_testing.generate_scenarios(2000, ASSETS, seed=3)
+    _, stressed_cov = stress_testing.stressed_moments(expected_returns, cov_matrix, scenarios)
+    assert_valid_covariances(stressed_cov, scenarios['volatility_scale'], np.sqrt(np.diag(cov_matrix)))